@@ -12,6 +12,13 @@
 # Make sure the logger is configured early:
 from .logger import LOGGER, active_logger
 from .device import SimpleBGC32
+from .pipeline import Pipeline
+from .stream import DataStream
+from .poller import Poller
+from .recovery import RecoveryPolicy
+from .recording import BinaryWriter, BinaryReader
+from .collector import MultiCollector
+from .stages import Stage
 
 VERSION = '0.1dev'
 __version__ = VERSION
@@ -10,15 +10,25 @@
 
 '''
 import os
+import sys
+import json
 import argparse
 import time
-import copy
 from datetime import datetime
 
 # Make sure the logger is configured early:
 from . import VERSION
 from .logger import active_logger
 from .device import SimpleBGC32
+from .collector import MultiCollector
+from .server import Server
+from .emulator import Emulator, Faults
+from .boardinfo import BoardInfoCache
+from .scheduler import Scheduler
+from .stats import format_stats
+from .replay import Replay
+from .stages import Stage
+from . import benchmark
 from .compat import stdout
 
 
@@ -30,14 +40,30 @@ def setstdcmd(cmdtype, device):
             stdout.write(("%s : " + fields[i]['valuefmt'] + "\n")%(fields[i]['name'],fields[i]['value']))
 
 
+def stdrecord(codec, record):
+    '''display a record on the standard out'''
+    for i in codec.valueindexes:
+        stdout.write(("%s : " + codec.valuefmts[i] + "\n")%(codec.names[i],record[i]))
+
+
+def setinfocache(args, device):
+    '''use the board information cache file'''
+    if args.infocache:
+        device.infocache = BoardInfoCache(args.infocache)
+        if args.refresh:
+            device.invalidate_boardinfo()
+
+
 def getboardinfo_cmd(args, device):
     '''Getboardinfo command.'''
-    setstdcmd('CMD_BOARD_INFO', device)
+    setinfocache(args, device)
+    stdrecord(device.codecs['CMD_BOARD_INFO'], device.boardinfo)
 
 
 def getboardinfo3_cmd(args, device):
     '''Getboardinfo3 command.'''
-    setstdcmd('CMD_BOARD_INFO_3', device)
+    setinfocache(args, device)
+    stdrecord(device.codecs['CMD_BOARD_INFO_3'], device.boardinfo3)
 
 
 def getrealtimedata3_cmd(args, device):
@@ -45,24 +71,164 @@ def getrealtimedata3_cmd(args, device):
     setstdcmd('CMD_REALTIME_DATA_3', device)
 
 
+def stages_cmd(cmdtype, args, device):
+    '''collect with the output stages'''
+    files = []
+    try:
+        stages = []
+        for filename, storingperiod, statistics in args.stage:
+            fileformat = 'binary' if filename.endswith('.bin') else 'csv'
+            if filename == '-':
+                output = stdout
+            else:
+                output = open(filename, 'wb' if fileformat == 'binary' else 'w')
+                files.append(output)
+            stages.append(Stage(output, storingperiod, statistics, fileformat, args.delim))
+        device.setmultiratecmd(cmdtype, stages, args.measuresnb, args.samplingperiod, args.pipelinedepth, args.stream, args.fields, args.flushinterval)
+    finally:
+        for output in files:
+            output.close()
+
+
 def collectdata3_cmd(args, device):
     '''Collectdata3 command.'''
-    device.setcollectcmd('CMD_REALTIME_DATA_3', args.output, args.delim, args.stdoutdisplay, args.measuresnb, args.storingperiod, args.samplingperiod)
+    if args.stage:
+        return stages_cmd('CMD_REALTIME_DATA_3', args, device)
+    device.setcollectcmd('CMD_REALTIME_DATA_3', args.output, args.delim, args.stdoutdisplay, args.measuresnb, args.storingperiod, args.samplingperiod, args.pipelinedepth, args.stream, args.fields, args.statistics, args.format, args.flushinterval)
         
 
 def collectdata4_cmd(args, device):
     '''Collectdata4 command.'''
-    device.setcollectcmd('CMD_REALTIME_DATA_4', args.output, args.delim, args.stdoutdisplay, args.measuresnb, args.storingperiod, args.samplingperiod)
+    if args.stage:
+        return stages_cmd('CMD_REALTIME_DATA_4', args, device)
+    device.setcollectcmd('CMD_REALTIME_DATA_4', args.output, args.delim, args.stdoutdisplay, args.measuresnb, args.storingperiod, args.samplingperiod, args.pipelinedepth, args.stream, args.fields, args.statistics, args.format, args.flushinterval)
         
 
-def get_cmd_parser(cmd, subparsers, help, func):
-    '''Make a subparser command.'''
+def multicollect_cmd(args, devices):
+    '''Multicollect command.'''
+    collector = MultiCollector(devices, args.url)
+    if '{board}' in args.output:                                                # one file per board
+        mode = 'wb' if args.format == 'binary' else 'w'
+        output = [open(args.output.format(board=i + 1), mode) for i in range(len(devices))]
+    elif args.output == '-':
+        output = stdout
+    else:
+        output = open(args.output, 'w')
+    try:
+        collector.collect(args.cmdtype, output, args.delim, args.measuresnb, args.storingperiod, args.samplingperiod, args.pipelinedepth, args.stream, args.fields, args.statistics, args.format, args.flushinterval)
+    finally:
+        for out in (output if isinstance(output, list) else [output]):
+            if out is not stdout:
+                out.close()
+
+
+def serve_cmd(args, device):
+    '''Serve command.'''
+    server = Server(device, args.listen, args.cmdtype, args.samplingperiod/100)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:                                                   # 'Ctrl' + 'C' detected
+        pass
+
+
+def stats_cmd(args, device):
+    '''Stats command.'''
+    scheduler = Scheduler(args.samplingperiod/100) if args.samplingperiod else None
+    try:
+        for i in range(args.count):
+            if scheduler is not None:
+                scheduler.wait()
+            try:
+                device.cmd(args.cmdtype)
+            except KeyboardInterrupt:
+                raise
+            except Exception:                                                   # counted by the statistics
+                pass
+    except KeyboardInterrupt:                                                   # 'Ctrl' + 'C' detected
+        pass
+    if args.json:
+        stdout.write(json.dumps(device.stats(), indent=1, sort_keys=True) + "\n")
+    else:
+        stdout.write(format_stats(device.stats()) + "\n")
+
+
+def emulate_cmd(args, device):
+    '''Emulate command.'''
+    faults = None
+    if args.badcrc or args.drop or args.extra or args.partial:
+        faults = Faults(args.badcrc, args.drop, args.extra, args.partial, args.seed)
+    emulators = []
+    for i in range(args.boards):
+        address = args.listen
+        if address.startswith('tcp:') and i > 0:                                # consecutive ports
+            host, port = address[4:].rsplit(':', 1)
+            address = 'tcp:%s:%d' % (host, int(port) + i if int(port) else 0)
+        emulators.append(Emulator(address, args.latency/1000, args.baudrate, faults, i + 1).start())
+        stdout.write("%s\n" % emulators[-1].url)
+    stdout.flush()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:                                                   # 'Ctrl' + 'C' detected
+        pass
+    finally:
+        for emulator in emulators:
+            emulator.shutdown()
+
+
+def benchmark_cmd(args, device):
+    '''Benchmark command.'''
+    results = benchmark.run(args.filter, args.duration, args.repeat)
+    if args.save:
+        benchmark.save(results, args.save)
+    if not args.compare:
+        stdout.write(benchmark.format_results(results) + "\n")
+        return
+    rows = benchmark.compare(results, benchmark.load(args.compare), args.threshold/100)
+    stdout.write(benchmark.format_report(rows, results) + "\n")
+    if [row for row in rows if row[4] == 'slower']:                             # regressions
+        sys.exit(1)
+
+
+def replay_cmd(args, device):
+    '''Replay command.'''
+    with Replay(args.capture_file) as replay:
+        if args.format == 'binary':
+            # binary data goes to the underlying buffer of text files
+            replay.record(args.cmdtype, getattr(args.output, 'buffer', args.output), args.pace, args.speed)
+        else:
+            replay.collect(args.cmdtype, args.output, args.delim, args.storingperiod,
+                           args.statistics, args.pace, args.speed)
+
+
+def fields_type(value):
+    '''Comma separated field names.'''
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def stage_type(value):
+    '''FILE:STORINGPERIOD:STATISTICS output stage.'''
+    try:
+        filename, storingperiod, statistics = value.rsplit(':', 2)
+        return filename, int(storingperiod), fields_type(statistics)
+    except ValueError:
+        raise argparse.ArgumentTypeError("%s is not FILE:STORINGPERIOD:STATISTICS" % value)
+
+
+def get_cmd_parser(cmd, subparsers, help, func, multiple=False):
+    '''Make a subparser command, taking several URLs if multiple.'''
     parser = subparsers.add_parser(cmd, help=help, description=help)
     parser.add_argument('--timeout', default=10.0, type=float,
                         help="Connection link timeout")
     parser.add_argument('--debug', action="store_true", default=False,
                         help='Display log')
-    parser.add_argument('url', action="store",
+    parser.add_argument('--trace', default=None,
+                        help='Dump the last raw data sent and received in a trace file '
+                             '(one file per board if it contains {board})')
+    parser.add_argument('--capture', default=None,
+                        help='Write all the raw data sent and received with timestamps in a capture file '
+                             '(one file per board if it contains {board})')
+    parser.add_argument('url', action="store", nargs='+' if multiple else None,
                         help="Specify URL for connection link. "
                              "E.g. tcp:iphost:port "
                              "or serial:/dev/ttyUSB0:19200:8N1")
@@ -70,6 +236,36 @@ def get_cmd_parser(cmd, subparsers, help, func):
     return parser
 
 
+def connect(args):
+    '''Connect the device, or the list of devices of several URLs.'''
+    if args.url is None:                                                        # no board, E.g. emulate
+        return None
+    if isinstance(args.url, list):
+        return [SimpleBGC32.from_url(url, args.timeout) for url in args.url]
+    return SimpleBGC32.from_url(args.url, args.timeout)
+
+
+def execute(args, device):
+    '''Execute the command, recording the raw data if a trace or capture file
+    is given.'''
+    if not (args.trace or args.capture):
+        return args.func(args, device)
+    devices = device if isinstance(device, list) else [device]
+    for i, dev in enumerate(devices):
+        if args.capture:
+            dev.start_capture(args.capture.format(board=i + 1))
+        else:
+            dev.start_trace()
+    try:
+        args.func(args, device)
+    finally:
+        for i, dev in enumerate(devices):
+            if args.capture:
+                dev.stop_capture()
+            else:
+                dev.stop_trace().dump(args.trace.format(board=i + 1))
+
+
 def main():
     '''Parse command-line arguments and execute SimpleBGC32 command.'''
 
@@ -86,11 +282,21 @@ def main():
     subparser = get_cmd_parser('getboardinfo', subparsers,
                                help='Get board and software information.',
                                func=getboardinfo_cmd)
+    subparser.add_argument('--infocache', default=None,
+                           help='JSON file caching the board information across sessions')
+    subparser.add_argument('--refresh', action="store_true", default=False,
+                           help='Request the board information again, needed after swapping '
+                                'boards running the same firmware on the link')
     
     # getboardinfo3 command
     subparser = get_cmd_parser('getboardinfo3', subparsers,
                                help='Get additionnal board information.',
                                func=getboardinfo3_cmd)
+    subparser.add_argument('--infocache', default=None,
+                           help='JSON file caching the board information across sessions')
+    subparser.add_argument('--refresh', action="store_true", default=False,
+                           help='Request the board information again, needed after swapping '
+                                'boards running the same firmware on the link')
     
     # getrealtimedata3 command
     subparser = get_cmd_parser('getrealtimedata3', subparsers,
@@ -114,6 +320,26 @@ def main():
                            help='period of sampling, 100ms, (default: 10)')
     subparser.add_argument('--storingperiod', default=10, type=int,
                            help='period of storing, 100ms, (default: 10)')
+    subparser.add_argument('--pipelinedepth', default=1, type=int,
+                           help='number of requests in flight, 1 if not pipelined (default: 1)')
+    subparser.add_argument('--stream', action="store_true", default=False,
+                           help='Board pushes data every sampling period (SimpleBGC 2.6 firmware)')
+    subparser.add_argument('--fields', default=None, type=fields_type,
+                           help='Comma separated fields to collect with the custom real-time data '
+                                'command, E.g. ANGLE_ROLL,ANGLE_PITCH (SimpleBGC 2.6 firmware)')
+    subparser.add_argument('--statistics', default=['mean'], type=fields_type,
+                           help='Comma separated statistics stored for each field, '
+                                'mean, min, max, stddev, rms or count (default: mean)')
+    subparser.add_argument('--format', default='csv', choices=['csv', 'binary'],
+                           help='csv stores the statistics of each storing period, '
+                                'binary records every sample (default: csv)')
+    subparser.add_argument('--flushinterval', default=1.0, type=float,
+                           help='maximum time in seconds before the output is written by the '
+                                'writer thread, 0 to write in the acquisition loop (default: 1)')
+    subparser.add_argument('--stage', action="append", default=None, type=stage_type,
+                           help='FILE:STORINGPERIOD:STATISTICS output stage, repeated to store each '
+                                'sample in several files, E.g. raw.csv:1:raw summary.csv:100:mean,rms '
+                                '(raw .bin files are binary), instead of --output')
 
     # collectdata4 command
     subparser = get_cmd_parser('collectdata4', subparsers,
@@ -132,6 +358,167 @@ def main():
                            help='period of sampling, 100ms, (default: 10)')
     subparser.add_argument('--storingperiod', default=10, type=int,
                            help='period of storing, 100ms, (default: 10)')
+    subparser.add_argument('--pipelinedepth', default=1, type=int,
+                           help='number of requests in flight, 1 if not pipelined (default: 1)')
+    subparser.add_argument('--stream', action="store_true", default=False,
+                           help='Board pushes data every sampling period (SimpleBGC 2.6 firmware)')
+    subparser.add_argument('--fields', default=None, type=fields_type,
+                           help='Comma separated fields to collect with the custom real-time data '
+                                'command, E.g. ANGLE_ROLL,ANGLE_PITCH (SimpleBGC 2.6 firmware)')
+    subparser.add_argument('--statistics', default=['mean'], type=fields_type,
+                           help='Comma separated statistics stored for each field, '
+                                'mean, min, max, stddev, rms or count (default: mean)')
+    subparser.add_argument('--format', default='csv', choices=['csv', 'binary'],
+                           help='csv stores the statistics of each storing period, '
+                                'binary records every sample (default: csv)')
+    subparser.add_argument('--flushinterval', default=1.0, type=float,
+                           help='maximum time in seconds before the output is written by the '
+                                'writer thread, 0 to write in the acquisition loop (default: 1)')
+    subparser.add_argument('--stage', action="append", default=None, type=stage_type,
+                           help='FILE:STORINGPERIOD:STATISTICS output stage, repeated to store each '
+                                'sample in several files, E.g. raw.csv:1:raw summary.csv:100:mean,rms '
+                                '(raw .bin files are binary), instead of --output')
+
+    # multicollect command
+    subparser = get_cmd_parser('multicollect', subparsers,
+                               help='Collect real-time data of several boards concurrently.',
+                               func=multicollect_cmd, multiple=True)
+    subparser.add_argument('--cmdtype', default='CMD_REALTIME_DATA_4',
+                           choices=['CMD_REALTIME_DATA_3', 'CMD_REALTIME_DATA_4'],
+                           help='Real-time data command (default: CMD_REALTIME_DATA_4)')
+    subparser.add_argument('--output', action="store", default='-',
+                           help='Filename where the merged output is written, with a BOARD column '
+                                '(default: standard out), or one file per board if it contains '
+                                '{board}, E.g. board{board}.csv')
+    subparser.add_argument('--delim', action="store", default=";",
+                           help='CSV char delimiter (default: ";")')
+    subparser.add_argument('--measuresnb', default=0, type=int,
+                           help='number of measures to realize, 0 if continue until break (Ctrl-C)')
+    subparser.add_argument('--samplingperiod', default=10, type=int,
+                           help='period of sampling, 100ms, (default: 10)')
+    subparser.add_argument('--storingperiod', default=10, type=int,
+                           help='period of storing, 100ms, (default: 10)')
+    subparser.add_argument('--pipelinedepth', default=1, type=int,
+                           help='number of requests in flight, 1 if not pipelined (default: 1)')
+    subparser.add_argument('--stream', action="store_true", default=False,
+                           help='Boards push data every sampling period (SimpleBGC 2.6 firmware)')
+    subparser.add_argument('--fields', default=None, type=fields_type,
+                           help='Comma separated fields to collect with the custom real-time data '
+                                'command, E.g. ANGLE_ROLL,ANGLE_PITCH (SimpleBGC 2.6 firmware)')
+    subparser.add_argument('--statistics', default=['mean'], type=fields_type,
+                           help='Comma separated statistics stored for each field, '
+                                'mean, min, max, stddev, rms or count (default: mean)')
+    subparser.add_argument('--format', default='csv', choices=['csv', 'binary'],
+                           help='csv stores the statistics of each storing period, '
+                                'binary records every sample, one file per board (default: csv)')
+    subparser.add_argument('--flushinterval', default=1.0, type=float,
+                           help='maximum time in seconds before the output is written by the '
+                                'writer thread (default: 1)')
+
+    # serve command
+    subparser = get_cmd_parser('serve', subparsers,
+                               help='Share the board with several clients over a socket.',
+                               func=serve_cmd)
+    subparser.add_argument('--listen', default='tcp:localhost:5000',
+                           help='Listening address, E.g. tcp:localhost:5000 '
+                                'or unix:/tmp/pysimplebgc.sock (default: tcp:localhost:5000)')
+    subparser.add_argument('--cmdtype', default='CMD_REALTIME_DATA_4',
+                           choices=['CMD_REALTIME_DATA_3', 'CMD_REALTIME_DATA_4'],
+                           help='Real-time data command polled and served to the clients '
+                                '(default: CMD_REALTIME_DATA_4)')
+    subparser.add_argument('--samplingperiod', default=1, type=int,
+                           help='period of polling, 10ms, (default: 1)')
+
+    # stats command
+    subparser = get_cmd_parser('stats', subparsers,
+                               help='Measure the round-trip latency, throughput and errors of a command.',
+                               func=stats_cmd)
+    subparser.add_argument('--cmdtype', default='CMD_REALTIME_DATA_4',
+                           choices=sorted(SimpleBGC32.CMDTYPEDEF),
+                           help='Requested command (default: CMD_REALTIME_DATA_4)')
+    subparser.add_argument('--count', default=100, type=int,
+                           help='number of requests (default: 100)')
+    subparser.add_argument('--samplingperiod', default=0, type=int,
+                           help='period of requests, 10ms, 0 for back-to-back requests (default: 0)')
+    subparser.add_argument('--json', action="store_true", default=False,
+                           help='Print the statistics as JSON')
+
+    # emulate command
+    subparser = subparsers.add_parser('emulate', help='Emulate boards on local TCP ports or pseudo-terminals.',
+                                      description='Emulate boards on local TCP ports or pseudo-terminals.')
+    subparser.add_argument('--debug', action="store_true", default=False,
+                           help='Display log')
+    subparser.add_argument('--listen', default='tcp:localhost:5000',
+                           help='Listening address, E.g. tcp:localhost:5000 or pty, '
+                                'the next boards listen on the next ports (default: tcp:localhost:5000)')
+    subparser.add_argument('--boards', default=1, type=int,
+                           help='number of emulated boards (default: 1)')
+    subparser.add_argument('--latency', default=0, type=float,
+                           help='delay before each response, ms (default: 0)')
+    subparser.add_argument('--baudrate', default=None, type=int,
+                           help='throughput of the emulated serial link, unlimited if not set')
+    subparser.add_argument('--badcrc', default=0, type=float,
+                           help='probability of a wrong checksum in a sent frame (default: 0)')
+    subparser.add_argument('--drop', default=0, type=float,
+                           help='probability of a missing byte in a sent frame (default: 0)')
+    subparser.add_argument('--extra', default=0, type=float,
+                           help='probability of an additional byte in a sent frame (default: 0)')
+    subparser.add_argument('--partial', default=0, type=float,
+                           help='probability of a sent frame cut before its end (default: 0)')
+    subparser.add_argument('--seed', default=None, type=int,
+                           help='seed of the injected faults, for reproducible runs')
+    subparser.set_defaults(func=emulate_cmd, url=None, trace=None, capture=None)
+
+    # replay command
+    subparser = subparsers.add_parser('replay', help='Decode the responses of a capture file.',
+                                      description='Decode the responses of a capture file.')
+    subparser.add_argument('--debug', action="store_true", default=False,
+                           help='Display log')
+    subparser.add_argument('capture_file', metavar='capture',
+                           help='Capture file written with the --capture option')
+    subparser.add_argument('--cmdtype', default='CMD_REALTIME_DATA_4',
+                           choices=sorted(SimpleBGC32.CMDTYPEDEF) + ['CMD_REALTIME_DATA_CUSTOM'],
+                           help='Decoded response (default: CMD_REALTIME_DATA_4)')
+    subparser.add_argument('--output', action="store", default=stdout,
+                           type=argparse.FileType('w'),
+                           help='Filename where output is written (default: standard out)')
+    subparser.add_argument('--delim', action="store", default=";",
+                           help='CSV char delimiter (default: ";")')
+    subparser.add_argument('--storingperiod', default=0, type=int,
+                           help='period of storing of the recorded timestamps, 10ms, '
+                                '0 to store every response (default: 0)')
+    subparser.add_argument('--statistics', default=['mean'], type=fields_type,
+                           help='Comma separated statistics stored for each field, '
+                                'mean, min, max, stddev, rms or count (default: mean)')
+    subparser.add_argument('--format', default='csv', choices=['csv', 'binary'],
+                           help='csv stores the statistics of each storing period, '
+                                'binary records every response (default: csv)')
+    subparser.add_argument('--pace', action="store_true", default=False,
+                           help='Replay at the recorded pace instead of the maximum speed')
+    subparser.add_argument('--speed', default=1.0, type=float,
+                           help='speed factor of the recorded pace (default: 1)')
+    subparser.set_defaults(func=replay_cmd, url=None, trace=None, capture=None)
+
+    # benchmark command
+    subparser = subparsers.add_parser('benchmark', help='Benchmark the protocol on an emulated board in memory.',
+                                      description='Benchmark the protocol on an emulated board in memory.')
+    subparser.add_argument('--debug', action="store_true", default=False,
+                           help='Display log')
+    subparser.add_argument('--filter', default=None,
+                           help='Regular expression of the benchmarks run, E.g. roundtrip')
+    subparser.add_argument('--duration', default=0.2, type=float,
+                           help='duration of each timed loop, seconds (default: 0.2)')
+    subparser.add_argument('--repeat', default=5, type=int,
+                           help='timed loops of each benchmark, the median is kept (default: 5)')
+    subparser.add_argument('--save', default=None,
+                           help='JSON file where the results are saved as a baseline')
+    subparser.add_argument('--compare', default=None,
+                           help='JSON baseline file compared with the results, the exit '
+                                'status is 1 if a benchmark is slower')
+    subparser.add_argument('--threshold', default=10, type=float,
+                           help='change of a benchmark reported as faster or slower, %% (default: 10), '
+                                'at least 30 for the round trips and the writes, 100 for the jitter')
+    subparser.set_defaults(func=benchmark_cmd, url=None, trace=None, capture=None)
 
     # Parse argv arguments
     try:
@@ -145,12 +532,12 @@ def main():
         if (isfunc == True):
             if args.debug:
                 active_logger()
-                device = SimpleBGC32.from_url(args.url, args.timeout)
-                args.func(args, device)
+                device = connect(args)
+                execute(args, device)
             else:
                 try:                
-                    device = SimpleBGC32.from_url(args.url, args.timeout)
-                    args.func(args, device)
+                    device = connect(args)
+                    execute(args, device)
                 except Exception as e:
                     parser.error('%s' % e)
         else:
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.aggregate
+    ---------------------
+
+    Aggregation of the records acquired during a storing period.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import division, unicode_literals
+import math
+from array import array
+from operator import itemgetter, mul
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+STATISTICS = ('mean', 'min', 'max', 'stddev', 'rms', 'count')
+
+
+class Accumulator(object):
+    '''Count, sum, sum of squares, min and max of the numeric fields of one
+    command, in arrays preallocated once for the whole collection.
+
+    :param codec: The codec of the command.
+    :param statistics: Statistics to output, in `STATISTICS`
+                       (default: mean).
+    '''
+
+    def __init__(self, codec, statistics=('mean',)):
+        for statistic in statistics:
+            if statistic not in STATISTICS:
+                raise ValueError("Unknown statistic %s" % statistic)
+        self.codec = codec
+        self.statistics = tuple(statistics)
+        # the text fields can not be aggregated
+        self.indexes = tuple(i for i in codec.valueindexes
+                             if codec.valuefmts[i] != '%s')
+        if len(self.indexes) == 1:
+            index = self.indexes[0]
+            self.getter = lambda record: (record[index],)
+        else:
+            self.getter = itemgetter(*self.indexes)
+        size = len(self.indexes)
+        self.sums = array('d', [0.0] * size)
+        self.sumsq = array('d', [0.0] * size)
+        self.mins = array('d', [0.0] * size)
+        self.maxs = array('d', [0.0] * size)
+        self.count = 0
+        # only the needed accumulators are updated
+        self.squares = 'stddev' in self.statistics or 'rms' in self.statistics
+        self.extremes = 'min' in self.statistics or 'max' in self.statistics
+
+    @property
+    def columns(self):
+        '''List of `(name, valuefmt)` of the output values.'''
+        columns = []
+        for i in self.indexes:
+            name = self.codec.names[i]
+            valuefmt = self.codec.valuefmts[i]
+            for statistic in self.statistics:
+                if statistic == 'mean':
+                    columns.append((name, valuefmt))
+                elif statistic == 'min':
+                    columns.append(('%s_MIN' % name, valuefmt))
+                elif statistic == 'max':
+                    columns.append(('%s_MAX' % name, valuefmt))
+                elif statistic == 'stddev':
+                    columns.append(('%s_STDDEV' % name, '%f'))
+                elif statistic == 'rms':
+                    columns.append(('%s_RMS' % name, '%f'))
+        if 'count' in self.statistics:
+            columns.append(('SAMPLES', '%d'))
+        return columns
+
+    def reset(self):
+        '''Starts a new storing period.'''
+        self.count = 0
+
+    def add(self, record):
+        '''Adds the values of a record.'''
+        values = self.getter(record)
+        if self.count == 0:
+            self.sums[:] = array('d', values)
+            self.sumsq[:] = array('d', map(mul, values, values))
+            self.mins[:] = self.maxs[:] = array('d', values)
+        else:
+            sums = self.sums
+            for j, value in enumerate(values):
+                sums[j] += value
+            if self.squares:
+                sumsq = self.sumsq
+                for j, value in enumerate(values):
+                    sumsq[j] += value * value
+            if self.extremes:
+                mins, maxs = self.mins, self.maxs
+                for j, value in enumerate(values):
+                    if value < mins[j]:
+                        mins[j] = value
+                    elif value > maxs[j]:
+                        maxs[j] = value
+        self.count += 1
+
+    def values(self):
+        '''Returns the output values of the period, in `columns` order.'''
+        count = self.count or 1
+        values = []
+        for j in range(len(self.indexes)):
+            mean = self.sums[j] / count
+            for statistic in self.statistics:
+                if statistic == 'mean':
+                    values.append(mean)
+                elif statistic == 'min':
+                    values.append(self.mins[j])
+                elif statistic == 'max':
+                    values.append(self.maxs[j])
+                elif statistic == 'stddev':
+                    variance = self.sumsq[j] / count - mean * mean
+                    values.append(math.sqrt(max(variance, 0.0)))
+                elif statistic == 'rms':
+                    values.append(math.sqrt(self.sumsq[j] / count))
+        if 'count' in self.statistics:
+            values.append(self.count)
+        return values
+
+
+class NumpyAccumulator(Accumulator):
+    '''Accumulator storing the records of the period in a preallocated NumPy
+    array, the statistics are computed in one vectorized pass when the
+    period is stored.
+
+    :param capacity: Number of records of a storing period, the array grows
+                     if more records are added.
+    '''
+
+    def __init__(self, codec, statistics=('mean',), capacity=100):
+        Accumulator.__init__(self, codec, statistics)
+        self.samples = numpy.empty((max(capacity, 1), len(self.indexes)))
+
+    def add(self, record):
+        if self.count == len(self.samples):
+            self.samples = numpy.resize(self.samples,
+                                        (2 * len(self.samples),
+                                         len(self.indexes)))
+        self.samples[self.count] = self.getter(record)
+        self.count += 1
+
+    def values(self):
+        if self.count == 0:
+            samples = numpy.zeros((1, len(self.indexes)))
+        else:
+            samples = self.samples[:self.count]
+        results = {'mean': samples.mean(axis=0)}
+        if 'min' in self.statistics:
+            results['min'] = samples.min(axis=0)
+        if 'max' in self.statistics:
+            results['max'] = samples.max(axis=0)
+        if 'stddev' in self.statistics:
+            results['stddev'] = samples.std(axis=0)
+        if 'rms' in self.statistics:
+            results['rms'] = numpy.sqrt(numpy.square(samples).mean(axis=0))
+        values = []
+        for j in range(len(self.indexes)):
+            for statistic in self.statistics:
+                if statistic != 'count':
+                    values.append(float(results[statistic][j]))
+        if 'count' in self.statistics:
+            values.append(self.count)
+        return values
+
+
+def period_capacity(storingperiod, samplingperiod):
+    '''Returns the number of records of a storing period, None if unknown
+    because the records are acquired back-to-back (samplingperiod 0).'''
+    if not samplingperiod:
+        return None
+    return max(1, -(-storingperiod // samplingperiod))
+
+
+def accumulator(codec, statistics=('mean',), capacity=None):
+    '''Returns a `NumpyAccumulator` if NumPy is installed and the number of
+    records of a period is known, an `Accumulator` otherwise.'''
+    if numpy is not None and capacity:
+        return NumpyAccumulator(codec, statistics, capacity)
+    return Accumulator(codec, statistics)
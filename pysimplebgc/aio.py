@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.aio
+    ---------------
+
+    Asyncio client of the Basecam SimpleBGC Controller boards.
+
+    Serial links need the `pyserial-asyncio` package.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+import asyncio
+import time
+
+from .logger import LOGGER
+from .device import SimpleBGC32
+from .parser import FrameParser
+from .stream import stream_codec, stream_frame, check_confirm
+from .exceptions import NoDeviceException, BadCmdException, BadDataException
+
+
+async def open_url(url):
+    '''Returns the `(reader, writer)` streams of a `PyLink` connection URL,
+    E.g. tcp:iphost:port or serial:/dev/ttyUSB0:19200:8N1.'''
+    args = url.split(':')
+    mode = args[0].lower()
+    try:
+        if mode == 'tcp':
+            return await asyncio.open_connection(args[1], int(args[2]))
+        elif mode == 'serial':
+            try:
+                import serial_asyncio
+            except ImportError:
+                raise ValueError('Serial links need pyserial-asyncio')
+            kwargs = {}
+            if len(args) > 2:
+                kwargs['baudrate'] = int(args[2])
+            if len(args) > 3:
+                kwargs['bytesize'] = int(args[3][0])
+                kwargs['parity'] = args[3][1]
+                kwargs['stopbits'] = int(args[3][2])
+            return await serial_asyncio.open_serial_connection(url=args[1],
+                                                               **kwargs)
+    except IndexError:
+        pass
+    raise ValueError('Bad url link specified')
+
+
+class AsyncSimpleBGC32(object):
+    '''Asyncio equivalent of `SimpleBGC32`, commands are serialized on the
+    link by a lock.
+
+    :param reader: The `asyncio.StreamReader` of the link.
+    :param writer: The `asyncio.StreamWriter` of the link.
+    :param timeout: Time in seconds to wait for a response (default: 10).
+    '''
+    CMDTYPEDEF = SimpleBGC32.CMDTYPEDEF
+    CUSTOMDATADEF = SimpleBGC32.CUSTOMDATADEF
+    CMD_CONFIRM = SimpleBGC32.CMD_CONFIRM
+    CMD_DATA_STREAM_INTERVAL = SimpleBGC32.CMD_DATA_STREAM_INTERVAL
+    CMD_REALTIME_DATA_CUSTOM = SimpleBGC32.CMD_REALTIME_DATA_CUSTOM
+    CODECS = SimpleBGC32.CODECS
+    CUSTOMCODECS = SimpleBGC32.CUSTOMCODECS
+
+    # the codecs are shared with the blocking client
+    getcmdlist = SimpleBGC32.getcmdlist
+    custommask = SimpleBGC32.custommask
+    customcmddata = SimpleBGC32.customcmddata
+    customcodec = SimpleBGC32.customcodec
+
+    def __init__(self, reader, writer, timeout=10):
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        self.cmdtypelist = self.CMDTYPEDEF
+        self.codecs = self.CODECS
+        self.parser = FrameParser(dict((codec.id, codec.respbodysize)
+                                       for codec in self.codecs.values()))
+        self.lock = asyncio.Lock()
+
+    @classmethod
+    async def from_url(cls, url, timeout=10):
+        ''' Get device from url.
+
+        :param url: A `PyLink` connection URL.
+        :param timeout: Set a read timeout value.
+        '''
+        reader, writer = await open_url(url)
+        return cls(reader, writer, timeout)
+
+    async def cmd(self, cmdtype, cmddata=""):
+        ''' Send command and returns response received as a record
+
+        :param cmdtype: command type,'CMD_BOARD_INFO', etc...
+        :param cmddata: command data, array of char
+        '''
+        if cmdtype not in self.codecs:
+            raise BadCmdException()
+        return await self._request(self.codecs[cmdtype], cmddata)
+
+    async def customcmd(self, mask=0, fields=None):
+        ''' Send CMD_REALTIME_DATA_CUSTOM and returns response received as a
+        record
+
+        :param mask: DATA_MASK, bits of the data groups in CUSTOMDATADEF
+        :param fields: names of the fields to decode
+        '''
+        return await self._request(self.customcodec(mask, fields),
+                                   self.customcmddata(mask, fields))
+
+    def stream(self, cmdtype='CMD_REALTIME_DATA_4', interval=10, mask=0,
+               fields=None):
+        '''Returns an `AsyncDataStream` of the data pushed by the board.'''
+        return AsyncDataStream(self, cmdtype, interval, mask, fields)
+
+    async def close(self):
+        '''Closes the link.'''
+        self.writer.close()
+        await self.writer.wait_closed()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def _request(self, codec, cmddata):
+        async with self.lock:
+            self.writer.write(codec.encode(cmddata))
+            await self.writer.drain()
+            frame = await self._wait_frame(codec.id)
+        return codec.decode(frame.body)
+
+    async def _wait_frame(self, cmdid):
+        try:
+            return await asyncio.wait_for(self._read_frame(cmdid),
+                                          self.timeout)
+        except asyncio.TimeoutError:
+            LOGGER.info("Check RESPONSE: BAD (%s)", cmdid)
+            self.parser.clear()
+            raise BadDataException()
+
+    async def _read_frame(self, cmdid):
+        while True:
+            for frame in self.parser:
+                if frame.cmdid == cmdid:
+                    return frame
+                LOGGER.info("Skip frame: %s", frame.cmdid)
+            data = await self.reader.read(4096)
+            if not data:
+                raise NoDeviceException()
+            self.parser.feed(data)
+
+
+class AsyncDataStream(object):
+    '''Async iterator of the `(timestamp, record)` tuples pushed by the board
+    every `interval` ms, see `DataStream`. The device is locked while the
+    stream runs.
+    '''
+
+    def __init__(self, device, cmdtype='CMD_REALTIME_DATA_4', interval=10,
+                 mask=0, fields=None):
+        self.device = device
+        self.interval = interval
+        self.codec, self.config = stream_codec(device, cmdtype, mask, fields)
+        self.running = False
+
+    async def start(self):
+        '''Subscribes to the stream.'''
+        if self.running:
+            return
+        await self.device.lock.acquire()
+        try:
+            await self._subscribe(self.interval)
+        except Exception:
+            self.device.lock.release()
+            raise
+        self.running = True
+
+    async def stop(self):
+        '''Unsubscribes from the stream.'''
+        if not self.running:
+            return
+        self.running = False
+        try:
+            await self._subscribe(0)
+        except Exception as e:
+            LOGGER.error("Unsubscribe stream: BAD (%s)", e)
+        finally:
+            self.device.parser.clear()
+            self.device.lock.release()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.running:
+            raise StopAsyncIteration
+        while True:
+            frame = await self.device._wait_frame(self.codec.id)
+            if len(frame.body) == self.codec.respbodysize:
+                return time.time(), self.codec.decode(frame.body)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.stop()
+
+    async def _subscribe(self, interval):
+        device = self.device
+        LOGGER.info("try subscribe stream : %s %d ms", self.codec.cmdtype,
+                    interval)
+        device.writer.write(stream_frame(device, self.codec, interval,
+                                         self.config))
+        await device.writer.drain()
+        check_confirm(device, await device._wait_frame(device.CMD_CONFIRM))
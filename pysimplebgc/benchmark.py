@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.benchmark
+    ---------------------
+
+    Benchmarks of the protocol hot path, with JSON baselines to compare the
+    releases : command encoding, response decoding and validation, round
+    trips over an in-memory `LoopbackLink`, jitter of the collection loop
+    and output write rates.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import division, unicode_literals
+import io
+import re
+import json
+import time
+import platform
+import tempfile
+from datetime import datetime
+from collections import namedtuple
+
+from . import VERSION
+from .device import SimpleBGC32
+from .emulator import LoopbackLink
+from .codec import pack_frame
+from .parser import FrameParser
+from .checksum import scan_frames
+from .recording import BinaryWriter
+from .writer import writer
+
+
+# value of a benchmark, better is 'higher' or 'lower'
+Result = namedtuple('Result', 'name value unit better')
+
+BENCHMARKS = []
+
+# minimum thresholds of compare by name prefix : the round trips, the writes
+# and the collection jitter depend on thread switches, sleeps and the file
+# system more than on the code, they vary more between runs, the maximum
+# jitter most of all
+THRESHOLDS = (('roundtrip.', 0.3), ('write.', 0.3), ('collect.', 1.0),
+              ('collect.jitter_max', 5.0))
+
+
+def benchmark(func):
+    '''Registers a function yielding the `Result` of benchmarks of a
+    `Suite`.'''
+    BENCHMARKS.append(func)
+    return func
+
+
+def timeit(func, duration=0.2, repeat=5):
+    '''Returns the median time in seconds of one call of func, over
+    `repeat` loops of about `duration` seconds.'''
+    def loop(number):
+        start = time.perf_counter()
+        for i in range(number):
+            func()
+        return time.perf_counter() - start
+    number = 1
+    while loop(number) < duration / 10:
+        number *= 10
+    number = max(1, int(number * duration / max(loop(number), 1e-9)))
+    times = sorted(loop(number) for i in range(repeat))
+    return times[len(times) // 2] / number
+
+
+class Suite(object):
+    '''Selection and duration of the benchmarks run.
+
+    :param pattern: Regular expression of the names of the benchmarks run,
+                    all if None.
+    :param duration: Duration in seconds of each timed loop (default: 0.2).
+    :param repeat: Number of timed loops, the median is kept (default: 5).
+    '''
+
+    def __init__(self, pattern=None, duration=0.2, repeat=5):
+        self.pattern = pattern
+        self.duration = duration
+        self.repeat = repeat
+
+    def selected(self, name):
+        return self.pattern is None or re.search(self.pattern, name) is not None
+
+    def rate(self, name, func, count=1, unit='ops/s'):
+        '''Returns the `Result` of a function doing `count` operations, None
+        if the benchmark is not selected.'''
+        if not self.selected(name):
+            return None
+        return Result(name, count / timeit(func, self.duration, self.repeat),
+                      unit, 'higher')
+
+
+def loopback_device():
+    '''Returns a device connected to an emulated board in memory.'''
+    return SimpleBGC32(LoopbackLink())
+
+
+@benchmark
+def codec_benchmarks(suite):
+    device = loopback_device()
+    board = device.link.board
+    now = time.monotonic()
+    for cmdtype, codec in sorted(device.codecs.items()):
+        body = board.body(codec, now)
+        response = pack_frame(codec.id, body)
+        if codec.cmdbodysize == 0:
+            yield suite.rate('encode.%s' % cmdtype,
+                             lambda: device._pack_command(cmdtype))
+        yield suite.rate('decode.%s' % cmdtype, lambda: codec.decode(body))
+        yield suite.rate('unpack.%s' % cmdtype,
+                         lambda: device._unpack_response(codec.id, response))
+    body = board.body(device.codecs['CMD_REALTIME_DATA_4'], now)
+    yield suite.rate('checksum8.%dB' % len(body),
+                     lambda: device._checksum8bytes(body))
+
+
+@benchmark
+def parser_benchmarks(suite):
+    device = loopback_device()
+    codec = device.codecs['CMD_REALTIME_DATA_4']
+    data = pack_frame(codec.id, device.link.board.body(
+        codec, time.monotonic())) * 1000
+    parser = FrameParser(dict((codec.id, codec.respbodysize)
+                              for codec in device.codecs.values()))
+
+    def parse():
+        parser.feed(data)
+        for frame in parser:
+            pass
+    yield suite.rate('parser.frames', parse, 1000, 'frames/s')
+    yield suite.rate('scan_frames.MB',
+                     lambda: scan_frames(data, parser.bodysizes),
+                     len(data) / 1e6, 'MB/s')
+
+
+@benchmark
+def roundtrip_benchmarks(suite):
+    device = loopback_device()
+    for cmdtype in sorted(device.codecs):
+        yield suite.rate('roundtrip.cmd.%s' % cmdtype,
+                         lambda: device.cmd(cmdtype))
+    yield suite.rate('roundtrip.setcmd.CMD_REALTIME_DATA_4',
+                     lambda: device.setcmd('CMD_REALTIME_DATA_4'))
+    yield suite.rate('roundtrip.customcmd',
+                     lambda: device.customcmd(fields=['ANGLE_ROLL',
+                                                      'ANGLE_PITCH',
+                                                      'ANGLE_YAW']))
+
+
+@benchmark
+def collect_benchmarks(suite):
+    if not suite.selected('collect.jitter'):
+        return
+    device = loopback_device()
+    codec = device.codecs['CMD_REALTIME_DATA_4']
+    # sampling every 10ms, as many samples as the duration of 5 benchmarks
+    samples = max(10, int(suite.duration * 5 / 0.01))
+    # lateness of each wake up from its own deadline, the skipped deadlines
+    # are counted as overruns
+    stats = device._collect(codec, lambda: device.cmd('CMD_REALTIME_DATA_4'),
+                            writer([io.StringIO()], 0), ';', samples, 1, 1,
+                            ('mean',))
+    yield Result('collect.jitter_mean', stats['jitter_mean'] * 1000, 'ms',
+                 'lower')
+    yield Result('collect.jitter_max', stats['jitter_max'] * 1000, 'ms',
+                 'lower')
+
+
+@benchmark
+def write_benchmarks(suite):
+    device = loopback_device()
+    codec = device.codecs['CMD_REALTIME_DATA_4']
+    record = device.cmd('CMD_REALTIME_DATA_4')
+    row = ';'.join('%d' % value for value in record
+                   if not isinstance(value, bytes)) + '\n'
+    rows = 10000
+    for name, flushinterval in (('direct', 0), ('threaded', 1.0)):
+        def write():
+            with tempfile.TemporaryFile('w') as fd:
+                output = writer([fd], flushinterval)
+                for i in range(rows):
+                    output.write(row)
+                output.close()
+        yield suite.rate('write.csv.%s' % name, write, rows, 'rows/s')
+
+    def record_rows():
+        with tempfile.TemporaryFile('wb') as fd:
+            output = BinaryWriter(fd, codec)
+            for i in range(rows):
+                output.write(0.0, record)
+            output.flush()
+    yield suite.rate('write.binary', record_rows, rows, 'rows/s')
+
+
+def run(pattern=None, duration=0.2, repeat=5):
+    '''Returns the results of the benchmarks whose name matches the regular
+    expression `pattern`, as a dict by name.'''
+    suite = Suite(pattern, duration, repeat)
+    results = {}
+    for func in BENCHMARKS:
+        for result in func(suite):
+            if result is not None:
+                results[result.name] = result
+    return results
+
+
+def save(results, filename):
+    '''Writes the results in a JSON baseline file.'''
+    data = {'version': VERSION, 'python': platform.python_version(),
+            'machine': platform.machine(),
+            'date': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+            'results': dict((name, {'value': result.value, 'unit': result.unit,
+                                    'better': result.better})
+                            for name, result in results.items())}
+    with io.open(filename, 'w', encoding='utf-8') as fd:
+        fd.write(json.dumps(data, indent=1, sort_keys=True))
+
+
+def load(filename):
+    '''Returns the results of a JSON baseline file, as a dict by name.'''
+    with io.open(filename, 'r', encoding='utf-8') as fd:
+        data = json.load(fd)
+    return dict((name, Result(name, value['value'], value['unit'],
+                              value['better']))
+                for name, value in data['results'].items())
+
+
+def compare(results, baseline, threshold=0.1, thresholds=THRESHOLDS):
+    '''Returns the (name, baseline value, value, change, status) of the
+    benchmarks : the change is the relative improvement, positive if
+    better, and the status is 'faster' or 'slower' beyond the threshold,
+    'same' within, 'new' without baseline.
+
+    :param thresholds: Minimum thresholds by name prefix, see `THRESHOLDS`.
+    '''
+    rows = []
+    for name in sorted(results):
+        result = results[name]
+        base = baseline.get(name)
+        if base is None or not base.value:
+            rows.append((name, None, result.value, None, 'new'))
+            continue
+        change = (result.value - base.value) / base.value
+        if result.better == 'lower':
+            change = -change
+        limit = max([threshold] + [value for prefix, value in thresholds
+                                   if name.startswith(prefix)])
+        if change > limit:
+            status = 'faster'
+        elif change < -limit:
+            status = 'slower'
+        else:
+            status = 'same'
+        rows.append((name, base.value, result.value, change, status))
+    return rows
+
+
+def format_results(results):
+    '''Returns the results as text, one line per benchmark.'''
+    return '\n'.join('%-45s %14.3f %s' % (name, results[name].value,
+                                          results[name].unit)
+                     for name in sorted(results))
+
+
+def format_report(rows, results):
+    '''Returns the comparison rows as text, one line per benchmark.'''
+    lines = ['%-45s %14s %14s %8s' % ('benchmark', 'baseline', 'current',
+                                      'change')]
+    for name, base, value, change, status in rows:
+        lines.append('%-45s %14s %14.3f %8s %s %s' % (
+            name, '-' if base is None else '%.3f' % base, value,
+            '-' if change is None else '%+.1f%%' % (change * 100),
+            results[name].unit, '' if status == 'same' else status.upper()))
+    return '\n'.join(lines)
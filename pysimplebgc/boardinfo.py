@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.boardinfo
+    ---------------------
+
+    Cache of the static board information across sessions.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import io
+import os
+import json
+import threading
+import binascii
+
+from .logger import LOGGER
+
+
+class BoardInfoCache(object):
+    '''JSON file of the CMD_BOARD_INFO_3 response bodies. The bodies are
+    stored by board, with the key returned by `boardkey`, and the link URLs
+    where each board was found point to their board. A cached body is only
+    returned if the firmware of the board, given by the cheap
+    CMD_BOARD_INFO request (see `firmwarekey`), is the cached one.
+
+    The protocol has no cheaper request identifying a board than
+    CMD_BOARD_INFO_3 itself : a board swapped with another board running the
+    same firmware on the same link is not detected, the link must then be
+    invalidated (`invalidate`, `--refresh` option).
+
+    :param filename: Path of the JSON file, created on the first `put`.
+    '''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.boards = {}
+        self.links = {}
+        if os.path.exists(filename):
+            with io.open(filename, 'r', encoding='utf-8') as fd:
+                data = json.load(fd)
+            self.boards = data.get('boards', {})
+            self.links = data.get('links', {})
+
+    @staticmethod
+    def boardkey(deviceID, mcuID):
+        '''Returns the key of a board from its CMD_BOARD_INFO_3 ids.'''
+        return '%s-%s' % (binascii.hexlify(deviceID).decode('ascii'),
+                          binascii.hexlify(mcuID).decode('ascii'))
+
+    @staticmethod
+    def firmwarekey(boardinfo):
+        '''Returns the key of a firmware from its CMD_BOARD_INFO record.'''
+        return '%d-%d-%d' % (boardinfo.BOARD_VER, boardinfo.FIRMWARE_VER,
+                             boardinfo.FRW_EXTRA_ID)
+
+    def get(self, url, cmdtype, firmware):
+        '''Returns the cached response body of the board of a link, None if
+        unknown or if the board now behind the link runs another firmware.
+
+        :param firmware: The `firmwarekey` of the board behind the link.
+        '''
+        board = self.boards.get(self.links.get(url), {})
+        body = board.get(cmdtype)
+        if body is None:
+            return None
+        if board.get('FIRMWARE') != firmware:
+            LOGGER.info("Check INFOCACHE: CHANGED (%s,%s)", url, firmware)
+            return None
+        LOGGER.info("Check INFOCACHE: OK (%s,%s)", url, cmdtype)
+        return binascii.unhexlify(body.encode('ascii'))
+
+    def put(self, url, key, cmdtype, body, firmware):
+        '''Stores the response body of the board `key` found on a link.'''
+        with self.lock:
+            self.links[url] = key
+            board = self.boards.setdefault(key, {})
+            if board.get('FIRMWARE') != firmware:
+                # the other bodies are of the previous firmware
+                board.clear()
+                board['FIRMWARE'] = firmware
+            board[cmdtype] = binascii.hexlify(body).decode('ascii')
+            self.save()
+
+    def invalidate(self, url=None):
+        '''Forgets the board of a link, all the boards if url is None, e.g.
+        after a firmware update.'''
+        with self.lock:
+            if url is None:
+                self.boards.clear()
+                self.links.clear()
+            else:
+                key = self.links.pop(url, None)
+                self.boards.pop(key, None)
+                for link in [link for link, linkkey in self.links.items()
+                             if linkkey == key]:
+                    del self.links[link]
+            self.save()
+
+    def save(self):
+        '''Writes the cache file.'''
+        tmpname = self.filename + '.tmp'
+        with io.open(tmpname, 'w', encoding='utf-8') as fd:
+            fd.write(json.dumps({'boards': self.boards, 'links': self.links},
+                                indent=1, sort_keys=True))
+        os.replace(tmpname, self.filename)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.bulk
+    ----------------
+
+    Bulk decoding of the responses found in a buffer of received frames
+    into NumPy structured arrays, e.g. for the offline analysis of long
+    captures. NumPy is optional : the functions of this module raise
+    `ImportError` without it, the rest of the package does not need it.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+
+from .parser import HEADER_SIZE
+from .checksum import scan_frames
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def require_numpy():
+    if numpy is None:
+        raise ImportError("NumPy is required for the bulk decoding, "
+                          "pip install PySimpleBGC[numpy]")
+
+
+def frame_dtype(codec):
+    '''Returns the NumPy structured dtype of a whole response frame of the
+    codec : the header, the response fields and the body checksum.'''
+    require_numpy()
+    return codec.dtype(offset=HEADER_SIZE,
+                       itemsize=HEADER_SIZE + codec.respbodysize + 1,
+                       prefix=[('START', 'u1', 0), ('CMDID', 'u1', 1),
+                               ('SIZE', 'u1', 2), ('HEADERCRC', 'u1', 3),
+                               ('DATACRC', 'u1', HEADER_SIZE +
+                                codec.respbodysize)])
+
+
+def find_frames(data, codec):
+    '''Returns the offsets of the valid response frames of the codec in a
+    buffer, the corrupted frames and the frames of other commands are
+    skipped as `FrameParser` does.'''
+    require_numpy()
+    frames = scan_frames(data, {codec.id: codec.respbodysize})
+    return numpy.array([offset for offset, cmdid
+                        in zip(frames.offsets, frames.cmdids)
+                        if cmdid == codec.id], dtype=numpy.intp)
+
+
+def frame_bodies(data, offsets, bodysize):
+    '''Returns a (frames, bodysize) uint8 array of the bodies of the frames
+    at offsets.'''
+    require_numpy()
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    return buf[numpy.asarray(offsets, dtype=numpy.intp)[:, None] +
+               (HEADER_SIZE + numpy.arange(bodysize))]
+
+
+def decode_frames(data, codec, offsets=None):
+    '''Returns the responses of the codec found in a buffer as a NumPy
+    structured array with one field per response field, E.g.
+    `decode_frames(data, codec)['ANGLE_ROLL']`. Back-to-back frames are
+    decoded without copy, the array is then a view of the buffer.
+
+    :param data: A bytes-like object of received frames.
+    :param codec: The codec of the decoded command.
+    :param offsets: Offsets of the frames, see `find_frames`.
+    '''
+    require_numpy()
+    if offsets is None:
+        offsets = find_frames(data, codec)
+    count = len(offsets)
+    framesize = HEADER_SIZE + codec.respbodysize + 1
+    if count and (numpy.diff(offsets) == framesize).all():
+        return numpy.ndarray(count, buffer=memoryview(data),
+                             dtype=codec.dtype(offset=HEADER_SIZE,
+                                               itemsize=framesize),
+                             offset=int(offsets[0]))
+    bodies = frame_bodies(data, offsets, codec.respbodysize)
+    return bodies.view(codec.dtype()).reshape(count)
+
+
+def to_columns(records):
+    '''Returns a dict of contiguous arrays by field name of a structured
+    array, the text fields excluded.'''
+    require_numpy()
+    return dict((name, numpy.ascontiguousarray(records[name]))
+                for name in records.dtype.names
+                if records.dtype[name].kind != 'S')
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.checksum
+    --------------------
+
+    Checksums of the serial protocol, and validation of all the frames of
+    a recorded buffer at once.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+from collections import namedtuple
+
+from .utils import is_text
+from .parser import START_BYTE, HEADER_SIZE
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+STARTBYTES = bytes(bytearray([START_BYTE]))
+
+# offsets, command ids and body sizes of the valid frames of a buffer, lists
+# of ints whatever the scan
+Frames = namedtuple('Frames', 'offsets cmdids sizes')
+
+
+def checksum8(data):
+    '''Returns the 8 bits checksum of the protocol, the sum of the bytes
+    modulo 256.
+
+    >>> checksum8(b'\\x19\\x00')
+    25
+    '''
+    if is_text(data):
+        data = data.encode('latin-1')
+    return sum(data) & 0xFF
+
+
+def scan_frames(data, bodysizes=None):
+    '''Returns the `Frames` found in a buffer of received data, skipping
+    the corrupted data as `FrameParser` does. The frames are validated in
+    one vectorized pass when NumPy is installed.
+
+    :param data: A bytes-like object, e.g. a memory-mapped capture.
+    :param bodysizes: Optional dict of expected body size by command id.
+    '''
+    if numpy is not None:
+        return _scan_numpy(data, bodysizes or {})
+    if not hasattr(data, 'find'):
+        data = bytes(data)
+    return _scan(data, bodysizes or {})
+
+
+def _scan(buf, bodysizes):
+    offsets, cmdids, sizes = [], [], []
+    view = memoryview(buf)
+    length = len(buf)
+    start = buf.find(STARTBYTES)
+    while 0 <= start <= length - HEADER_SIZE:
+        cmdid = buf[start + 1]
+        size = buf[start + 2]
+        end = start + HEADER_SIZE + size + 1
+        expected = bodysizes.get(cmdid)
+        if ((cmdid + size) & 0xFF == buf[start + 3] and
+                (expected is None or expected == size) and
+                end <= length and
+                sum(view[start + HEADER_SIZE:end - 1]) & 0xFF == buf[end - 1]):
+            offsets.append(start)
+            cmdids.append(cmdid)
+            sizes.append(size)
+        else:
+            end = start + 1
+        start = buf.find(STARTBYTES, end)
+    return Frames(offsets, cmdids, sizes)
+
+
+def _scan_numpy(data, bodysizes):
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    length = len(buf)
+    # every start byte followed by a full header is a candidate frame
+    starts = numpy.flatnonzero(buf[:max(length - HEADER_SIZE + 1, 0)] ==
+                               START_BYTE)
+    cmdids = buf[starts + 1].astype(numpy.intp)
+    sizes = buf[starts + 2].astype(numpy.intp)
+    ends = starts + HEADER_SIZE + sizes + 1
+    valid = ((cmdids + sizes) & 0xFF) == buf[starts + 3]
+    if bodysizes:
+        expected = numpy.full(256, -1, dtype=numpy.intp)
+        for cmdid, size in bodysizes.items():
+            expected[cmdid] = size
+        valid &= (expected[cmdids] < 0) | (expected[cmdids] == sizes)
+    valid &= ends <= length
+    # body sums from the cumulative sum of the buffer
+    sums = numpy.zeros(length + 1, dtype=numpy.int64)
+    numpy.cumsum(buf, out=sums[1:])
+    checked = numpy.minimum(ends, length) - 1
+    bodysums = sums[checked] - sums[numpy.minimum(starts + HEADER_SIZE,
+                                                  checked)]
+    valid &= (bodysums & 0xFF) == buf[checked]
+    # the valid candidates inside an accepted frame are skipped
+    offsets, frameids, framesizes = [], [], []
+    position = 0
+    for start, end, cmdid, size in zip(starts[valid].tolist(),
+                                       ends[valid].tolist(),
+                                       cmdids[valid].tolist(),
+                                       sizes[valid].tolist()):
+        if start >= position:
+            offsets.append(start)
+            frameids.append(cmdid)
+            framesizes.append(size)
+            position = end
+    return Frames(offsets, frameids, framesizes)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.codec
+    -----------------
+
+    Precompiled encoders and decoders for the commands of the SimpleBGC
+    serial protocol.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import re
+import struct
+from collections import namedtuple
+
+from .compat import bytes
+from .utils import is_bytes
+
+
+def unique_names(names):
+    '''Returns field names usable as record attributes : the repeated names
+    of the command table ('reserved', ...) get a numeric suffix.
+
+    >>> unique_names(['reserved', 'ANGLE_YAW', 'reserved'])
+    ('reserved', 'ANGLE_YAW', 'reserved_2')
+    '''
+    seen = {}
+    unique = []
+    for name in names:
+        seen[name] = seen.get(name, 0) + 1
+        if seen[name] > 1:
+            name = '%s_%d' % (name, seen[name])
+        unique.append(name)
+    return tuple(unique)
+
+
+# struct format of a field, with the padding of the skipped fields
+FRAMEFMT_RE = re.compile(r'^(?:(\d*)x)?(\d*[a-zA-Z?])(?:(\d*)x)?$')
+
+# NumPy types of the struct formats
+NUMPY_TYPES = {'b': 'i1', 'B': 'u1', '?': '?', 'h': '<i2', 'H': '<u2',
+               'i': '<i4', 'I': '<u4', 'l': '<i4', 'L': '<u4', 'q': '<i8',
+               'Q': '<u8', 'f': '<f4', 'd': '<f8', 's': 'S'}
+
+
+def split_framefmt(framefmt):
+    '''Returns the leading padding, the value format and the trailing padding
+    of a field struct format.
+
+    >>> split_framefmt('4xh2x')
+    (4, 'h', 2)
+    '''
+    match = FRAMEFMT_RE.match(framefmt)
+    if match is None:
+        raise ValueError("Bad field format %s" % framefmt)
+    before, valuefmt, after = match.groups()
+    return ((int(before or 1) if before is not None else 0), valuefmt,
+            (int(after or 1) if after is not None else 0))
+
+
+def pack_frame(cmdid, cmddata=b''):
+    '''Returns the frame of a command with '>' header and checksums.'''
+    size = len(cmddata)
+    return (bytes(bytearray([ord('>'), cmdid, size, (cmdid + size) & 0xFF])) +
+            cmddata + bytes(bytearray([sum(bytearray(cmddata)) & 0xFF])))
+
+
+class Codec(object):
+    '''Encoder and decoder of one command, compiled once from its definition
+    in the command table.
+
+    :param cmdtype: command type, 'CMD_BOARD_INFO', etc...
+    :param cmddef: command definition, see `SimpleBGC32.CMDTYPEDEF`.
+    '''
+    __slots__ = ('cmdtype', 'id', 'cmdbodysize', 'respbodysize', 'names',
+                 'valuefmts', 'framefmts', 'offsets', 'valueindexes',
+                 'struct', 'record')
+
+    def __init__(self, cmdtype, cmddef):
+        fields = cmddef['respfields']
+        self.cmdtype = cmdtype
+        self.id = cmddef['id']
+        self.cmdbodysize = cmddef['cmdbodysize']
+        self.respbodysize = cmddef['respbodysize']
+        self.names = tuple(field['name'] for field in fields)
+        self.valuefmts = tuple(field['valuefmt'] for field in fields)
+        self.framefmts = tuple(field['framefmt'] for field in fields)
+        # offset of each value in the response body
+        offsets = []
+        offset = 0
+        for framefmt in self.framefmts:
+            before, valuefmt, after = split_framefmt(framefmt)
+            offsets.append(offset + before)
+            offset += struct.calcsize('<' + framefmt)
+        self.offsets = tuple(offsets)
+        # indexes of the fields worth displaying or storing
+        self.valueindexes = tuple(i for i, name in enumerate(self.names)
+                                  if name != 'reserved')
+        self.struct = struct.Struct(
+            '<' + ''.join(field['framefmt'] for field in fields))
+        if self.struct.size != self.respbodysize:
+            raise ValueError("%s: response fields size %d != %d" %
+                             (cmdtype, self.struct.size, self.respbodysize))
+        self.record = namedtuple(cmdtype, unique_names(self.names))
+
+    def encode(self, cmddata=b''):
+        '''Returns the full command frame with '>' header and checksums.'''
+        if not is_bytes(cmddata):
+            cmddata = cmddata.encode('latin-1')
+        if len(cmddata) != self.cmdbodysize:
+            raise ValueError("%s: command body size %d != %d" %
+                             (self.cmdtype, len(cmddata), self.cmdbodysize))
+        return pack_frame(self.id, cmddata)
+
+    def decode(self, data, offset=0):
+        '''Decodes a response body into a record.'''
+        return self.record._make(self.struct.unpack_from(data, offset))
+
+    @property
+    def respfields(self):
+        '''Returns the response fields definition, as in the command table.'''
+        return [{'name': name, 'valuefmt': valuefmt, 'framefmt': framefmt}
+                for name, valuefmt, framefmt in zip(self.names, self.valuefmts,
+                                                    self.framefmts)]
+
+    def dtype(self, offset=0, itemsize=None, prefix=()):
+        '''Returns the NumPy structured dtype of the response body.
+
+        :param offset: Offset of the body in the dtype items.
+        :param itemsize: Size of the dtype items (default: the body size).
+        :param prefix: List of `(name, format, offset)` of additional fields.
+        '''
+        import numpy
+        names, formats, offsets = [], [], []
+        for name, fmt, fieldoffset in prefix:
+            names.append(name)
+            formats.append(fmt)
+            offsets.append(fieldoffset)
+        for name, framefmt, fieldoffset in zip(self.record._fields,
+                                               self.framefmts, self.offsets):
+            valuefmt = split_framefmt(framefmt)[1]
+            fmt = NUMPY_TYPES[valuefmt[-1]]
+            if valuefmt[:-1]:
+                fmt = (fmt + valuefmt[:-1] if valuefmt[-1] == 's' else
+                       (fmt, int(valuefmt[:-1])))
+            names.append(name)
+            formats.append(fmt)
+            offsets.append(offset + fieldoffset)
+        return numpy.dtype({'names': names, 'formats': formats,
+                            'offsets': offsets,
+                            'itemsize': itemsize or offset + self.respbodysize})
+
+    def __repr__(self):
+        return '<Codec %s>' % self.cmdtype
+
+
+def compile_codecs(cmdtypedef):
+    '''Returns a dict of `Codec` by command type for a command table.'''
+    return dict((cmdtype, Codec(cmdtype, cmddef))
+                for cmdtype, cmddef in cmdtypedef.items())
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.collector
+    ---------------------
+
+    Concurrent data collection of several boards.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import time
+import threading
+
+from .logger import LOGGER
+from .device import SimpleBGC32
+from .aggregate import accumulator
+from .recording import BinaryWriter
+from .writer import writer, close_all
+
+
+class MultiCollector(object):
+    '''Collects the data of several boards concurrently, one thread per
+    board. The sampling deadlines of all the boards are computed from the
+    same start time, and the data is timestamped by the host clock, so the
+    collected data of the boards share one time base.
+
+    :param devices: The `SimpleBGC32` devices.
+    :param labels: Names of the boards in the merged output
+                   (default: 1, 2, ...).
+    '''
+
+    def __init__(self, devices, labels=None):
+        self.devices = list(devices)
+        if labels is None:
+            labels = [str(i + 1) for i in range(len(self.devices))]
+        self.labels = list(labels)
+        if len(self.labels) != len(self.devices):
+            raise ValueError("One label is needed per device")
+        self.errors = {}
+
+    @classmethod
+    def from_urls(cls, urls, timeout=10):
+        ''' Get devices from urls, labelled by their url.
+
+        :param urls: The `PyLink` connection URLs.
+        :param timeout: Set a read timeout value.
+        '''
+        return cls([SimpleBGC32.from_url(url, timeout) for url in urls],
+                   urls)
+
+    def collect(self, cmdtype, output, delim=';', measuresnb=0,
+                storingperiod=10, samplingperiod=10, pipelinedepth=1,
+                streaming=False, fields=None, statistics=('mean',),
+                fileformat='csv', flushinterval=1.0):
+        ''' Collects the data of all the boards until `measuresnb` measures
+        are stored for each board, or until break (Ctrl-C).
+
+        :param output: A file where the data of all the boards is merged,
+                       a BOARD column giving the label of each row, or a
+                       list of files, one per board.
+        :param fileformat: 'csv' to store the statistics of each storing
+                           period, 'binary' to record every sample, one
+                           file per board (default: csv)
+
+        See `SimpleBGC32.setcollectcmd` for the other parameters.
+        '''
+        merged = not isinstance(output, (list, tuple))
+        if merged and fileformat == 'binary':
+            raise ValueError("Binary recordings need one output per board")
+        if not merged and len(output) != len(self.devices):
+            raise ValueError("One output is needed per board")
+        if fileformat == 'binary':
+            # binary data goes to the underlying buffer of text files
+            output = [getattr(out, 'buffer', out) for out in output]
+        self.errors = {}
+        stop = threading.Event()
+        acquirers = []
+        writers = []
+        threads = []
+        try:
+            for device in self.devices:
+                acquirers.append(device._acquirer(cmdtype, samplingperiod,
+                                                  pipelinedepth, streaming,
+                                                  fields))
+            if merged:
+                # the queue of the writer thread serializes the rows
+                writers.append(writer([output], flushinterval or 1.0))
+                columns = accumulator(acquirers[0][0], statistics).columns
+                writers[0].write(delim.join(['DATETIME', 'BOARD'] +
+                                            [name for name, valuefmt in columns])
+                                 + '\n')
+            else:
+                writers.extend(writer([out], flushinterval) for out in output)
+            start_time = time.monotonic()
+            for i, device in enumerate(self.devices):
+                if fileformat == 'binary':
+                    args = (device._record,
+                            BinaryWriter(writers[i], acquirers[i][0]),
+                            acquirers[i][1], measuresnb, samplingperiod,
+                            start_time, stop)
+                else:
+                    args = (device._collect, acquirers[i][0], acquirers[i][1],
+                            writers[0] if merged else writers[i], delim,
+                            measuresnb, storingperiod, samplingperiod,
+                            statistics, start_time,
+                            self.labels[i] if merged else None, not merged,
+                            stop)
+                thread = threading.Thread(target=self._run,
+                                          args=(self.labels[i],) + args,
+                                          name='pysimplebgc-collect-%s'
+                                               % self.labels[i])
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+            try:
+                while any(thread.is_alive() for thread in threads):
+                    for thread in threads:
+                        thread.join(0.1)
+            except KeyboardInterrupt:                                           # 'Ctrl' + 'C' detected
+                stop.set()
+                for thread in threads:
+                    thread.join()
+        finally:
+            stop.set()
+            try:
+                close_all(writers)
+            finally:
+                for codec, acquire, release in acquirers:
+                    release()
+        for label in self.labels:
+            if label in self.errors:
+                raise self.errors[label]
+
+    def _run(self, label, collect, *args):
+        try:
+            collect(*args)
+        except Exception as e:
+            LOGGER.error("Collect board %s: BAD (%s)", label, e)
+            self.errors[label] = e
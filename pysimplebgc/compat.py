@@ -45,6 +45,7 @@ if is_py3:
     from logging import NullHandler
     from collections import OrderedDict
     from io import StringIO
+    from queue import Queue, Empty, Full
 
     def to_char(string):
         if len(string) == 0:
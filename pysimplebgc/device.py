@@ -10,51 +10,44 @@
 
 '''
 from __future__ import division, unicode_literals
+import time
 import struct
-import copy
-from datetime import datetime, timedelta
+import logging
+import threading
+from datetime import datetime
 from pylink import link_from_url
 from array import array
 
 from .logger import LOGGER
-from .utils import (cached_property, retry, bytes_to_hex, hex_to_bytes,
-                    ListDict, is_bytes)
+from .utils import (cached_property, bytes_to_hex, hex_to_bytes,
+                    ListDict, is_bytes, is_text, freeze)
+from .exceptions import (NoDeviceException, BadCmdException,
+                         BadAckException, BadCRCException, BadDataException)
+from .codec import Codec, compile_codecs
+from .parser import FrameParser
+from .linkio import link_readinto, link_flush
+from .checksum import checksum8
+from .trace import ProtocolTrace, Capture
+from .recovery import RecoveryPolicy
+from .stats import DeviceStats
+from .pipeline import Pipeline
+from .stream import DataStream
+from .scheduler import Scheduler
+from .poller import Poller
+from .aggregate import accumulator, period_capacity
+from .recording import BinaryWriter
+from .writer import writer, close_all
 from .compat import stdout
 
 
-class NoDeviceException(Exception):
-    '''Can not access device.'''
-    value = __doc__
-
-
-class BadCmdException(Exception):
-    '''No valid command.'''
-    value = __doc__
-
-
-class BadAckException(Exception):
-    '''No valid acknowledgement.'''
-    def __str__(self):
-        return self.__doc__
-
-
-class BadCRCException(Exception):
-    '''No valid checksum.'''
-    def __str__(self):
-        return self.__doc__
-
-
-class BadDataException(Exception):
-    '''No valid data.'''
-    def __str__(self):
-        return self.__doc__
-
-
 class SimpleBGC32(object):
     '''Communicates with the board by sending commands, reads the binary
     data and parsing it into usable scalar values.
 
     :param link: A `PyLink` connection.
+    :param infocache: Optional `BoardInfoCache` of the static board
+                      information.
+    :param recovery: Optional `RecoveryPolicy` of the failed requests.
     '''
     
     # Command ID definitions
@@ -122,25 +115,163 @@ class SimpleBGC32(object):
           {'name': 'reserved', 'valuefmt': '%s', 'framefmt': '38s'}]}
         }
     
+    # Data groups of CMD_REALTIME_DATA_CUSTOM by bit of DATA_MASK (protocol 2.6)
+    CUSTOMDATADEF = [
+        {'bit': 0, 'name': 'IMU_ANGLES',
+         'respfields': [{'name': 'ANGLE_ROLL', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'ANGLE_PITCH', 'valuefmt': '%d', 'framefmt': 'h'},
+          {'name': 'ANGLE_YAW', 'valuefmt': '%d', 'framefmt': 'h'}]},
+        {'bit': 1, 'name': 'TARGET_ANGLES',
+         'respfields': [{'name': 'TARGET_ANGLE_ROLL', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'TARGET_ANGLE_PITCH', 'valuefmt': '%d', 'framefmt': 'h'},
+          {'name': 'TARGET_ANGLE_YAW', 'valuefmt': '%d', 'framefmt': 'h'}]},
+        {'bit': 2, 'name': 'TARGET_SPEED',
+         'respfields': [{'name': 'TARGET_SPEED_ROLL', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'TARGET_SPEED_PITCH', 'valuefmt': '%d', 'framefmt': 'h'},
+          {'name': 'TARGET_SPEED_YAW', 'valuefmt': '%d', 'framefmt': 'h'}]},
+        {'bit': 3, 'name': 'FRAME_CAM_ANGLE',
+         'respfields': [{'name': 'FRAME_CAM_ANGLE_ROLL', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'FRAME_CAM_ANGLE_PITCH', 'valuefmt': '%d', 'framefmt': 'h'},
+          {'name': 'FRAME_CAM_ANGLE_YAW', 'valuefmt': '%d', 'framefmt': 'h'}]},
+        {'bit': 4, 'name': 'GYRO_DATA',
+         'respfields': [{'name': 'GYRO_ROLL', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'GYRO_PITCH', 'valuefmt': '%d', 'framefmt': 'h'},
+          {'name': 'GYRO_YAW', 'valuefmt': '%d', 'framefmt': 'h'}]},
+        {'bit': 5, 'name': 'RC_DATA',
+         'respfields': [{'name': 'RC_ROLL', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'RC_PITCH', 'valuefmt': '%d', 'framefmt': 'h'},
+          {'name': 'RC_YAW', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'RC_CMD', 'valuefmt': '%d', 'framefmt': 'h'},
+          {'name': 'EXT_FC_ROLL', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'EXT_FC_PITCH', 'valuefmt': '%d', 'framefmt': 'h'}]},
+        {'bit': 6, 'name': 'Z_VECTOR_H_VECTOR',
+         'respfields': [{'name': 'Z_VECTOR_X', 'valuefmt': '%f', 'framefmt': 'f'}, {'name': 'Z_VECTOR_Y', 'valuefmt': '%f', 'framefmt': 'f'},
+          {'name': 'Z_VECTOR_Z', 'valuefmt': '%f', 'framefmt': 'f'}, {'name': 'H_VECTOR_X', 'valuefmt': '%f', 'framefmt': 'f'},
+          {'name': 'H_VECTOR_Y', 'valuefmt': '%f', 'framefmt': 'f'}, {'name': 'H_VECTOR_Z', 'valuefmt': '%f', 'framefmt': 'f'}]},
+        {'bit': 7, 'name': 'RC_CHANNELS',
+         'respfields': [{'name': 'RC_CHANNEL_1', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'RC_CHANNEL_2', 'valuefmt': '%d', 'framefmt': 'h'},
+          {'name': 'RC_CHANNEL_3', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'RC_CHANNEL_4', 'valuefmt': '%d', 'framefmt': 'h'},
+          {'name': 'RC_CHANNEL_5', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'RC_CHANNEL_6', 'valuefmt': '%d', 'framefmt': 'h'},
+          {'name': 'RC_CHANNEL_7', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'RC_CHANNEL_8', 'valuefmt': '%d', 'framefmt': 'h'},
+          {'name': 'RC_CHANNEL_9', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'RC_CHANNEL_10', 'valuefmt': '%d', 'framefmt': 'h'},
+          {'name': 'RC_CHANNEL_11', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'RC_CHANNEL_12', 'valuefmt': '%d', 'framefmt': 'h'},
+          {'name': 'RC_CHANNEL_13', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'RC_CHANNEL_14', 'valuefmt': '%d', 'framefmt': 'h'},
+          {'name': 'RC_CHANNEL_15', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'RC_CHANNEL_16', 'valuefmt': '%d', 'framefmt': 'h'},
+          {'name': 'RC_CHANNEL_17', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'RC_CHANNEL_18', 'valuefmt': '%d', 'framefmt': 'h'}]},
+        {'bit': 8, 'name': 'ACC_DATA',
+         'respfields': [{'name': 'ACC_ROLL', 'valuefmt': '%d', 'framefmt': 'h'}, {'name': 'ACC_PITCH', 'valuefmt': '%d', 'framefmt': 'h'},
+          {'name': 'ACC_YAW', 'valuefmt': '%d', 'framefmt': 'h'}]},
+        ]
+
+    # Command IDs without entry in the command table (protocol 2.6)
+    CMD_CONFIRM = 67
+    CMD_DATA_STREAM_INTERVAL = 85
+    CMD_REALTIME_DATA_CUSTOM = 88
+    CMD_ERROR = 255
+
     HEADER_SIZE = 4    
 
-    def __init__(self, link):
+    # Codecs compiled once from the command table
+    CODECS = compile_codecs(CMDTYPEDEF)
+    CUSTOMCODECS = {}
+
+    # The command tables are shared by all the instances, they are read-only
+    CMDTYPEDEF = freeze(CMDTYPEDEF)
+    CUSTOMDATADEF = freeze(CUSTOMDATADEF)
+
+    def __init__(self, link, infocache=None, recovery=None):
         self.link = link
+        self.url = None
+        self.infocache = infocache
         self.link.open()
         self.cmdtypelist = self.CMDTYPEDEF
+        self.codecs = self.CODECS
+        self.parser = FrameParser(dict((codec.id, codec.respbodysize)
+                                       for codec in self.codecs.values()))
+        self.readinto = link_readinto(link)
+        self.trace = None
+        self.recovery = recovery or RecoveryPolicy()
+        self.statistics = DeviceStats()
+        self.cmdnames = dict((codec.id, cmdtype)
+                             for cmdtype, codec in self.codecs.items())
+        self.cmdnames[self.CMD_REALTIME_DATA_CUSTOM] = 'CMD_REALTIME_DATA_CUSTOM'
+        # serializes the request/response exchanges of the threads
+        self.lock = threading.RLock()
+        # last (time.monotonic(), record) received by command type
+        self.cache = {}
 
     @classmethod
-    def from_url(cls, url, timeout=10):
+    def from_url(cls, url, timeout=10, infocache=None, recovery=None):
         ''' Get device from url.
 
         :param url: A `PyLink` connection URL.
         :param timeout: Set a read timeout value.
+        :param infocache: Optional `BoardInfoCache`, the board information
+                          of known links is read from the cache.
+        :param recovery: Optional `RecoveryPolicy` of the failed requests.
         '''
         link = link_from_url(url)
         link.settimeout(timeout)
-        return cls(link)
+        device = cls(link, infocache, recovery)
+        device.url = url
+        return device
+
+    @cached_property
+    def boardinfo(self):
+        '''CMD_BOARD_INFO record, requested once per device.'''
+        return self._boardinfo('CMD_BOARD_INFO')
+
+    @cached_property
+    def boardinfo3(self):
+        '''CMD_BOARD_INFO_3 record, requested once per device.'''
+        return self._boardinfo('CMD_BOARD_INFO_3')
+
+    def invalidate_boardinfo(self):
+        '''Forgets the cached board information, e.g. after a firmware update.'''
+        self.__dict__.pop('boardinfo', None)
+        self.__dict__.pop('boardinfo3', None)
+        if self.infocache is not None and self.url is not None:
+            self.infocache.invalidate(self.url)
+
+    def _boardinfo(self, cmdtype):
+        infocache = self.infocache if self.url is not None else None
+        if (infocache is None) or (cmdtype == 'CMD_BOARD_INFO'):
+            return self.cmd(cmdtype)
+        codec = self.codecs[cmdtype]
+        # the cheap CMD_BOARD_INFO request checks the firmware behind the link
+        firmware = infocache.firmwarekey(self.boardinfo)
+        body = infocache.get(self.url, cmdtype, firmware)
+        if body is not None:
+            return codec.decode(body)
+        record = self.cmd(cmdtype)
+        infocache.put(self.url, infocache.boardkey(record.deviceID, record.mcuID),
+                      cmdtype, codec.struct.pack(*record), firmware)
+        return record
+
+    def start_trace(self, maxsize=10000):
+        ''' Starts recording the raw data sent and received in a `ProtocolTrace`
+
+        :param maxsize: maximum number of data chunks kept
+        '''
+        self.trace = ProtocolTrace(maxsize)
+        self.readinto = self.trace.reader(link_readinto(self.link))
+        return self.trace
+
+    def stop_trace(self):
+        ''' Stops recording the raw data and returns the `ProtocolTrace`'''
+        trace, self.trace = self.trace, None
+        self.readinto = link_readinto(self.link)
+        return trace
+
+    def start_capture(self, filename):
+        ''' Starts writing all the raw data sent and received in a capture file,
+        read back by `pysimplebgc.replay.Replay`
+
+        :param filename: path of the capture file
+        '''
+        self.trace = Capture(filename)
+        self.readinto = self.trace.reader(link_readinto(self.link))
+        return self.trace
+
+    def stop_capture(self):
+        ''' Stops and closes the capture, returns the `Capture`'''
+        capture = self.stop_trace()
+        if capture is not None:
+            capture.close()
+        return capture
 
-    @retry(tries=3, delay=0.5)
     def send(self, data, wait_ack=None, timeout=None):
         '''Sends data to station.
 
@@ -151,45 +282,262 @@ class SimpleBGC32(object):
             that acknowledgement is the one expected.
          :param timeout: Define timeout when reading ACK from link
          '''
+        if self.trace is not None:
+            self.trace.tx(data)
         if is_bytes(data):
-            LOGGER.info("try send : %s" % bytes_to_hex(data))
+            if LOGGER.isEnabledFor(logging.INFO):
+                LOGGER.info("try send : %s", bytes_to_hex(data))
             self.link.write(data)
         else:
-            LOGGER.info("try send : %s" % data)
+            LOGGER.info("try send : %s", data)
             self.link.write("%s" % data)
         if wait_ack is None:
             return True
         ack = self.link.read(len(wait_ack), timeout=timeout)
         if wait_ack == ack:
-            LOGGER.info("Check ACK: OK (%s)" % (repr(ack)))
+            LOGGER.info("Check ACK: OK (%r)", ack)
             return True
-        LOGGER.error("Check ACK: BAD (%s != %s)" % (repr(wait_ack), repr(ack)))
+        LOGGER.error("Check ACK: BAD (%r != %r)", wait_ack, ack)
         raise BadAckException()
 
 
-    def setcmd(self, cmdtype, cmddata=""):
-        ''' Send commands and returns response received as a list of dictionnaries
-        
+    def cmd(self, cmdtype, cmddata=""):
+        ''' Send command and returns response received as a record
+
         :param cmdtype: command type,'CMD_BOARD_INFO', etc...
         :param cmddata: command data, array of char
         '''
-        if self.iscmdvalid(cmdtype):
-            cmdid, pack_cmd = self._pack_command(cmdtype, cmddata)
-            self.send(pack_cmd)
-            respsize = 1 + self.HEADER_SIZE + self.cmdtypelist[cmdtype]['respbodysize']
-            respdata = self.link.read(respsize)
-            unpack_data = self._unpack_response(cmdid, respdata)
-            LOGGER.info("unpacked data: %s" % (unpack_data))
-            framefmt = self.torespfieldsframeformat(cmdtype)
-            data = struct.unpack(framefmt, unpack_data)
-            for i in range(len(data)):
-                self.cmdtypelist[cmdtype]['respfields'][i]['value'] = data[i]                
-        else:
+        if not self.iscmdvalid(cmdtype):
             raise BadCmdException()
-        return self.cmdtypelist[cmdtype]['respfields']
+        codec = self.codecs[cmdtype]
+        cmdid, pack_cmd = self._pack_command(cmdtype, cmddata)
+        with self.lock:
+            frame = self.recovery.call(self, self._request, pack_cmd, cmdid,
+                                       codec.respbodysize)
+            if LOGGER.isEnabledFor(logging.INFO):
+                LOGGER.info("unpacked data: %s", bytes_to_hex(frame.body))
+            record = codec.decode(frame.body)
+            self.cache[cmdtype] = (time.monotonic(), record)
+        if (cmdtype == 'CMD_BOARD_INFO') and ('boardinfo' in self.__dict__):
+            if record.FIRMWARE_VER != self.boardinfo.FIRMWARE_VER:     # the board was updated
+                LOGGER.info("Check FIRMWARE_VER: CHANGED (%d)", record.FIRMWARE_VER)
+                self.invalidate_boardinfo()
+        return record
+
+
+    def latest(self, cmdtype, max_age=None):
+        ''' Returns the last record received for cmdtype, the command is sent
+        only if this record is older than max_age
+
+        :param cmdtype: command type,'CMD_REALTIME_DATA_4', etc...
+        :param max_age: maximum age of the record in seconds, any age if None
+        '''
+        # the entries are replaced as a whole, a fresh one is read without lock
+        entry = self.cache.get(cmdtype)
+        if entry is not None and (max_age is None or
+                                  time.monotonic() - entry[0] <= max_age):
+            return entry[1]
+        with self.lock:
+            # a concurrent request may have refreshed it while waiting
+            entry = self.cache.get(cmdtype)
+            if entry is not None and (max_age is None or
+                                      time.monotonic() - entry[0] <= max_age):
+                return entry[1]
+            return self.cmd(cmdtype)
+
+
+    def stats(self):
+        ''' Returns the statistics of the exchanges with the board : by command
+        type, the requests, bytes and frames counts, the frames per second,
+        the round-trip latency histogram and the errors by exception class,
+        with the parser resyncs and the recovery counts'''
+        stats = self.statistics.todict()
+        stats['resyncs'] = self.parser.resyncs
+        stats['recovery'] = self.recovery.stats()
+        return stats
+
+
+    def poller(self, cmdtypes=('CMD_REALTIME_DATA_4',), period=0.01):
+        ''' Returns a started `Poller` refreshing the records returned by latest
+
+        :param cmdtypes: polled command types
+        :param period: period of polling in seconds
+        '''
+        poller = Poller(self, cmdtypes, period)
+        poller.start()
+        return poller
+
+
+    def customcmd(self, mask=0, fields=None):
+        ''' Send CMD_REALTIME_DATA_CUSTOM and returns response received as a record
+
+        :param mask: DATA_MASK, bits of the data groups in CUSTOMDATADEF
+        :param fields: names of the fields to decode, all fields of the groups if None
+        '''
+        codec = self.customcodec(mask, fields)
+        with self.lock:
+            frame = self.recovery.call(self, self._request,
+                                       codec.encode(self.customcmddata(mask, fields)),
+                                       codec.id, codec.respbodysize)
+            # the body is a view of the parser buffer, reused by the next request
+            if LOGGER.isEnabledFor(logging.INFO):
+                LOGGER.info("unpacked data: %s", bytes_to_hex(frame.body))
+            return codec.decode(frame.body)
+
+
+    @classmethod
+    def custommask(cls, fields):
+        ''' Returns the DATA_MASK of the smallest CMD_REALTIME_DATA_CUSTOM frame
+        containing the fields
+
+        :param fields: field names, 'ANGLE_ROLL', 'GYRO_YAW', etc...
+        '''
+        mask = 0
+        for name in fields:
+            if name == 'TIMESTAMP_MS':
+                continue
+            for group in cls.CUSTOMDATADEF:
+                if name in [field['name'] for field in group['respfields']]:
+                    mask |= (1 << group['bit'])
+                    break
+            else:
+                LOGGER.info("Check CUSTOMFIELD: BAD (%s)", name)
+                raise ValueError("No custom realtime data field %s" % name)
+        return mask
+
+
+    def customcmddata(self, mask=0, fields=None):
+        '''Returns the body of the CMD_REALTIME_DATA_CUSTOM command.'''
+        return struct.pack('<I6x', mask or self.custommask(fields))
+
+
+    @classmethod
+    def customcodec(cls, mask=0, fields=None):
+        ''' Returns the codec of the CMD_REALTIME_DATA_CUSTOM response, the fields
+        not selected are skipped as padding by the decoder
+
+        :param mask: DATA_MASK, bits of the data groups in CUSTOMDATADEF,
+                     computed from the fields if 0
+        :param fields: names of the fields to decode, all fields of the groups if None
+        '''
+        if fields is not None:
+            fields = tuple(fields)
+        key = (mask, fields)
+        codec = cls.CUSTOMCODECS.get(key)
+        if codec is None:
+            if fields is not None:
+                mask = mask or cls.custommask(fields)
+            allfields = [{'name': 'TIMESTAMP_MS', 'valuefmt': '%d', 'framefmt': 'H'}]
+            knownmask = 0
+            for group in cls.CUSTOMDATADEF:
+                knownmask |= (1 << group['bit'])
+                if mask & (1 << group['bit']):
+                    allfields.extend(group['respfields'])
+            if (mask == 0) or (mask & ~knownmask):
+                LOGGER.info("Check DATA_MASK: BAD (%x)", mask)
+                raise BadCmdException()
+            respfields = []
+            padding = 0
+            for field in allfields:
+                if fields is None or field['name'] in fields:
+                    field = dict(field)
+                    if padding:
+                        field['framefmt'] = '%dx%s' % (padding, field['framefmt'])
+                    respfields.append(field)
+                    padding = 0
+                else:
+                    padding += struct.calcsize('<' + field['framefmt'])
+            if not respfields:
+                raise ValueError("No custom realtime data field %s" % (fields,))
+            if padding:
+                respfields[-1]['framefmt'] += '%dx' % padding
+            respbodysize = struct.calcsize('<' + ''.join(field['framefmt'] for field in allfields))
+            codec = Codec('CMD_REALTIME_DATA_CUSTOM',
+                          {'id': cls.CMD_REALTIME_DATA_CUSTOM, 'cmdbodysize': 10,
+                           'cmdfmt': '<I6x', 'respbodysize': respbodysize,
+                           'respfields': respfields})
+            cls.CUSTOMCODECS[key] = codec
+        return codec
+
+
+    def flush(self):
+        ''' Discards the received data not parsed yet, the parser resyncs on the
+        start of the next frame'''
+        with self.lock:
+            self.parser.clear()
+            count = link_flush(self.link)
+        LOGGER.info("Flush input : %d bytes", count)
+
+
+    def _request(self, data, cmdid, bodysize):
+        ''' sends a command frame and returns its response frame
+
+        :param data: packed command frame
+        :param cmdid: command id of the expected response
+        :param bodysize: body size of the expected response
+        '''
+        stats = self.statistics.command(self.cmdnames.get(cmdid, cmdid))
+        start = time.monotonic()
+        try:
+            self.send(data)
+            stats.sent(len(data))
+            frame = self._read_frame(cmdid, bodysize)
+        except Exception as e:
+            stats.failed(e)
+            raise
+        now = time.monotonic()
+        stats.received(1 + self.HEADER_SIZE + len(frame.body), now,
+                       now - start)
+        return frame
+
+
+    def _read_frame(self, cmdid, bodysize):
+        ''' reads the link until the response frame of cmdid is complete,
+        skipping corrupted data and frames of other commands
+
+        :param cmdid: command id of the expected response
+        :param bodysize: body size of the expected response
+        '''
+        parser = self.parser
+        framesize = 1 + self.HEADER_SIZE + bodysize
+        deadline = time.monotonic() + (getattr(self.link, 'timeout', None) or 1)
+        resyncs = parser.resyncs
+        received = 0
+        while True:
+            for frame in parser:
+                if frame.cmdid == cmdid:
+                    return frame
+                LOGGER.info("Skip frame: %s", frame.cmdid)
+            if (parser.resyncs != resyncs and received >= framesize and
+                    not parser.pending):
+                # the response was corrupted, no need to wait for the timeout
+                LOGGER.info("Check RESPONSE: BAD CRC (%s)", cmdid)
+                raise BadCRCException()
+            count = parser.fill(self.readinto, max(1, framesize - parser.pending))
+            if count:
+                received += count
+                continue
+            if time.monotonic() > deadline:
+                LOGGER.info("Check RESPONSE: BAD (%s)", cmdid)
+                parser.clear()
+                raise BadDataException()
+
+
+    def setcmd(self, cmdtype, cmddata=""):
+        ''' Send commands and returns response received as a new list of dictionnaries,
+        the command table is left unchanged
+
+        :param cmdtype: command type,'CMD_BOARD_INFO', etc...
+        :param cmddata: command data, array of char
+        '''
+        record = self.cmd(cmdtype, cmddata)
+        codec = self.codecs[cmdtype]
+        return [{'name': name, 'valuefmt': valuefmt, 'framefmt': framefmt, 'value': value}
+                for name, valuefmt, framefmt, value in zip(codec.names, codec.valuefmts,
+                                                           codec.framefmts, record)]
         
         
-    def setcollectcmd(self, cmdtype, output, delim, stdoutdisplay, measuresnb, storingperiod, samplingperiod):
+    def setcollectcmd(self, cmdtype, output, delim, stdoutdisplay, measuresnb, storingperiod, samplingperiod, pipelinedepth=1, streaming=False, fields=None, statistics=('mean',), fileformat='csv', flushinterval=1.0):
         ''' Send data collect command
 
         :param cmdtype: command type,'CMD_BOARD_INFO', etc...
@@ -199,58 +547,180 @@ class SimpleBGC32(object):
         :param measuresnb: number of measures to realize, 0 if continue until break (Ctrl-C)        
         :param storingperiod: period of storing, 10ms, (default: 10)
         :param samplingperiod: period of sampling, 10ms, (default: 10)
+        :param pipelinedepth: number of requests in flight, 1 if not pipelined
+        :param streaming: if True, the board pushes the data every sampling period
+        :param fields: names of the fields to collect with CMD_REALTIME_DATA_CUSTOM
+                       instead of cmdtype, all fields of cmdtype if None
+        :param statistics: statistics stored for each field, 'mean', 'min',
+                           'max', 'stddev', 'rms' and 'count' (default: mean)
+        :param fileformat: 'csv' to store the statistics of each storing period,
+                           'binary' to record every sample (default: csv)
+        :param flushinterval: maximum time in seconds before the output is written
+                              by the writer thread, 0 to write in the acquisition
+                              loop (default: 1)
         '''
+        codec, acquire, release = self._acquirer(cmdtype, samplingperiod, pipelinedepth, streaming, fields)
+        if (fileformat == 'binary'):
+            # binary data goes to the underlying buffer of text files
+            outputs = [getattr(output, 'buffer', output)]
+        elif (output != stdout) and stdoutdisplay:                              # display data on the standard output too
+            outputs = [output, stdout]
+        else:
+            outputs = [output]
+        output = writer(outputs, flushinterval)
+        try:
+            if (fileformat == 'binary'):
+                self._record(BinaryWriter(output, codec), acquire, measuresnb, samplingperiod)
+            else:
+                self._collect(codec, acquire, output, delim, measuresnb, storingperiod, samplingperiod, statistics)
+        finally:
+            try:
+                output.close()
+            finally:
+                release()
+
+
+    def setmultiratecmd(self, cmdtype, stages, measuresnb, samplingperiod, pipelinedepth=1, streaming=False, fields=None, flushinterval=1.0):
+        ''' Send data collect command, each record acquired is stored by
+        several output stages with their own storing period and statistics,
+        E.g. a raw log and a summary without polling the board twice.
+
+        :param cmdtype: command type,'CMD_REALTIME_DATA_4', etc...
+        :param stages: the `pysimplebgc.stages.Stage` outputs
+        :param measuresnb: number of samples to acquire, 0 if continue until break (Ctrl-C)
+        :param samplingperiod: period of sampling, 10ms, (default: 10)
+
+        See `setcollectcmd` for the other parameters.
+        '''
+        codec, acquire, release = self._acquirer(cmdtype, samplingperiod, pipelinedepth, streaming, fields)
+        try:
+            for stage in stages:
+                stage.start(codec, samplingperiod, flushinterval)
+            self._collect_stages(stages, acquire, measuresnb, samplingperiod)
+        finally:
+            try:
+                close_all(stages)
+            finally:
+                release()
+
+
+    def _acquirer(self, cmdtype, samplingperiod, pipelinedepth=1, streaming=False, fields=None):
+        '''Returns the codec of the collected records, the function acquiring
+        a record and the function releasing the link at the end of the
+        collect.'''
+        cmddata = ""
+        if fields:
+            cmdtype = 'CMD_REALTIME_DATA_CUSTOM'
+            codec = self.customcodec(fields=fields)
+            cmddata = self.customcmddata(fields=fields)
+        elif self.iscmdvalid(cmdtype):
+            codec = self.codecs[cmdtype]
+        else:
+            raise BadCmdException()
+        stream = pipeline = None
+        if streaming:
+            stream = DataStream(self, cmdtype, interval=samplingperiod*10, fields=fields)
+            stream.start()
+            acquire = lambda: stream.get(timeout=self.link.timeout)[1]
+        elif (pipelinedepth > 1):
+            pipeline = Pipeline(self, pipelinedepth)
+            acquire = pipeline.poll(cmdtype, cmddata, codec=codec).__next__
+        elif fields:
+            acquire = lambda: self.customcmd(fields=fields)
+        else:
+            acquire = lambda: self.cmd(cmdtype)
+
+        def release():
+            if pipeline is not None:
+                pipeline.drain()
+            if stream is not None:
+                stream.stop()
+        return codec, acquire, release
+
+
+    def _collect(self, codec, acquire, output, delim, measuresnb, storingperiod, samplingperiod, statistics, start_time=None, label=None, header=True, stop=None):
         measuresnbtodo = measuresnb
         if (samplingperiod > storingperiod):
             samplingperiod = storingperiod
-        firstpassage = True
-        samplesnb = 0
-        storingdtprevious = datetime.utcnow()
-        samplingdtprevious = storingdtprevious
-        while ((measuresnb==0) or (measuresnbtodo>0)) :
+        summary = accumulator(codec, statistics, period_capacity(storingperiod, samplingperiod))
+        columns = summary.columns
+        if header:
+            data = "DATETIME"
+            for name, valuefmt in columns:
+                data += (delim + name)
+            data +='\n'
+            output.write(data)
+        scheduler = Scheduler(samplingperiod/100)                               # periods are in 10ms
+        scheduler.start(start_time)
+        storingnext = storingperiod
+        while ((measuresnb==0) or (measuresnbtodo>0)) and not (stop and stop.is_set()):
             try:
-                dt = datetime.utcnow()
-                storingdeltamillisec = (dt - storingdtprevious).seconds*1000 + ((dt - storingdtprevious).microseconds/1000)
-                samplingdeltamillisec = (dt - samplingdtprevious).seconds*1000 + ((dt - samplingdtprevious).microseconds/1000)
-        
-                if (firstpassage or (samplingdeltamillisec > (samplingperiod*10))):  # if it is time to acquire sample
-                    fields = self.setcmd(cmdtype)
-                    if (firstpassage):
-                        data = "DATETIME"
-                        for i in range(len(fields)):
-                            if fields[i]['name'] != 'reserved':
-                                data += (delim + fields[i]['name'])
-                        data +='\n'            
-                        output.write(data)
-                        if (output != stdout):                             # if file as ouput
-                            if (stdoutdisplay):                                 # if stdoutflag = True
-                                stdout.write(data)                              # display data on the standard output too
-                        firstpassage = False
-                    if (samplesnb == 0):
-                        sumfields = copy.deepcopy(fields)
-                    else:
-                        _addmeasure(sumfields, fields)
-                    samplesnb +=1
-                    samplingdtprevious = dt
-
-                if (storingdeltamillisec > (storingperiod*10)):                 # if it is time to store data
+                tick = scheduler.wait()                                         # sleep until it is time to acquire sample
+                summary.add(acquire())
+                if samplingperiod:
+                    elapsed = (tick + 1)*samplingperiod
+                else:                                                           # back-to-back samples
+                    elapsed = scheduler.elapsed*100
+
+                if (elapsed >= storingnext):                                    # if it is time to store data
+                    dt = datetime.utcnow()
                     data = dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]             # date format, "2015-12-20 05:25:40.145" 
-                    for i in range(len(sumfields)):
-                        if sumfields[i]['name'] != 'reserved':
-                            data += (delim + (sumfields[i]['valuefmt'])%(sumfields[i]['value']/samplesnb))
+                    if label is not None:                                       # board of the merged collect
+                        data += (delim + label)
+                    for (name, valuefmt), value in zip(columns, summary.values()):
+                        data += (delim + valuefmt%(value))
                     data +='\n'
                     output.write(data)
-                    if (output != stdout):                                 # if file as ouput
-                        if (stdoutdisplay):                                     # if stdoutflag = True
-                            stdout.write(data)                                  # display data on the standard output too
-                        
                     measuresnbtodo -= 1
-                    samplesnb = 0
-                    storingdtprevious = dt
+                    summary.reset()
+                    if storingperiod:                                           # next period after elapsed
+                        storingnext = (elapsed//storingperiod + 1)*storingperiod
+                    else:
+                        storingnext = elapsed
             except KeyboardInterrupt:                                           # 'Ctrl' + 'C' detected
                 break            
+        LOGGER.info("collect scheduler: %s", scheduler.stats())
+        return scheduler.stats()
+
+
+    def _collect_stages(self, stages, acquire, measuresnb, samplingperiod, start_time=None, stop=None):
+        measuresnbtodo = measuresnb
+        scheduler = Scheduler(samplingperiod/100)                               # periods are in 10ms
+        scheduler.start(start_time)
+        while ((measuresnb==0) or (measuresnbtodo>0)) and not (stop and stop.is_set()):
+            try:
+                tick = scheduler.wait()                                         # sleep until it is time to acquire sample
+                record = acquire()
+                if samplingperiod:
+                    elapsed = (tick + 1)*samplingperiod
+                else:                                                           # back-to-back samples
+                    elapsed = scheduler.elapsed*100
+                for stage in stages:                                            # each stage decimates or aggregates
+                    stage.add(elapsed, record)
+                measuresnbtodo -= 1
+            except KeyboardInterrupt:                                           # 'Ctrl' + 'C' detected
+                break
+        LOGGER.info("multi-rate scheduler: %s", scheduler.stats())
+
+
+    def _record(self, writer, acquire, measuresnb, samplingperiod, start_time=None, stop=None):
+        measuresnbtodo = measuresnb
+        scheduler = Scheduler(samplingperiod/100)                               # periods are in 10ms
+        scheduler.start(start_time)
+        try:
+            while ((measuresnb==0) or (measuresnbtodo>0)) and not (stop and stop.is_set()):
+                try:
+                    scheduler.wait()                                            # sleep until it is time to acquire sample
+                    record = acquire()
+                    writer.write(time.time(), record)
+                    measuresnbtodo -= 1
+                except KeyboardInterrupt:                                       # 'Ctrl' + 'C' detected
+                    break
+        finally:
+            writer.flush()
+        LOGGER.info("record scheduler: %s", scheduler.stats())
+
 
-        
     def getcmdlist(self):
         '''Returns list of commands availables'''
         list = []
@@ -263,9 +733,9 @@ class SimpleBGC32(object):
         '''Returns True if cmdtype valid'''
         iscmdvalid = (cmdtype in self.cmdtypelist)
         if iscmdvalid:
-            LOGGER.info("check validity of command type: OK %s" % (cmdtype))
+            LOGGER.info("check validity of command type: OK %s", cmdtype)
         else:
-            LOGGER.info("check validity of command type: BAD %s" % (cmdtype))            
+            LOGGER.info("check validity of command type: BAD %s", cmdtype)
         return (iscmdvalid)
 
 
@@ -275,54 +745,53 @@ class SimpleBGC32(object):
         :param cmddata : command data, array of char
         '''
         
-        LOGGER.info("try pack command : %s" % cmdtype)
+        LOGGER.info("try pack command : %s", cmdtype)
         try :
-            cmdid = self.cmdtypelist[cmdtype]['id']
-            cmdbodysize = self.cmdtypelist[cmdtype]['cmdbodysize']
-            LOGGER.info("Check CMDID: OK (%s,%d,%d)" % (cmdtype, cmdid, cmdbodysize))
+            codec = self.codecs[cmdtype]
+            LOGGER.info("Check CMDID: OK (%s,%d,%d)", cmdtype, codec.id, codec.cmdbodysize)
         except :
-            LOGGER.info("Check CMDID: BAD (%s)" % (cmdtype))
+            LOGGER.info("Check CMDID: BAD (%s)", cmdtype)
             raise BadCmdException()            
             
         body_realsize = len(cmddata)
         # verify if body size is correct
-        if (body_realsize == cmdbodysize):
-            LOGGER.info("Check CMDBODY: OK (%d)" % (cmdbodysize))
+        if (body_realsize == codec.cmdbodysize):
+            LOGGER.info("Check CMDBODY: OK (%d)", codec.cmdbodysize)
         else:
-            LOGGER.info("Check CMDBODY: BAD (%d,%d)" % (cmdbodysize, body_realsize))
+            LOGGER.info("Check CMDBODY: BAD (%d,%d)", codec.cmdbodysize, body_realsize)
             raise BadCmdException()            
             
-        fullcmd = chr(cmdid) + chr(cmdbodysize)
-        packed_cmd = '>' + chr(cmdid) + chr(cmdbodysize) + chr(self._checksum8bytes(fullcmd)) + cmddata + chr(self._checksum8bytes(cmddata))
-        return cmdid, packed_cmd
+        return codec.id, codec.encode(cmddata)
 
 
     def torespfieldsframeformat(self, cmdtype):
-        ''' '''
-        frameformat = "<"
-        for field in self.cmdtypelist[cmdtype]['respfields']:
-            frameformat += field['framefmt']
-        return frameformat
+        '''Returns the struct format of the response fields.'''
+        return self.codecs[cmdtype].struct.format
     
 
     def _unpack_response(self, cmdid, packed_resp):
         ''' unpacks the responce received after sending a command '''
 
-        LOGGER.info("try unpack response : %s" % packed_resp)
+        LOGGER.info("try unpack response : %s", packed_resp)
+        if is_text(packed_resp):
+            # the link returns text when the frame is valid utf-8
+            packed_resp = packed_resp.encode('utf-8')
+        # the checks and the body are views of the response, without copy
+        packed_resp = memoryview(packed_resp)
         # verify if size of packed_resp is higher than the minimal accepted,
         # 4 bytes for the header + 1 byte for the body checkum
         resp_size = len(packed_resp)
         if (resp_size > self.HEADER_SIZE):
-            LOGGER.info("Check MINRESPSIZE: OK (%d)" % resp_size)
+            LOGGER.info("Check MINRESPSIZE: OK (%d)", resp_size)
         else:
-            LOGGER.info("Check MINRESPSIZE: BAD (%d)" % resp_size)
+            LOGGER.info("Check MINRESPSIZE: BAD (%d)", resp_size)
             raise BadCmdException()            
 
         # verify if 2 first bytes od header are '>' and cmdid
         if (chr(packed_resp[0]) == '>') and (packed_resp[1] == cmdid):
-            LOGGER.info("Check ACK: OK (%s)" % (packed_resp[:2]))
+            LOGGER.info("Check ACK: OK (%s)", cmdid)
         else:
-            LOGGER.info("Check ACK: BAD (%s,'>',%s)" % (packed_resp[:2], cmdid))
+            LOGGER.info("Check ACK: BAD (%r,'>',%s)", bytes(packed_resp[:2]), cmdid)
             raise BadCmdException()
 
         data_size = packed_resp[2]
@@ -330,30 +799,30 @@ class SimpleBGC32(object):
         header_checksum = packed_resp[3]
         header_realchecksum = self._checksum8bytes(packed_resp[1:3])
         if (header_checksum == header_realchecksum):
-            LOGGER.info("Check HEADERCRC: OK (%s)" % (header_checksum))
+            LOGGER.info("Check HEADERCRC: OK (%s)", header_checksum)
         else:
-            LOGGER.info("Check HEADERCRC: BAD (%s,%s)" % (header_checksum, header_realchecksum))
+            LOGGER.info("Check HEADERCRC: BAD (%s,%s)", header_checksum, header_realchecksum)
             raise BadCRCException()
 
         # verify data size
         data_realsize = resp_size - self.HEADER_SIZE - 1
         if (data_realsize == data_size):
-            LOGGER.info("Check DATASIZE: OK (%s)" % data_size)
+            LOGGER.info("Check DATASIZE: OK (%s)", data_size)
         else:
-            LOGGER.info("Check DATASIZE: BAD (%s,%s)" % (data_size, data_realsize))
+            LOGGER.info("Check DATASIZE: BAD (%s,%s)", data_size, data_realsize)
             raise BadDataException()
 
         # verify data checksum
         data_checksum = int(packed_resp[resp_size-1])
+        data = packed_resp[self.HEADER_SIZE:resp_size-1]
         if (data_size == 0):
             data_realchecksum = 0
         else:
-            data = packed_resp[self.HEADER_SIZE:resp_size-1]
             data_realchecksum = self._checksum8bytes(data)
             if (data_checksum == data_realchecksum):
-                LOGGER.info("Check DATACRC: OK (%x)" % data_checksum)
+                LOGGER.info("Check DATACRC: OK (%x)", data_checksum)
             else:
-                LOGGER.info("Check DATACRC: BAD (%x,%x)" % (data_checksum, data_realchecksum))
+                LOGGER.info("Check DATACRC: BAD (%x,%x)", data_checksum, data_realchecksum)
                 raise BadCRCException()
             
         return data                
@@ -361,21 +830,4 @@ class SimpleBGC32(object):
 
     def _checksum8bytes(self, string):
         '''Returns checksum  value from string.'''
-        checksum = 0
-        # for each char in the string
-        for ch in string:
-            try:
-                c = ord(ch)
-            except:
-                c = ch
-            checksum = (checksum + c) & 0xFF
-        return checksum
-
-
-
-def _addmeasure(sumfields, fields):
-    for i in range(len(fields)):
-        if fields[i]['name'] != 'reserved':
-            sumfields[i]['value'] += fields[i]['value']
-
-            
+        return checksum8(string)
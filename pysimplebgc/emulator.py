@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.emulator
+    --------------------
+
+    Emulated SimpleBGC board, to use `SimpleBGC32` without a controller.
+
+    The emulator answers every command of the command table,
+    CMD_REALTIME_DATA_CUSTOM and CMD_DATA_STREAM_INTERVAL over a local TCP
+    socket or a pseudo-terminal, with an optional response latency, the
+    throughput of a serial link and faults injected in the sent frames.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import division, unicode_literals
+import os
+import errno
+import math
+import time
+import random
+import select
+import socket
+import struct
+import threading
+import socketserver
+from collections import deque
+
+from .logger import LOGGER
+from .codec import pack_frame, split_framefmt
+from .parser import FrameParser
+from .device import SimpleBGC32
+from .stream import STREAMCMD
+
+
+# commands of the board information, constant for a given board
+STATIC_CMDTYPES = ('CMD_BOARD_INFO', 'CMD_BOARD_INFO_3')
+
+# amplitude of the emulated values by struct format
+AMPLITUDES = {'b': 100, 'B': 100, 'h': 1000, 'H': 1000, 'i': 1000,
+              'I': 1000, 'l': 1000, 'L': 1000, 'q': 1000, 'Q': 1000}
+
+
+class Faults(object):
+    '''Faults injected in the frames sent by the emulator, each one with
+    its probability per frame.
+
+    :param badcrc: Probability of a wrong body checksum.
+    :param drop: Probability of a missing byte.
+    :param extra: Probability of an additional random byte.
+    :param partial: Probability of a frame cut before its end.
+    :param seed: Seed of the random generator, for reproducible runs.
+    '''
+
+    KINDS = ('badcrc', 'drop', 'extra', 'partial')
+
+    def __init__(self, badcrc=0, drop=0, extra=0, partial=0, seed=None):
+        self.probabilities = {'badcrc': badcrc, 'drop': drop,
+                              'extra': extra, 'partial': partial}
+        self.random = random.Random(seed)
+        self.counts = dict.fromkeys(self.KINDS, 0)
+
+    def apply(self, frame):
+        '''Returns the frame with the drawn faults.'''
+        rand = self.random
+        for kind in self.KINDS:
+            if not self.probabilities[kind] or \
+                    rand.random() >= self.probabilities[kind]:
+                continue
+            self.counts[kind] += 1
+            frame = bytearray(frame)
+            if kind == 'badcrc':
+                frame[-1] ^= 1 + rand.randrange(255)
+            elif kind == 'drop':
+                del frame[rand.randrange(len(frame))]
+            elif kind == 'extra':
+                frame.insert(rand.randrange(len(frame) + 1),
+                             rand.randrange(256))
+            else:
+                frame = frame[:rand.randrange(1, len(frame))]
+            frame = bytes(frame)
+        return frame
+
+
+class Board(object):
+    '''Contents of the emulated board : the response bodies are built from
+    the command table, the real-time values change with time and the board
+    information is constant.
+
+    :param index: Number of the board, sets its deviceID and mcuID.
+    '''
+
+    def __init__(self, index=1):
+        self.index = index
+        self.started = time.monotonic()
+        self.codecs = SimpleBGC32.CODECS
+        self.cmdtypes = dict((codec.id, codec)
+                             for codec in self.codecs.values())
+        # struct formats of the values by fields formats
+        self.kinds = {}
+        # constant values of the board information
+        self.constants = {'BOARD_VER': 30, 'FIRMWARE_VER': 2600,
+                          'deviceID': ('EMU%06d' % index).encode('ascii'),
+                          'mcuID': ('EMULATOR%04d' % index).encode('ascii')}
+        # constant bodies of the board information, by command type
+        self.static = {}
+
+    def values(self, names, framefmts, now):
+        '''Returns the values of the fields at time `now`.'''
+        t = now - self.started
+        values = []
+        kinds = self.kinds.get(framefmts)
+        if kinds is None:
+            kinds = self.kinds[framefmts] = tuple(
+                split_framefmt(framefmt)[1][-1] for framefmt in framefmts)
+        for i, (name, kind) in enumerate(zip(names, kinds)):
+            if name in self.constants:
+                value = self.constants[name]
+            elif kind == 's':
+                value = b''
+            elif kind in 'fd':
+                value = math.sin(t + i)
+            else:
+                amplitude = AMPLITUDES[kind]
+                value = int(amplitude * math.sin(t + i))
+                if kind.isupper():
+                    value += amplitude
+            values.append(value)
+        return values
+
+    def body(self, codec, now):
+        '''Returns the response body of a command of the command table.'''
+        if codec.cmdtype in STATIC_CMDTYPES:
+            body = self.static.get(codec.cmdtype)
+            if body is None:
+                # the values at the start of the board never change
+                body = self.static[codec.cmdtype] = codec.struct.pack(
+                    *self.values(codec.names, codec.framefmts, self.started))
+            return body
+        return codec.struct.pack(*self.values(codec.names, codec.framefmts,
+                                              now))
+
+    def custombody(self, mask, now):
+        '''Returns the CMD_REALTIME_DATA_CUSTOM body of the data groups of
+        a DATA_MASK.'''
+        fields = [field for group in SimpleBGC32.CUSTOMDATADEF
+                  if mask & (1 << group['bit'])
+                  for field in group['respfields']]
+        names = tuple(field['name'] for field in fields)
+        framefmts = tuple(field['framefmt'] for field in fields)
+        timestamp = int((now - self.started) * 1000) & 0xFFFF
+        return (struct.pack('<H', timestamp) +
+                struct.pack('<' + ''.join(framefmts),
+                            *self.values(names, framefmts, now)))
+
+    def respond(self, session, frame, now):
+        '''Returns the response frame to a command frame.'''
+        codec = self.cmdtypes.get(frame.cmdid)
+        if codec is not None:
+            return pack_frame(codec.id, self.body(codec, now))
+        if frame.cmdid == SimpleBGC32.CMD_REALTIME_DATA_CUSTOM:
+            mask = struct.unpack_from('<I', frame.body)[0]
+            return pack_frame(frame.cmdid, self.custombody(mask, now))
+        if (frame.cmdid == SimpleBGC32.CMD_DATA_STREAM_INTERVAL and
+                len(frame.body) == STREAMCMD.size):
+            cmdid, interval, config = STREAMCMD.unpack(frame.body)[:3]
+            if (cmdid in self.cmdtypes or
+                    cmdid == SimpleBGC32.CMD_REALTIME_DATA_CUSTOM):
+                session.subscribe(cmdid, interval / 1000, config, now)
+                return pack_frame(SimpleBGC32.CMD_CONFIRM,
+                                  bytes(bytearray([frame.cmdid])))
+        LOGGER.info("Emulator refuse command : %s", frame.cmdid)
+        return pack_frame(SimpleBGC32.CMD_ERROR,
+                          bytes(bytearray([frame.cmdid])))
+
+    def pushed(self, session, now):
+        '''Returns the frame pushed to a subscribed session.'''
+        if session.cmdid == SimpleBGC32.CMD_REALTIME_DATA_CUSTOM:
+            mask = struct.unpack_from('<I', session.config)[0]
+            return pack_frame(session.cmdid, self.custombody(mask, now))
+        codec = self.cmdtypes[session.cmdid]
+        return pack_frame(codec.id, self.body(codec, now))
+
+
+class Session(object):
+    '''Exchanges of one connection with the emulated board.
+
+    :param emulator: The `Emulator`.
+    :param recv: Function returning the received data, None if nothing was
+                 received before its timeout, b'' when the peer is gone.
+    :param send: Function sending data.
+    '''
+
+    def __init__(self, emulator, recv, send):
+        self.emulator = emulator
+        self.recv = recv
+        self.send = send
+        self.cmdid = None
+        self.interval = 0
+        self.config = b''
+        self.pushnext = 0
+        # (due time, frame) of the responses delayed by the latency
+        self.pending = deque()
+
+    def subscribe(self, cmdid, interval, config, now):
+        '''Pushes the frames of cmdid every interval seconds, 0 stops.'''
+        self.cmdid = cmdid
+        self.interval = interval
+        self.config = config
+        self.pushnext = now + interval
+
+    def run(self, stopping):
+        '''Answers the commands until the peer is gone or `stopping` is set.'''
+        emulator = self.emulator
+        parser = FrameParser()
+        pending = self.pending
+        while not stopping.is_set():
+            now = time.monotonic()
+            timeout = 0.1
+            if self.interval:
+                timeout = max(0, min(timeout, self.pushnext - now))
+            if pending:
+                timeout = max(0, min(timeout, pending[0][0] - now))
+            data = self.recv(timeout)
+            if data == b'':
+                break
+            if data:
+                now = time.monotonic()
+                parser.feed(data)
+                for frame in parser:
+                    # the requests in flight overlap, as on a real link
+                    pending.append((now + emulator.latency,
+                                    emulator.board.respond(self, frame, now)))
+            now = time.monotonic()
+            while pending and pending[0][0] <= now:
+                self.write(pending.popleft()[1])
+            if self.interval and now >= self.pushnext:
+                self.pushnext = max(self.pushnext + self.interval, now)
+                self.write(emulator.board.pushed(self, now))
+
+    def write(self, frame):
+        '''Sends a frame with the injected faults, at the link throughput.'''
+        emulator = self.emulator
+        if emulator.faults is not None:
+            frame = emulator.faults.apply(frame)
+        self.send(frame)
+        emulator.frames += 1
+        if emulator.baudrate:
+            # 10 bits per byte on a 8N1 serial link
+            time.sleep(len(frame) * 10 / emulator.baudrate)
+
+
+class LoopbackLink(object):
+    '''In-memory link to an emulated board with the `PyLink` API : the
+    responses are computed when the commands are written, without thread
+    nor socket, e.g. for benchmarks.
+
+    :param faults: Optional `Faults` injected in the sent frames.
+    :param index: Number of the board, sets its deviceID and mcuID.
+    '''
+
+    def __init__(self, faults=None, index=1):
+        self.latency = 0
+        self.baudrate = None
+        self.faults = faults
+        self.board = Board(index)
+        self.frames = 0
+        self.timeout = 1
+        self.rx = bytearray()
+        self.parser = FrameParser()
+        self.session = Session(self, None, self.rx.extend)
+
+    @property
+    def url(self):
+        return 'loopback:%d' % self.board.index
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def write(self, data):
+        '''Answers the command frames of data.'''
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = data.encode('utf-8')
+        self.parser.feed(data)
+        for frame in self.parser:
+            self.session.write(self.board.respond(self.session, frame,
+                                                  time.monotonic()))
+
+    def read(self, size=None, timeout=None):
+        '''Returns up to size bytes of the responses, the pushed frames of
+        a subscription are produced when read.'''
+        session = self.session
+        if session.interval and not self.rx:
+            now = time.monotonic()
+            if now < session.pushnext:
+                time.sleep(session.pushnext - now)
+                now = session.pushnext
+            session.pushnext += session.interval
+            session.write(self.board.pushed(session, now))
+        size = size or len(self.rx)
+        data = bytes(self.rx[:size])
+        del self.rx[:size]
+        return data
+
+
+class EmulatorHandler(socketserver.BaseRequestHandler):
+    '''Serves a TCP client of the emulator.'''
+
+    def handle(self):
+        sock = self.request
+
+        def recv(timeout):
+            if not select.select([sock], [], [], timeout)[0]:
+                return None
+            try:
+                return sock.recv(4096)
+            except socket.error:
+                return b''
+
+        Session(self.server.owner, recv, sock.sendall).run(
+            self.server.owner._stopping)
+
+
+class ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Emulator(object):
+    '''Emulated board listening on a local TCP port or a pseudo-terminal,
+    its `url` is accepted by `SimpleBGC32.from_url`.
+
+    E.g.
+    >>> with Emulator('tcp:localhost:0') as emulator:       # doctest: +SKIP
+    ...     device = SimpleBGC32.from_url(emulator.url)
+
+    :param address: tcp:host:port, the port 0 picks a free port, or pty
+                    (default: tcp:localhost:0).
+    :param latency: Delay in seconds before each response (default: 0).
+    :param baudrate: Throttles the sent data to the throughput of a serial
+                     link, None if unlimited (default: None).
+    :param faults: Optional `Faults` injected in the sent frames.
+    :param index: Number of the board, sets its deviceID and mcuID.
+    '''
+
+    def __init__(self, address='tcp:localhost:0', latency=0, baudrate=None,
+                 faults=None, index=1):
+        self.latency = latency
+        self.baudrate = baudrate
+        self.faults = faults
+        self.board = Board(index)
+        self.frames = 0
+        self.thread = None
+        self._stopping = threading.Event()
+        self.server = None
+        self.master = self.slave = None
+        args = address.split(':', 1)
+        if args[0] == 'tcp':
+            host, port = args[1].rsplit(':', 1)
+            self.server = ThreadingTCPServer((host, int(port)),
+                                             EmulatorHandler)
+            self.server.owner = self
+        elif args[0] == 'pty':
+            import tty                                  # not available on Windows
+            self.master, self.slave = os.openpty()
+            tty.setraw(self.master)
+        else:
+            raise ValueError('Bad emulator address specified')
+
+    @property
+    def url(self):
+        '''`PyLink` URL of the emulated board.'''
+        if self.server is not None:
+            return 'tcp:%s:%d' % self.server.server_address[:2]
+        return 'serial:%s:%d:8N1' % (os.ttyname(self.slave),
+                                     self.baudrate or 115200)
+
+    def serve_forever(self):
+        '''Serves the emulated board until `shutdown`.'''
+        LOGGER.info("emulate : %s", self.url)
+        self._stopping.clear()
+        if self.server is not None:
+            try:
+                self.server.serve_forever()
+            finally:
+                self._stopping.set()
+                self.server.server_close()
+            return
+        master = self.master
+
+        def recv(timeout):
+            if not select.select([master], [], [], timeout)[0]:
+                return None
+            try:
+                return os.read(master, 4096)
+            except OSError as e:
+                if e.errno != errno.EIO:
+                    raise
+                # the client closed the pty, wait for the next session
+                self._stopping.wait(timeout)
+                return b''
+
+        def send(data):
+            while data:
+                data = data[os.write(master, data):]
+
+        try:
+            while not self._stopping.is_set():
+                Session(self, recv, send).run(self._stopping)
+        finally:
+            os.close(self.master)
+            os.close(self.slave)
+
+    def start(self):
+        '''Serves the emulated board from a background thread.'''
+        if self.thread is not None:
+            return self
+        self.thread = threading.Thread(target=self.serve_forever,
+                                       name='pysimplebgc-emulator')
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def shutdown(self):
+        '''Stops `serve_forever`, from another thread.'''
+        self._stopping.set()
+        if self.server is not None:
+            self.server.shutdown()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.shutdown()
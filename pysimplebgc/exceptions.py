@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.exceptions
+    ----------------------
+
+    Exceptions raised when communicating with the board.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+
+
+class NoDeviceException(Exception):
+    '''Can not access device.'''
+    value = __doc__
+
+
+class BadCmdException(Exception):
+    '''No valid command.'''
+    value = __doc__
+
+
+class BadAckException(Exception):
+    '''No valid acknowledgement.'''
+    def __str__(self):
+        return self.__doc__
+
+
+class BadCRCException(Exception):
+    '''No valid checksum.'''
+    def __str__(self):
+        return self.__doc__
+
+
+class BadDataException(Exception):
+    '''No valid data.'''
+    def __str__(self):
+        return self.__doc__
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.linkio
+    ------------------
+
+    Reading of the `PyLink` links into preallocated buffers.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import select
+from pylink import TCPLink, UDPLink, SerialLink
+
+from .utils import is_text
+
+
+def link_readinto(link):
+    '''Returns a `readinto(view)` function reading the link into a writable
+    memoryview and returning the number of bytes read, as `FrameParser.fill`
+    expects. TCP sockets are read without intermediate copy (`recv_into`),
+    serial ports through `Serial.readinto`, which pyserial implements as a
+    `read` and a copy into the view, and the other links (UDP, GSM) through
+    their `read` method.
+
+    :param link: A `PyLink` connection.
+    '''
+    # a datagram larger than the view would be truncated
+    if isinstance(link, TCPLink) and not isinstance(link, UDPLink):
+        def readinto(view):
+            sock = link.socket
+            # the PyLink sockets are non-blocking
+            if not select.select([sock], [], [], link.timeout or 1)[0]:
+                return 0
+            try:
+                return sock.recv_into(view)
+            except (BlockingIOError, InterruptedError):
+                return 0
+        return readinto
+    if isinstance(link, SerialLink):
+        def readinto(view):
+            return link.serial.readinto(view) or 0
+        return readinto
+
+    def readinto(view):
+        data = link.read(len(view))
+        if is_text(data):
+            # the link returns text when the data is valid utf-8
+            data = data.encode('utf-8')
+        view[:len(data)] = data
+        return len(data)
+    return readinto
+
+
+def link_flush(link):
+    '''Discards the data received by the link and not read yet, without
+    waiting, and returns the number of bytes discarded. Only TCP, UDP and
+    serial links can be flushed, the other links are left unchanged.
+
+    :param link: A `PyLink` connection.
+    '''
+    if isinstance(link, TCPLink):
+        sock = link.socket
+        count = 0
+        while select.select([sock], [], [], 0)[0]:
+            try:
+                data = sock.recv(4096)
+            except (BlockingIOError, InterruptedError):
+                break
+            if not data:
+                break
+            count += len(data)
+        return count
+    if isinstance(link, SerialLink):
+        count = link.serial.in_waiting
+        link.serial.reset_input_buffer()
+        return count
+    return 0
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.parser
+    ------------------
+
+    Incremental parser of the '>' framed stream sent by the board.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+from collections import namedtuple
+
+from .logger import LOGGER
+from .utils import is_text
+
+
+START_BYTE = ord('>')
+HEADER_SIZE = 4
+
+Frame = namedtuple('Frame', 'cmdid body')
+
+
+class FrameParser(object):
+    '''Accepts arbitrary chunks of bytes and returns the complete frames they
+    contain. Corrupted data (bad header checksum, unexpected body size or bad
+    body checksum) is skipped up to the next '>' start byte.
+
+    The data is kept in a buffer allocated once, the bodies of the returned
+    frames are memoryviews of this buffer : they are valid until the next
+    `feed` or `fill`, `bytes(frame.body)` keeps a copy.
+
+    :param bodysizes: Optional dict of expected body size by command id.
+    :param capacity: Initial size of the buffer, it grows if a chunk does
+                     not fit (default: 4096).
+    '''
+
+    def __init__(self, bodysizes=None, capacity=4096):
+        self.bodysizes = bodysizes or {}
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        # the pending data is buffer[start:end]
+        self.start = 0
+        self.end = 0
+        self.resyncs = 0
+        self.skipped = 0
+        # frames with a valid header and a bad body checksum : lost frames
+        self.badframes = 0
+
+    def feed(self, data):
+        '''Appends received data to the parser buffer.'''
+        if is_text(data):
+            # the link returns text when the data is valid utf-8
+            data = data.encode('utf-8')
+        size = len(data)
+        self._reserve(size)
+        self.view[self.end:self.end + size] = data
+        self.end += size
+
+    def fill(self, readinto, size):
+        '''Reads up to `size` bytes directly into the parser buffer, without
+        intermediate copy : `readinto` is called with a writable memoryview
+        and returns the number of bytes written.'''
+        self._reserve(size)
+        count = readinto(self.view[self.end:self.end + size])
+        self.end += count
+        return count
+
+    def clear(self):
+        '''Drops the buffered data.'''
+        self.start = self.end = 0
+
+    @property
+    def pending(self):
+        '''Number of buffered bytes not yet returned in a frame.'''
+        return self.end - self.start
+
+    def next_frame(self):
+        '''Returns the next complete frame, or None if more data is needed.'''
+        buf = self.buffer
+        while True:
+            start = buf.find(START_BYTE, self.start, self.end)
+            if start < 0:
+                self._skip(self.end - self.start)
+                return None
+            if start > self.start:
+                self._skip(start - self.start)
+            if self.end - start < HEADER_SIZE:
+                return None
+            cmdid = buf[start + 1]
+            size = buf[start + 2]
+            if (cmdid + size) & 0xFF != buf[start + 3]:
+                self._resync("HEADERCRC", cmdid)
+                continue
+            expected = self.bodysizes.get(cmdid)
+            if expected is not None and expected != size:
+                self._resync("DATASIZE", cmdid)
+                continue
+            end = start + HEADER_SIZE + size + 1
+            if self.end < end:
+                return None
+            body = self.view[start + HEADER_SIZE:end - 1]
+            if sum(body) & 0xFF != buf[end - 1]:
+                self.badframes += 1
+                self._resync("DATACRC", cmdid)
+                continue
+            if end == self.end:
+                # the buffer is empty, the next data is written at its start
+                self.start = self.end = 0
+            else:
+                self.start = end
+            return Frame(cmdid, body)
+
+    def __iter__(self):
+        return iter(self.next_frame, None)
+
+    def _reserve(self, size):
+        if self.end + size <= len(self.buffer):
+            return
+        pending = self.end - self.start
+        if pending + size > len(self.buffer):
+            buffer = bytearray(max(2 * len(self.buffer), pending + size))
+            buffer[:pending] = self.view[self.start:self.end]
+            self.buffer = buffer
+            self.view = memoryview(buffer)
+        else:
+            # moves the pending data to the start of the buffer
+            self.view[:pending] = self.buffer[self.start:self.end]
+        self.start = 0
+        self.end = pending
+
+    def _skip(self, size):
+        self.skipped += size
+        self.start += size
+
+    def _resync(self, check, cmdid):
+        LOGGER.info("Check %s: BAD (%s), resync", check, cmdid)
+        self.resyncs += 1
+        self._skip(1)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.pipeline
+    --------------------
+
+    Pipelined requests : several commands in flight on the same link.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import time
+from collections import deque
+
+from .logger import LOGGER
+from .exceptions import BadCmdException, BadDataException, BadCRCException
+
+
+class Request(object):
+    '''A request in flight, waiting for its response.'''
+    __slots__ = ('codec', 'sent', 'deadline', 'record', 'error')
+
+    def __init__(self, codec, sent, deadline):
+        self.codec = codec
+        self.sent = sent
+        self.deadline = deadline
+        self.record = None
+        # the exception of a lost response
+        self.error = None
+
+    @property
+    def waiting(self):
+        return self.record is None and self.error is None
+
+
+class Pipeline(object):
+    '''Keeps several requests in flight on the link of a device, so that the
+    poll rate is not bounded by the link round-trip. Responses are matched
+    back to the requests by command id and order.
+
+    A corrupted response (valid header, bad body checksum) is the response
+    of the oldest request waiting : this request is dropped at once, and
+    the next responses still match their requests. A response lost without
+    any byte received is only detected by the timeout of its request, the
+    next responses are credited to the previous requests until then.
+
+    The device must not be used for other commands while requests are in
+    flight.
+
+    :param device: A `SimpleBGC32` device.
+    :param depth: Maximum number of requests in flight (default: 4).
+    :param timeout: Time in seconds to wait for each response
+                    (default: the link timeout).
+    '''
+
+    def __init__(self, device, depth=4, timeout=None):
+        self.device = device
+        self.depth = depth
+        self.timeout = (timeout or getattr(device.link, 'timeout', None)
+                        or 1)
+        self.requests = deque()
+        # requests dropped without record
+        self.dropped = 0
+
+    def submit(self, cmdtype, cmddata="", codec=None):
+        '''Sends a command without waiting for its response.
+
+        :param codec: Codec of the command if not in the command table,
+                      see `SimpleBGC32.customcodec`.
+        '''
+        if len(self.requests) >= self.depth:
+            raise ValueError("Pipeline is full (%d requests)" % self.depth)
+        if codec is None:
+            if not self.device.iscmdvalid(cmdtype):
+                raise BadCmdException()
+            codec = self.device.codecs[cmdtype]
+        data = codec.encode(cmddata)
+        self.device.send(data)
+        self.device.statistics.command(codec.cmdtype).sent(len(data))
+        self.requests.append(Request(codec, time.monotonic(),
+                                     time.monotonic() + self.timeout))
+
+    def result(self):
+        '''Returns the record of the oldest request in flight, raises
+        `BadCRCException` if its response was corrupted or
+        `BadDataException` if it timed out.'''
+        request = self.requests[0]
+        while request.waiting:
+            self._receive(request)
+        self.requests.popleft()
+        if request.error is not None:
+            raise request.error
+        return request.record
+
+    def poll(self, cmdtype, cmddata="", count=0, codec=None):
+        '''Yields the records of `cmdtype` while keeping the pipeline full,
+        the requests whose response is lost are dropped and counted.
+
+        :param count: number of requests, 0 if continue until break.
+        :param codec: Codec of the command if not in the command table.
+        '''
+        sent = 0
+        while True:
+            while (len(self.requests) < self.depth and
+                   (count == 0 or sent < count)):
+                self.submit(cmdtype, cmddata, codec)
+                sent += 1
+            if not self.requests:
+                return
+            try:
+                record = self.result()
+            except (BadDataException, BadCRCException):
+                continue
+            yield record
+
+    def drain(self):
+        '''Waits for the responses of the requests still in flight, so that
+        they do not mix with the next commands.'''
+        while self.requests:
+            try:
+                self.result()
+            except (BadDataException, BadCRCException):
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.drain()
+
+    def _receive(self, request):
+        parser = self.device.parser
+        while True:
+            badframes = parser.badframes
+            frame = parser.next_frame()
+            # the corrupted frames came before this frame
+            for i in range(parser.badframes - badframes):
+                self._drop(BadCRCException())
+            if frame is None:
+                break
+            self._dispatch(frame)
+        if not request.waiting:
+            return
+        if time.monotonic() > request.deadline:
+            LOGGER.info("Check RESPONSE: BAD (%s)", request.codec.cmdtype)
+            # the partial data of the response will not be completed
+            self._drop(BadDataException(), flush=True)
+            return
+        framesize = 1 + self.device.HEADER_SIZE + request.codec.respbodysize
+        parser.fill(self.device.readinto, max(1, framesize - parser.pending))
+
+    def _drop(self, error, flush=False):
+        '''Drops the oldest request waiting, its response is lost, as counted
+        by the recovery policy of the device.'''
+        for request in self.requests:
+            if request.waiting:
+                request.error = error
+                self.dropped += 1
+                self.device.statistics.command(request.codec.cmdtype).failed(
+                    error)
+                self.device.recovery.drop(self.device, error, flush)
+                return
+
+    def _dispatch(self, frame):
+        for request in self.requests:
+            if request.waiting and request.codec.id == frame.cmdid:
+                request.record = request.codec.decode(frame.body)
+                now = time.monotonic()
+                self.device.statistics.command(request.codec.cmdtype).received(
+                    1 + self.device.HEADER_SIZE + len(frame.body), now,
+                    now - request.sent)
+                return
+        LOGGER.info("Skip frame: %s", frame.cmdid)
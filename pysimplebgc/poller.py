@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.poller
+    ------------------
+
+    Background polling of the commands read by `SimpleBGC32.latest`.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import threading
+
+from .logger import LOGGER
+from .scheduler import Scheduler
+
+
+class Poller(object):
+    '''Sends commands every `period` seconds from a background thread, so
+    that `device.latest(cmdtype, max_age)` is answered from the cache as
+    long as `max_age` is longer than the period.
+
+    :param device: A `SimpleBGC32` device.
+    :param cmdtypes: Polled command types (default: CMD_REALTIME_DATA_4).
+    :param period: Period of polling in seconds (default: 0.01).
+    '''
+
+    def __init__(self, device, cmdtypes=('CMD_REALTIME_DATA_4',),
+                 period=0.01):
+        self.device = device
+        self.cmdtypes = tuple(cmdtypes)
+        self.period = period
+        self.polls = 0
+        self.errors = 0
+        self.thread = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        '''Starts the poller thread.'''
+        if self.thread is not None:
+            return
+        self._stopping.clear()
+        self.thread = threading.Thread(target=self._run,
+                                       name='pysimplebgc-poller')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        '''Stops the poller thread.'''
+        if self.thread is None:
+            return
+        self._stopping.set()
+        self.thread.join()
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _run(self):
+        scheduler = Scheduler(self.period, sleep=self._stopping.wait)
+        while not self._stopping.is_set():
+            scheduler.wait()
+            for cmdtype in self.cmdtypes:
+                try:
+                    self.device.cmd(cmdtype)
+                    self.polls += 1
+                except Exception as e:
+                    LOGGER.error("Poll %s: BAD (%s)", cmdtype, e)
+                    self.errors += 1
+        LOGGER.info("poll scheduler: %s", scheduler.stats())
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.recording
+    ---------------------
+
+    Compact binary recording of the acquired records.
+
+    A recording file starts with the `MAGIC` bytes, the size of the header
+    (4 bytes unsigned, little-endian) and the header itself : the command
+    definition encoded in JSON, padded with spaces to a multiple of 8 bytes.
+    It is followed by fixed-size records : the host timestamp (8 bytes
+    float, seconds since epoch) and the response body in the command format.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import io
+import json
+import mmap
+import struct
+from array import array
+from collections import namedtuple
+
+from .codec import Codec, unique_names, split_framefmt
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+MAGIC = b'SBGCREC1'
+HEADER_SIZE = struct.Struct('<I')
+TIMESTAMP = struct.Struct('<d')
+
+
+class BinaryWriter(object):
+    '''Writes records of one command in the binary recording format.
+
+    :param output: A file opened in binary mode.
+    :param codec: The codec of the recorded command.
+    '''
+
+    def __init__(self, output, codec):
+        self.output = output
+        self.codec = codec
+        self.struct = struct.Struct('<d' + codec.struct.format.lstrip('<'))
+        header = json.dumps({'cmdtype': codec.cmdtype, 'id': codec.id,
+                             'cmdbodysize': codec.cmdbodysize,
+                             'respbodysize': codec.respbodysize,
+                             'respfields': codec.respfields})
+        header = header.encode('utf-8')
+        start = len(MAGIC) + HEADER_SIZE.size
+        header += b' ' * (-(start + len(header)) % 8)
+        self.output.write(MAGIC + HEADER_SIZE.pack(len(header)) + header)
+
+    def write(self, timestamp, record):
+        '''Writes a record acquired at `timestamp` (seconds since epoch).'''
+        self.output.write(self.struct.pack(timestamp, *record))
+
+    def flush(self):
+        self.output.flush()
+
+
+class BinaryReader(object):
+    '''Reads a binary recording through a memory map. Records are decoded on
+    access, columns are zero-copy NumPy views when NumPy is installed.
+
+    :param filename: Path of the recording file.
+    '''
+
+    def __init__(self, filename):
+        self.file = io.open(filename, 'rb')
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mmap[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("%s is not a SimpleBGC recording" % filename)
+        start = len(MAGIC) + HEADER_SIZE.size
+        headersize = HEADER_SIZE.unpack_from(self.mmap, len(MAGIC))[0]
+        self.header = json.loads(
+            self.mmap[start:start + headersize].decode('utf-8'))
+        self.codec = Codec(self.header['cmdtype'], self.header)
+        self.offset = start + headersize
+        self.struct = struct.Struct('<d' +
+                                    self.codec.struct.format.lstrip('<'))
+        self.recordsize = self.struct.size
+        # an interrupted recording may end with a partial record
+        self.count = (len(self.mmap) - self.offset) // self.recordsize
+        self.record = namedtuple('Record', unique_names(
+            ('TIMESTAMP',) + self.codec.names))
+
+    @property
+    def names(self):
+        '''Names of the columns.'''
+        return self.record._fields
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("record index out of range")
+        return self.record._make(self.struct.unpack_from(
+            self.mmap, self.offset + index * self.recordsize))
+
+    def __iter__(self):
+        view = memoryview(self.mmap)[self.offset:
+                                     self.offset + self.count * self.recordsize]
+        try:
+            for values in self.struct.iter_unpack(view):
+                yield self.record._make(values)
+        finally:
+            view.release()
+
+    @property
+    def dtype(self):
+        '''NumPy structured dtype of the records.'''
+        return self.codec.dtype(offset=TIMESTAMP.size,
+                                itemsize=self.recordsize,
+                                prefix=[('TIMESTAMP', '<f8', 0)])
+
+    def array(self):
+        '''Returns the records as a NumPy structured array sharing the
+        memory map.'''
+        return numpy.frombuffer(self.mmap, dtype=self.dtype, count=self.count,
+                                offset=self.offset)
+
+    def column(self, name):
+        '''Returns the values of a column : a zero-copy NumPy view if NumPy
+        is installed, an `array` (or a list for text fields) otherwise.'''
+        index = self.names.index(name)
+        if numpy is not None:
+            return self.array()[name]
+        if index == 0:
+            offset, valuefmt = 0, 'd'
+        else:
+            offset = TIMESTAMP.size + self.codec.offsets[index - 1]
+            valuefmt = split_framefmt(self.codec.framefmts[index - 1])[1]
+        unpack_from = struct.Struct('<' + valuefmt).unpack_from
+        values = [unpack_from(self.mmap, self.offset + i * self.recordsize +
+                              offset)[0] for i in range(self.count)]
+        if valuefmt.endswith('s'):
+            return values
+        return array(valuefmt if valuefmt in 'bBhHiIlLqQfd' else 'd', values)
+
+    def close(self):
+        '''Closes the file. The memory map stays open as long as arrays
+        returned by `array` or `column` use it, and is closed when they are
+        garbage collected.'''
+        try:
+            self.mmap.close()
+        except BufferError:
+            # exported NumPy views keep a reference to the map
+            pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.recovery
+    --------------------
+
+    Recovery of the failed request/response exchanges with the board.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import time
+
+from .logger import LOGGER
+from .exceptions import BadAckException, BadCRCException, BadDataException
+
+
+class RecoveryPolicy(object):
+    '''Retries the whole request/response exchange when the response is
+    missing or corrupted. The received data is flushed first, so the next
+    response is parsed from the start of its frame. The first retry is
+    sent at once, the next ones after delays growing from `delay` to
+    `maxdelay`. Errors are counted by exception class.
+
+    :param tries: Number of attempts of a request (default: 3).
+    :param delay: Delay before the second retry in seconds (default: 0.01).
+    :param maxdelay: Maximum delay between two attempts (default: 0.5).
+    :param backoff: Factor of the delay after each retry (default: 2).
+    '''
+
+    # errors of the link or of the board worth sending the request again
+    RETRIABLE = (BadDataException, BadCRCException, BadAckException, OSError)
+
+    def __init__(self, tries=3, delay=0.01, maxdelay=0.5, backoff=2,
+                 sleep=time.sleep):
+        self.tries = max(1, tries)
+        self.delay = delay
+        self.maxdelay = maxdelay
+        self.backoff = backoff
+        self.sleep = sleep
+        self.errors = {}
+        self.retries = 0
+        self.recovered = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def delays(self):
+        '''Yields the delays before the successive retries.'''
+        yield 0
+        delay = self.delay
+        while True:
+            yield min(delay, self.maxdelay)
+            delay *= self.backoff
+
+    def call(self, device, request, *args):
+        '''Returns `request(*args)`, flushing the input of the device and
+        retrying after each retriable error. The last error is raised when
+        all the attempts failed.'''
+        delays = self.delays()
+        for attempt in range(self.tries):
+            try:
+                result = request(*args)
+            except self.RETRIABLE as e:
+                name = type(e).__name__
+                self.errors[name] = self.errors.get(name, 0) + 1
+                if attempt == self.tries - 1:
+                    LOGGER.error("Recover %s: BAD (%d tries)", name, self.tries)
+                    self.failures += 1
+                    raise
+                LOGGER.info("Recover %s: retry %d", name, attempt + 1)
+                device.flush()
+                self.retries += 1
+                delay = next(delays)
+                if delay:
+                    self.sleep(delay)
+            else:
+                if attempt:
+                    self.recovered += 1
+                return result
+
+    def drop(self, device, error, flush=False):
+        '''Counts a request given up without retry, e.g. a pipelined request
+        whose response is lost while the next requests are in flight, and
+        flushes the input of the device if `flush`.'''
+        name = type(error).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+        self.dropped += 1
+        LOGGER.info("Recover %s: dropped", name)
+        if flush:
+            device.flush()
+
+    def stats(self):
+        '''Returns the retries, recovered, failed and dropped requests counts,
+        and the errors counts by exception class.'''
+        return {'retries': self.retries, 'recovered': self.recovered,
+                'failures': self.failures, 'dropped': self.dropped,
+                'errors': dict(self.errors)}
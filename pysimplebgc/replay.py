@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.replay
+    ------------------
+
+    Offline replay of the responses of a capture file through the frame
+    parser and the codecs, see `pysimplebgc.trace.Capture`.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import division, unicode_literals
+import io
+import mmap
+import time
+import struct
+from datetime import datetime
+
+from .trace import MAGIC, CHUNK, TX, RX, Chunk
+from .parser import FrameParser, HEADER_SIZE
+from .device import SimpleBGC32
+from .stream import STREAMCMD
+from .aggregate import accumulator
+from .recording import BinaryWriter
+from .bulk import require_numpy, find_frames, frame_bodies, numpy
+
+
+class Replay(object):
+    '''Reads a capture (or trace) file through a memory map and decodes the
+    captured responses with the codecs of `SimpleBGC32`. The commands sent
+    are decoded too, to find the data groups of CMD_REALTIME_DATA_CUSTOM
+    responses.
+
+    :param filename: Path of the capture file.
+    '''
+
+    def __init__(self, filename):
+        self.file = io.open(filename, 'rb')
+        try:
+            self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:                      # an empty file can not be mapped
+            self.file.close()
+            raise ValueError("%s is not a SimpleBGC capture" % filename)
+        if self.mmap[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("%s is not a SimpleBGC capture" % filename)
+        self.codecs = dict((codec.id, codec)
+                           for codec in SimpleBGC32.CODECS.values())
+
+    def chunks(self, pace=False, speed=1.0):
+        '''Yields the `Chunk` tuples of the capture, the data is a memoryview
+        of the memory map. The chunks are yielded at once, or at the
+        recorded pace divided by `speed` if `pace` is True.'''
+        view = memoryview(self.mmap)
+        size = len(view)
+        offset = len(MAGIC)
+        start = first = None
+        try:
+            while offset + CHUNK.size <= size:
+                timestamp, direction, length = CHUNK.unpack_from(view, offset)
+                offset += CHUNK.size
+                if offset + length > size:
+                    # an interrupted capture may end with a partial chunk
+                    return
+                if pace:
+                    if start is None:
+                        start, first = time.monotonic(), timestamp
+                    delay = start + (timestamp - first) / speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                yield Chunk(timestamp, direction, view[offset:offset + length])
+                offset += length
+        finally:
+            view.release()
+
+    def frames(self, pace=False, speed=1.0):
+        '''Yields the (timestamp, direction, frame) of the frames of the
+        capture, parsed as the device parses them. The frame bodies are
+        valid until the next frame.'''
+        bodysizes = dict((codec.id, codec.respbodysize)
+                         for codec in self.codecs.values())
+        parsers = {TX: FrameParser(), RX: FrameParser(bodysizes)}
+        for timestamp, direction, data in self.chunks(pace, speed):
+            parser = parsers[direction]
+            parser.feed(data)
+            data.release()
+            for frame in parser:
+                yield timestamp, direction, frame
+
+    def records(self, pace=False, speed=1.0):
+        '''Yields the (timestamp, codec, record) of the responses of the
+        capture. The custom realtime data is decoded with the DATA_MASK of
+        the last command sent.'''
+        custom = None
+        for timestamp, direction, frame in self.frames(pace, speed):
+            cmdid = frame.cmdid
+            if direction == TX:
+                if cmdid == SimpleBGC32.CMD_REALTIME_DATA_CUSTOM:
+                    custom = self._customcodec(struct.unpack_from('<I', frame.body)[0])
+                elif (cmdid == SimpleBGC32.CMD_DATA_STREAM_INTERVAL and
+                        len(frame.body) == STREAMCMD.size):
+                    streamid, interval, config = STREAMCMD.unpack(frame.body)[:3]
+                    if streamid == SimpleBGC32.CMD_REALTIME_DATA_CUSTOM:
+                        custom = self._customcodec(struct.unpack_from('<I', config)[0])
+                continue
+            codec = self.codecs.get(cmdid)
+            if cmdid == SimpleBGC32.CMD_REALTIME_DATA_CUSTOM:
+                codec = custom
+            if codec is None or len(frame.body) != codec.respbodysize:
+                continue
+            yield timestamp, codec, codec.decode(frame.body)
+
+    def collect(self, cmdtype, output, delim=';', storingperiod=0,
+                statistics=('mean',), pace=False, speed=1.0):
+        '''Writes the records of cmdtype in CSV as `setcollectcmd` does, the
+        statistics of each storing period of the recorded timestamps, every
+        record if storingperiod is 0. Returns the number of rows written.
+
+        :param storingperiod: period of storing, 10ms
+        '''
+        summary = None
+        rows = 0
+        window = None
+        stored = None
+        for timestamp, codec, record in self.records(pace, speed):
+            if codec.cmdtype != cmdtype:
+                continue
+            if summary is None:
+                summary = accumulator(codec, statistics)
+                columns = summary.columns
+                output.write("DATETIME" + ''.join(delim + name for name, valuefmt
+                                                  in columns) + '\n')
+                summarycodec = codec
+            elif codec is not summarycodec:                                     # data groups changed
+                continue
+            if storingperiod:
+                current = int(timestamp * 100 // storingperiod)
+                if window is not None and current != window and summary.count:
+                    self._store(output, delim, columns, summary, stored)
+                    rows += 1
+                    summary.reset()
+                window = current
+            summary.add(record)
+            stored = timestamp
+            if not storingperiod:
+                self._store(output, delim, columns, summary, stored)
+                rows += 1
+                summary.reset()
+        if storingperiod and summary is not None and summary.count:
+            self._store(output, delim, columns, summary, stored)
+            rows += 1
+        return rows
+
+    def record(self, cmdtype, output, pace=False, speed=1.0):
+        '''Writes the records of cmdtype in the binary recording format, see
+        `BinaryWriter`. Returns the number of records written.'''
+        writer = None
+        count = 0
+        for timestamp, codec, record in self.records(pace, speed):
+            if codec.cmdtype != cmdtype:
+                continue
+            if writer is None:
+                writer = BinaryWriter(output, codec)
+            elif codec is not writer.codec:                                     # data groups changed
+                continue
+            writer.write(timestamp, record)
+            count += 1
+        if writer is not None:
+            writer.flush()
+        return count
+
+    def received(self):
+        '''Returns the data received in the capture in one buffer, with the
+        end offsets and the timestamps of its chunks in NumPy arrays.'''
+        require_numpy()
+        chunks = [(timestamp, bytes(data)) for timestamp, direction, data
+                  in self.chunks() if direction == RX]
+        ends = numpy.cumsum([len(data) for timestamp, data in chunks],
+                            dtype=numpy.intp)
+        timestamps = numpy.array([timestamp for timestamp, data in chunks],
+                                 dtype=numpy.float64)
+        return b''.join(data for timestamp, data in chunks), ends, timestamps
+
+    def array(self, cmdtype='CMD_REALTIME_DATA_4', codec=None):
+        '''Returns all the responses of cmdtype in a NumPy structured array,
+        decoded in bulk, with a TIMESTAMP field : the timestamp of the chunk
+        where each frame was completed.
+
+        :param codec: Codec of the command if not in the command table, see
+                      `SimpleBGC32.customcodec`.
+        '''
+        codec = codec or SimpleBGC32.CODECS[cmdtype]
+        data, ends, timestamps = self.received()
+        offsets = find_frames(data, codec)
+        bodysize = codec.respbodysize
+        records = numpy.empty(len(offsets), dtype=codec.dtype(
+            offset=8, itemsize=8 + bodysize, prefix=[('TIMESTAMP', '<f8', 0)]))
+        chunks = numpy.searchsorted(ends, offsets + HEADER_SIZE + bodysize,
+                                    side='right')
+        records['TIMESTAMP'] = timestamps[chunks]
+        records.view(numpy.uint8).reshape(len(offsets), 8 + bodysize)[:, 8:] = (
+            frame_bodies(data, offsets, bodysize))
+        return records
+
+    def close(self):
+        self.mmap.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _customcodec(self, mask):
+        try:
+            return SimpleBGC32.customcodec(mask)
+        except Exception:
+            return None
+
+    def _store(self, output, delim, columns, summary, timestamp):
+        dt = datetime.utcfromtimestamp(timestamp)
+        data = dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        for (name, valuefmt), value in zip(columns, summary.values()):
+            data += (delim + valuefmt % (value))
+        output.write(data + '\n')
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.scheduler
+    ---------------------
+
+    Periodic acquisition deadlines on a monotonic clock.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import division, unicode_literals
+import time
+
+
+class Scheduler(object):
+    '''Sleeps until fixed deadlines `start + tick * period`. Deadlines do not
+    depend on the wake-up time, so the lateness of a tick does not delay the
+    next ones. When a tick is late by more than one period, the missed
+    deadlines are skipped and counted as overruns.
+
+    :param period: Period between two deadlines, in seconds, 0 for
+                   back-to-back ticks without wait nor overrun.
+    '''
+
+    def __init__(self, period, clock=time.monotonic, sleep=time.sleep):
+        self.period = period
+        self.clock = clock
+        self.sleep = sleep
+        self.start_time = None
+        self.now = None
+        self.tick = 0
+        self.ticks = 0
+        self.overruns = 0
+        self.jitter = 0.0
+        self.jittersum = 0.0
+        self.jittermax = 0.0
+
+    def start(self, start_time=None):
+        '''Sets the first deadline to `start_time` on the scheduler clock,
+        now if None. Schedulers started at the same time share their
+        deadlines.'''
+        self.start_time = self.clock() if start_time is None else start_time
+        self.now = self.start_time
+        self.tick = 0
+
+    @property
+    def deadline(self):
+        '''Time of the next deadline on the scheduler clock.'''
+        return self.start_time + self.tick * self.period
+
+    @property
+    def elapsed(self):
+        '''Time of the last wake up since the start, in seconds.'''
+        return self.now - self.start_time
+
+    def wait(self):
+        '''Sleeps until the next deadline and returns its tick index.'''
+        if self.start_time is None:
+            self.start()
+        tick = self.tick
+        if not self.period:
+            # back-to-back ticks, there is no deadline to be late for
+            self.now = self.clock()
+            self.ticks += 1
+            self.tick += 1
+            return tick
+        deadline = self.deadline
+        now = self.clock()
+        if now < deadline:
+            self.sleep(deadline - now)
+            now = self.clock()
+        self.now = now
+        # lateness of the wake up
+        self.jitter = max(now - deadline, 0.0)
+        self.jittersum += self.jitter
+        self.jittermax = max(self.jittermax, self.jitter)
+        self.ticks += 1
+        missed = int(self.jitter / self.period)
+        self.overruns += missed
+        self.tick += 1 + missed
+        return tick
+
+    def stats(self):
+        '''Returns the ticks, overruns and jitter (in seconds) statistics.'''
+        return {'ticks': self.ticks,
+                'overruns': self.overruns,
+                'jitter_mean': self.jittersum / self.ticks if self.ticks else 0.0,
+                'jitter_max': self.jittermax}
+
+    def __repr__(self):
+        return ('<Scheduler period=%gs ticks=%d overruns=%d jitter_max=%gs>' %
+                (self.period, self.ticks, self.overruns, self.jittermax))
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.server
+    ------------------
+
+    Daemon owning the link of a board and sharing it with many clients.
+
+    Clients speak the SimpleBGC serial protocol over a TCP or Unix socket,
+    so a `SimpleBGC32` connected to `tcp:host:port` works unchanged:
+
+    - the real-time data command is answered from the last polled frame,
+    - CMD_DATA_STREAM_INTERVAL subscribes to the polled frames,
+    - the other commands of the command table and CMD_REALTIME_DATA_CUSTOM
+      are forwarded to the board, one at a time,
+    - unknown commands are answered by CMD_ERROR.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import division, unicode_literals
+import os
+import socket
+import threading
+import time
+import socketserver
+
+from .logger import LOGGER
+from .codec import pack_frame
+from .parser import FrameParser
+from .scheduler import Scheduler
+from .stream import STREAMCMD
+from .compat import Queue, Full
+
+
+class ClientHandler(socketserver.BaseRequestHandler):
+    '''Reads the command frames of a client. The response and the pushed
+    frames are sent by a sender thread from a queue, so a slow client never
+    blocks the poller : frames pushed while its queue is full are dropped.'''
+
+    def setup(self):
+        self.queue = Queue(self.server.owner.maxsize)
+        self.parser = FrameParser()
+        self.interval = 0
+        self.pushnext = 0
+        self.dropped = 0
+        self.sender = threading.Thread(target=self._send,
+                                       name='pysimplebgc-client')
+        self.sender.daemon = True
+        self.sender.start()
+        self.server.owner._attach(self)
+
+    def handle(self):
+        while True:
+            try:
+                data = self.request.recv(4096)
+            except socket.error:
+                break
+            if not data:
+                break
+            self.parser.feed(data)
+            for frame in self.parser:
+                self.queue.put(self.server.owner.respond(self, frame))
+
+    def finish(self):
+        self.server.owner._detach(self)
+        self.queue.put(None)
+        self.sender.join()
+
+    def push(self, frame, now):
+        '''Queues a polled frame if the client subscribed to it.'''
+        if not self.interval or now < self.pushnext:
+            return
+        self.pushnext = max(self.pushnext + self.interval, now)
+        try:
+            self.queue.put_nowait(frame)
+        except Full:
+            self.dropped += 1
+
+    def _send(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            try:
+                self.request.sendall(data)
+            except socket.error:
+                break
+
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn,
+                          socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Server(object):
+    '''Polls the real-time data of a board once and fans it out to the
+    clients, the command requests of the clients are serialized on the link.
+
+    :param device: A `SimpleBGC32` device.
+    :param address: Listening address, E.g. tcp:localhost:5000 or
+                    unix:/tmp/pysimplebgc.sock
+    :param cmdtype: Polled command (default: CMD_REALTIME_DATA_4).
+    :param samplingperiod: Period of polling in seconds (default: 0.01).
+    :param maxsize: Maximum number of frames queued for a client
+                    (default: 100).
+    '''
+
+    def __init__(self, device, address, cmdtype='CMD_REALTIME_DATA_4',
+                 samplingperiod=0.01, maxsize=100):
+        self.device = device
+        self.codec = device.codecs[cmdtype]
+        self.samplingperiod = samplingperiod
+        self.maxsize = maxsize
+        self.clients = set()
+        self.clientslock = threading.Lock()
+        self.latest = None
+        self.polls = 0
+        self.errors = 0
+        self._stopping = threading.Event()
+        self.poller = None
+        # response ids of the commands forwarded to the board
+        self.bodysizes = dict((codec.id, codec.respbodysize)
+                              for codec in device.codecs.values())
+        self.bodysizes[device.CMD_REALTIME_DATA_CUSTOM] = 0
+        args = address.split(':', 1)
+        if args[0] == 'unix':
+            if os.path.exists(args[1]):
+                os.unlink(args[1])
+            self.server = ThreadingUnixServer(args[1], ClientHandler)
+        elif args[0] == 'tcp':
+            host, port = args[1].rsplit(':', 1)
+            self.server = ThreadingTCPServer((host, int(port)), ClientHandler)
+        else:
+            raise ValueError('Bad listening address specified')
+        self.server.owner = self
+
+    @property
+    def address(self):
+        '''Address the server is listening on.'''
+        return self.server.server_address
+
+    def serve_forever(self):
+        '''Starts the poller and serves the clients until `shutdown`.'''
+        LOGGER.info("serve : %s", self.address)
+        self._stopping.clear()
+        self.poller = threading.Thread(target=self._poll,
+                                       name='pysimplebgc-poller')
+        self.poller.daemon = True
+        self.poller.start()
+        try:
+            self.server.serve_forever()
+        finally:
+            self._stopping.set()
+            self.poller.join()
+            self.server.server_close()
+            if isinstance(self.server, ThreadingUnixServer):
+                os.unlink(self.address)
+
+    def shutdown(self):
+        '''Stops `serve_forever`, from another thread.'''
+        self.server.shutdown()
+
+    def respond(self, client, frame):
+        '''Returns the response frame to a command frame of a client.'''
+        device = self.device
+        if frame.cmdid == device.CMD_DATA_STREAM_INTERVAL:
+            if len(frame.body) == STREAMCMD.size:
+                cmdid, interval = STREAMCMD.unpack(frame.body)[:2]
+                if cmdid == self.codec.id:
+                    client.interval = interval / 1000
+                    client.pushnext = time.monotonic()
+                    LOGGER.info("Client subscribe : %d ms", interval)
+                    return pack_frame(device.CMD_CONFIRM,
+                                      bytes(bytearray([frame.cmdid])))
+        elif (frame.cmdid == self.codec.id and not frame.body and
+                self.latest is not None):
+            return self.latest
+        elif frame.cmdid in self.bodysizes:
+            try:
+                return self.request(frame.cmdid, frame.body)
+            except Exception as e:
+                LOGGER.error("Forward command: BAD (%s)", e)
+        LOGGER.info("Refuse command : %s", frame.cmdid)
+        return pack_frame(device.CMD_ERROR, bytes(bytearray([frame.cmdid])))
+
+    def request(self, cmdid, cmddata=b''):
+        '''Sends a command to the board and returns its response frame.'''
+        device = self.device
+        with device.lock:
+            frame = device.recovery.call(device, device._request,
+                                         pack_frame(cmdid, cmddata), cmdid,
+                                         self.bodysizes[cmdid])
+            # the body is a view of the parser buffer, reused by the next request
+            return pack_frame(frame.cmdid, frame.body)
+
+    def stats(self):
+        '''Returns the polls, errors, clients and dropped frames counts.'''
+        with self.clientslock:
+            clients = list(self.clients)
+        return {'polls': self.polls, 'errors': self.errors,
+                'clients': len(clients),
+                'dropped': sum(client.dropped for client in clients)}
+
+    def _attach(self, client):
+        LOGGER.info("Client connect : %s", client.client_address)
+        with self.clientslock:
+            self.clients.add(client)
+
+    def _detach(self, client):
+        LOGGER.info("Client disconnect : %s", client.client_address)
+        with self.clientslock:
+            self.clients.discard(client)
+
+    def _poll(self):
+        scheduler = Scheduler(self.samplingperiod)
+        while not self._stopping.is_set():
+            scheduler.wait()
+            try:
+                self.latest = self.request(self.codec.id)
+            except Exception as e:
+                LOGGER.error("Poll board: BAD (%s)", e)
+                # the clients requests are forwarded until the next poll
+                self.latest = None
+                self.errors += 1
+                continue
+            self.polls += 1
+            now = time.monotonic()
+            with self.clientslock:
+                clients = list(self.clients)
+            for client in clients:
+                client.push(self.latest, now)
+        LOGGER.info("poll scheduler: %s", scheduler.stats())
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.stages
+    ------------------
+
+    Output stages of a multi-rate collection : the records acquired once
+    are decimated or aggregated at several storing periods, each stage
+    writing to its own output, E.g. a raw log at 100 Hz and a summary at
+    1 Hz from the same acquisition.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import time
+from datetime import datetime
+
+from .aggregate import accumulator, period_capacity
+from .recording import BinaryWriter
+from .writer import writer
+
+
+class Stage(object):
+    '''One output of a multi-rate collection, see
+    `SimpleBGC32.setmultiratecmd`.
+
+    :param output: File where the stage is written.
+    :param storingperiod: Period of storing, 10ms (default: 10).
+    :param statistics: Statistics stored for each field, 'mean', 'min',
+                       'max', 'stddev', 'rms' and 'count', or 'raw' to store
+                       the last sample of each period (default: mean).
+    :param fileformat: 'csv', or 'binary' to record the samples of a raw
+                       stage (default: csv).
+    :param delim: CSV char delimiter (default: ";").
+    '''
+
+    def __init__(self, output, storingperiod=10, statistics=('mean',),
+                 fileformat='csv', delim=';'):
+        if statistics == 'raw':
+            statistics = ('raw',)
+        self.raw = 'raw' in statistics
+        if self.raw and len(statistics) > 1:
+            raise ValueError("Raw stages can not be aggregated")
+        if fileformat == 'binary' and not self.raw:
+            raise ValueError("Binary stages must be raw")
+        if storingperiod < 1:
+            raise ValueError("The storing period must be at least 10ms")
+        self.output = output
+        self.storingperiod = storingperiod
+        self.statistics = tuple(statistics)
+        self.fileformat = fileformat
+        self.delim = delim
+        self.writer = None
+
+    def start(self, codec, samplingperiod, flushinterval=1.0):
+        '''Opens the writer of the stage and writes its header.'''
+        self.codec = codec
+        self.storingnext = self.storingperiod
+        if self.fileformat == 'binary':
+            # binary data goes to the underlying buffer of text files
+            self.writer = writer([getattr(self.output, 'buffer', self.output)],
+                                 flushinterval)
+            self.recorder = BinaryWriter(self.writer, codec)
+            return
+        self.writer = writer([self.output], flushinterval)
+        if self.raw:
+            self.columns = [(codec.names[i], codec.valuefmts[i])
+                            for i in codec.valueindexes]
+        else:
+            self.summary = accumulator(codec, self.statistics,
+                                       period_capacity(self.storingperiod,
+                                                       samplingperiod))
+            self.columns = self.summary.columns
+        self.writer.write(self.delim.join(['DATETIME'] + [name for name, valuefmt
+                                                         in self.columns])
+                          + '\n')
+
+    def add(self, elapsed, record):
+        '''Adds a record, and stores the period if it is over at `elapsed`,
+        the time since the start of the collection, 10ms.'''
+        if not self.raw:
+            self.summary.add(record)
+        if (elapsed < self.storingnext):
+            return
+        if self.fileformat == 'binary':
+            self.recorder.write(time.time(), record)
+        else:
+            if self.raw:
+                values = [record[i] for i in self.codec.valueindexes]
+            else:
+                values = self.summary.values()
+                self.summary.reset()
+            data = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+            for (name, valuefmt), value in zip(self.columns, values):
+                data += (self.delim + valuefmt % (value))
+            self.writer.write(data + '\n')
+        # next period after elapsed
+        self.storingnext = ((elapsed // self.storingperiod + 1) *
+                            self.storingperiod)
+
+    def close(self):
+        '''Writes the pending data, the output is left open.'''
+        if self.writer is None:
+            return
+        writer, self.writer = self.writer, None
+        try:
+            if self.fileformat == 'binary':
+                self.recorder.flush()
+        finally:
+            writer.close()
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.stats
+    -----------------
+
+    Per command statistics of the exchanges with the board : round-trip
+    latency histograms, bytes sent and received, frame rates and errors.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import division, unicode_literals
+import time
+import threading
+from bisect import bisect_left
+
+
+class LatencyHistogram(object):
+    '''Histogram of latencies in logarithmic buckets, from 0.1 ms to 13 s :
+    each bucket counts the latencies up to its bound, twice the bound of the
+    previous bucket. The last bucket counts the longer latencies.'''
+
+    BOUNDS = tuple(0.0001 * 2 ** i for i in range(18))
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, latency):
+        '''Counts a latency in seconds.'''
+        self.counts[bisect_left(self.BOUNDS, latency)] += 1
+        self.count += 1
+        self.total += latency
+        if self.min is None or latency < self.min:
+            self.min = latency
+        if self.max is None or latency > self.max:
+            self.max = latency
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, percent):
+        '''Returns the bound of the bucket of the percentile, the maximum
+        latency for the last bucket.'''
+        if not self.count:
+            return None
+        rank = percent * self.count / 100
+        seen = 0
+        for bound, count in zip(self.BOUNDS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def buckets(self):
+        '''Returns the (bound, count) of the non-empty buckets, the bound of
+        the last bucket is None.'''
+        bounds = self.BOUNDS + (None,)
+        return [(bounds[i], count) for i, count in enumerate(self.counts)
+                if count]
+
+
+class CommandStats(object):
+    '''Counters of one command type.
+
+    :param cmdtype: Command type, 'CMD_REALTIME_DATA_4', etc...
+    '''
+
+    def __init__(self, cmdtype):
+        self.cmdtype = cmdtype
+        self.requests = 0
+        self.frames = 0
+        self.bytesout = 0
+        self.bytesin = 0
+        self.errors = {}
+        self.latency = LatencyHistogram()
+        self.first = None
+        self.last = None
+
+    def sent(self, nbytes):
+        '''Counts a command frame sent to the board.'''
+        self.requests += 1
+        self.bytesout += nbytes
+
+    def received(self, nbytes, now, latency=None):
+        '''Counts a response frame received at `now` (time.monotonic), with
+        the round-trip latency of its request if known.'''
+        self.frames += 1
+        self.bytesin += nbytes
+        if self.first is None:
+            self.first = now
+        self.last = now
+        if latency is not None:
+            self.latency.add(latency)
+
+    def failed(self, error):
+        '''Counts an error by exception class.'''
+        name = type(error).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    @property
+    def fps(self):
+        '''Frames received per second, between the first and last frames.'''
+        if self.frames < 2 or self.last == self.first:
+            return None
+        return (self.frames - 1) / (self.last - self.first)
+
+    def todict(self):
+        latency = self.latency
+        return {'requests': self.requests, 'frames': self.frames,
+                'bytesout': self.bytesout, 'bytesin': self.bytesin,
+                'fps': self.fps, 'errors': dict(self.errors),
+                'latency': {'count': latency.count, 'min': latency.min,
+                            'mean': latency.mean, 'max': latency.max,
+                            'p50': latency.percentile(50),
+                            'p90': latency.percentile(90),
+                            'p99': latency.percentile(99),
+                            'histogram': latency.buckets()}}
+
+
+class DeviceStats(object):
+    '''`CommandStats` of the commands exchanged with a device, by command
+    type, see `SimpleBGC32.stats`.'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.commands = {}
+        self.started = time.monotonic()
+
+    def command(self, cmdtype):
+        '''Returns the `CommandStats` of a command type.'''
+        stats = self.commands.get(cmdtype)
+        if stats is None:
+            with self.lock:
+                stats = self.commands.setdefault(cmdtype,
+                                                 CommandStats(cmdtype))
+        return stats
+
+    def reset(self):
+        '''Forgets all the counters.'''
+        with self.lock:
+            self.commands = {}
+            self.started = time.monotonic()
+
+    def todict(self):
+        return {'elapsed': time.monotonic() - self.started,
+                'commands': dict((cmdtype, stats.todict()) for cmdtype, stats
+                                 in list(self.commands.items()))}
+
+
+def format_stats(stats):
+    '''Returns the dict of `SimpleBGC32.stats` as text.'''
+    def ms(value):
+        return '-' if value is None else '%.3f' % (value * 1000)
+    lines = ['elapsed : %.3f s' % stats['elapsed']]
+    for cmdtype, command in sorted(stats['commands'].items()):
+        latency = command['latency']
+        lines.append('%s' % cmdtype)
+        lines.append('  requests : %d' % command['requests'])
+        lines.append('  frames : %d' % command['frames'])
+        lines.append('  bytes out : %d' % command['bytesout'])
+        lines.append('  bytes in : %d' % command['bytesin'])
+        lines.append('  frames/s : %s' % ('-' if command['fps'] is None
+                                         else '%.1f' % command['fps']))
+        lines.append('  latency ms : min %s mean %s p50 %s p90 %s p99 %s max %s'
+                     % (ms(latency['min']), ms(latency['mean']),
+                        ms(latency['p50']), ms(latency['p90']),
+                        ms(latency['p99']), ms(latency['max'])))
+        for bound, count in latency['histogram']:
+            if bound is None:
+                bound = '> %s' % ms(LatencyHistogram.BOUNDS[-1])
+            else:
+                bound = '<= %s' % ms(bound)
+            lines.append('    %s ms : %d' % (bound, count))
+        for name, count in sorted(command['errors'].items()):
+            lines.append('  %s : %d' % (name, count))
+    lines.append('resyncs : %d' % stats['resyncs'])
+    recovery = stats['recovery']
+    lines.append('retries : %d' % recovery['retries'])
+    lines.append('recovered : %d' % recovery['recovered'])
+    lines.append('failures : %d' % recovery['failures'])
+    lines.append('dropped : %d' % recovery['dropped'])
+    return '\n'.join(lines)
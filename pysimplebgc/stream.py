@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.stream
+    ------------------
+
+    Realtime data pushed by the board at a fixed interval
+    (CMD_DATA_STREAM_INTERVAL, SimpleBGC 2.6 serial protocol).
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import time
+import struct
+import threading
+
+from .logger import LOGGER
+from .codec import pack_frame
+from .exceptions import BadCmdException, BadAckException
+from .compat import Queue, Empty, Full
+
+
+STREAMCMD = struct.Struct('<BH8sB9x')
+STREAMCMDTYPES = ('CMD_REALTIME_DATA_3', 'CMD_REALTIME_DATA_4')
+
+
+def stream_codec(device, cmdtype, mask=0, fields=None):
+    '''Returns the codec of the streamed frames and the CONFIG of the
+    CMD_DATA_STREAM_INTERVAL command.'''
+    if cmdtype == 'CMD_REALTIME_DATA_CUSTOM':
+        return (device.customcodec(mask, fields),
+                struct.pack('<I4x', mask or device.custommask(fields)))
+    elif cmdtype in STREAMCMDTYPES:
+        return device.codecs[cmdtype], b''
+    LOGGER.info("Check STREAM: BAD (%s)", cmdtype)
+    raise BadCmdException()
+
+
+def stream_frame(device, codec, interval, config):
+    '''Returns the CMD_DATA_STREAM_INTERVAL frame, interval 0 unsubscribes.'''
+    return pack_frame(device.CMD_DATA_STREAM_INTERVAL,
+                      STREAMCMD.pack(codec.id, interval, config, 0))
+
+
+def check_confirm(device, frame):
+    '''Raises `BadAckException` if the frame does not confirm the
+    CMD_DATA_STREAM_INTERVAL command.'''
+    if bytearray(frame.body[:1]) != bytearray(
+            [device.CMD_DATA_STREAM_INTERVAL]):
+        LOGGER.info("Check CONFIRM: BAD (%r)", bytes(frame.body))
+        raise BadAckException()
+    LOGGER.info("Check CONFIRM: OK (%s)", frame.cmdid)
+
+
+class DataStream(object):
+    '''Subscribes to the realtime data pushed by the board every `interval`
+    ms. A background thread reads the link and puts `(timestamp, record)`
+    tuples in a queue, the oldest ones are dropped when the queue is full.
+    A read error stops the thread, it is raised by `get` and the iterator
+    once the queued records are returned.
+
+    The device must not be used for other commands while the stream runs.
+
+    :param device: A `SimpleBGC32` device.
+    :param cmdtype: 'CMD_REALTIME_DATA_3', 'CMD_REALTIME_DATA_4' or
+                    'CMD_REALTIME_DATA_CUSTOM'.
+    :param interval: Interval between two frames, ms (default: 10).
+    :param mask: DATA_MASK of 'CMD_REALTIME_DATA_CUSTOM'.
+    :param fields: Fields of 'CMD_REALTIME_DATA_CUSTOM' to decode, the
+                   DATA_MASK is computed from the fields if `mask` is 0.
+    :param maxsize: Maximum number of records in the queue (default: 1000).
+    '''
+    def __init__(self, device, cmdtype='CMD_REALTIME_DATA_4', interval=10,
+                 mask=0, fields=None, maxsize=1000):
+        self.codec, self.config = stream_codec(device, cmdtype, mask, fields)
+        self.device = device
+        self.interval = interval
+        self.queue = Queue(maxsize)
+        self.dropped = 0
+        self.thread = None
+        self.error = None
+        self._stopping = False
+
+    def start(self):
+        '''Subscribes to the stream and starts the reader thread.'''
+        if self.thread is not None:
+            return
+        self._subscribe(self.interval)
+        self._stopping = False
+        self.error = None
+        self.thread = threading.Thread(target=self._run,
+                                       name='pysimplebgc-stream')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        '''Stops the reader thread and unsubscribes from the stream.'''
+        if self.thread is None:
+            return
+        self._stopping = True
+        self.thread.join()
+        self.thread = None
+        try:
+            self._subscribe(0)
+        except Exception as e:
+            LOGGER.error("Unsubscribe stream: BAD (%s)", e)
+        self.device.parser.clear()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def get(self, timeout=None):
+        '''Returns the next `(timestamp, record)` tuple, raises `Empty` if
+        none is received before `timeout` seconds, and the read error of the
+        reader thread if it stopped on one.'''
+        if self.error is not None and self.queue.empty():
+            raise self.error
+        item = self.queue.get(timeout=timeout)
+        if item is None:
+            # put by the reader thread after its error
+            raise self.error
+        return item
+
+    def __iter__(self):
+        while True:
+            try:
+                yield self.get(timeout=0.1)
+            except Empty:
+                if not self.running and self.queue.empty():
+                    return
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _subscribe(self, interval):
+        device = self.device
+        LOGGER.info("try subscribe stream : %s %d ms", self.codec.cmdtype,
+                    interval)
+        device.send(stream_frame(device, self.codec, interval, self.config))
+        check_confirm(device, device._read_frame(device.CMD_CONFIRM, 1))
+
+    def _run(self):
+        device = self.device
+        codec = self.codec
+        parser = device.parser
+        framesize = 1 + device.HEADER_SIZE + codec.respbodysize
+        stats = device.statistics.command(codec.cmdtype)
+        while not self._stopping:
+            try:
+                if not parser.fill(device.readinto, framesize):
+                    continue
+            except Exception as e:
+                LOGGER.error("Read stream: BAD (%s)", e)
+                self.error = e
+                # wakes up a blocked get
+                self._put(None)
+                break
+            timestamp = time.time()
+            for frame in parser:
+                if (frame.cmdid == codec.id and
+                        len(frame.body) == codec.respbodysize):
+                    self._put((timestamp, codec.decode(frame.body)))
+                    stats.received(framesize, time.monotonic())
+                else:
+                    LOGGER.info("Skip frame: %s", frame.cmdid)
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except Full:
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except Empty:
+                pass
+            self.queue.put_nowait(item)
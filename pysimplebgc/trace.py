@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.trace
+    -----------------
+
+    Binary trace and capture of the raw data sent to and received from the
+    board.
+
+    A trace file starts with the `MAGIC` bytes, followed by one record per
+    chunk : the host timestamp (8 bytes float, seconds since epoch), the
+    direction (1 byte, `TX` or `RX`), the size (4 bytes unsigned) and the
+    raw bytes, little-endian.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import io
+import time
+import struct
+import threading
+from collections import deque, namedtuple
+
+from .utils import is_text, bytes_to_hex
+
+
+MAGIC = b'SBGCTRC1'
+CHUNK = struct.Struct('<dBI')
+TX = 0
+RX = 1
+
+Chunk = namedtuple('Chunk', 'timestamp direction data')
+
+
+class ProtocolTrace(object):
+    '''Keeps the last `maxsize` chunks of raw data written to and read from
+    the link in a ring buffer. It costs nothing until it is enabled with
+    `SimpleBGC32.start_trace`.
+
+    :param maxsize: Maximum number of chunks kept (default: 10000).
+    '''
+
+    def __init__(self, maxsize=10000):
+        self.chunks = deque(maxlen=maxsize)
+
+    def tx(self, data):
+        '''Records data written to the link.'''
+        if is_text(data):
+            data = data.encode('utf-8')
+        self.chunks.append(Chunk(time.time(), TX, bytes(data)))
+
+    def rx(self, data):
+        '''Records data read from the link.'''
+        self.chunks.append(Chunk(time.time(), RX, bytes(data)))
+
+    def reader(self, readinto):
+        '''Returns a `readinto` function recording the data read by
+        `readinto`, see `link_readinto`.'''
+        def traced(view):
+            count = readinto(view)
+            if count:
+                self.rx(view[:count])
+            return count
+        return traced
+
+    def clear(self):
+        self.chunks.clear()
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def __iter__(self):
+        return iter(list(self.chunks))
+
+    def dump(self, filename):
+        '''Writes the recorded chunks to a trace file.'''
+        with io.open(filename, 'wb') as fd:
+            fd.write(MAGIC)
+            for timestamp, direction, data in self:
+                fd.write(CHUNK.pack(timestamp, direction, len(data)))
+                fd.write(data)
+
+    def format(self):
+        '''Returns the recorded chunks as text, one line per chunk.'''
+        return '\n'.join('%.6f %s %s' % (timestamp, 'TX' if direction == TX
+                                         else 'RX', bytes_to_hex(data))
+                         for timestamp, direction, data in self)
+
+
+class Capture(object):
+    '''Writes every chunk of raw data sent to and received from the board
+    in a capture file, with its host timestamp. It has the interface of
+    `ProtocolTrace`, see `SimpleBGC32.start_capture`.
+
+    :param filename: Path of the capture file.
+    '''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.file = io.open(filename, 'wb')
+        self.file.write(MAGIC)
+        self.chunks = 0
+
+    def tx(self, data):
+        '''Records data written to the link.'''
+        if is_text(data):
+            data = data.encode('utf-8')
+        self._write(TX, data)
+
+    def rx(self, data):
+        '''Records data read from the link.'''
+        self._write(RX, data)
+
+    def reader(self, readinto):
+        '''Returns a `readinto` function recording the data read by
+        `readinto`, see `link_readinto`.'''
+        def captured(view):
+            count = readinto(view)
+            if count:
+                self.rx(view[:count])
+            return count
+        return captured
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+    def __len__(self):
+        return self.chunks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _write(self, direction, data):
+        with self.lock:
+            self.file.write(CHUNK.pack(time.time(), direction, len(data)))
+            self.file.write(data)
+            self.chunks += 1
+
+
+def read_trace(filename):
+    '''Yields the `Chunk` tuples of a trace file.'''
+    with io.open(filename, 'rb') as fd:
+        if fd.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is not a SimpleBGC trace" % filename)
+        while True:
+            header = fd.read(CHUNK.size)
+            if len(header) < CHUNK.size:
+                # an interrupted trace may end with a partial chunk
+                return
+            timestamp, direction, size = CHUNK.unpack(header)
+            data = fd.read(size)
+            if len(data) < size:
+                return
+            yield Chunk(timestamp, direction, data)
@@ -12,6 +12,7 @@ import sys
 import time
 import csv
 import binascii
+from types import MappingProxyType
 
 from .compat import to_char, str, bytes, StringIO, is_py3, OrderedDict
 
@@ -26,6 +27,20 @@ def is_bytes(data):
     return isinstance(data, bytes)
 
 
+def freeze(value):
+    '''Returns a read-only copy of nested dicts and lists.
+    E.g.
+    >>> freeze({'respfields': [{'name': 'ANGLE_ROLL'}]})['respfields'][0]
+    mappingproxy({'name': 'ANGLE_ROLL'})
+    '''
+    if isinstance(value, dict):
+        return MappingProxyType(dict((key, freeze(item))
+                                     for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
 class cached_property(object):
     """A decorator that converts a function into a lazy property.  The
     function wrapped is called the first time to retrieve the result
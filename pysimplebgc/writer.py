@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+'''
+    pysimplebgc.writer
+    ------------------
+
+    Output written by a background thread, so that disk or terminal stalls
+    do not delay the acquisition.
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import time
+import threading
+
+from .logger import LOGGER
+from .compat import Queue, Empty
+
+
+# queued to ask the writer thread to write the pending data now
+FLUSH = object()
+
+
+class Writer(object):
+    '''File-like object writing the data on several outputs.
+
+    :param outputs: The files where the data is written.
+    '''
+
+    def __init__(self, outputs):
+        self.outputs = list(outputs)
+
+    def write(self, data):
+        for output in self.outputs:
+            output.write(data)
+
+    def flush(self):
+        for output in self.outputs:
+            output.flush()
+
+    def close(self):
+        '''Flushes the outputs, which are left open.'''
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ThreadedWriter(Writer):
+    '''Writer queueing the written data for a writer thread which coalesces
+    it into large writes on the outputs.
+
+    :param outputs: The files where the data is written.
+    :param maxsize: Maximum number of pending writes, `write` blocks when
+                    the queue is full (default: 10000).
+    :param flushinterval: Maximum time in seconds before pending data is
+                          written and flushed (default: 1).
+    '''
+
+    def __init__(self, outputs, maxsize=10000, flushinterval=1.0):
+        Writer.__init__(self, outputs)
+        self.flushinterval = flushinterval
+        self.queue = Queue(maxsize)
+        self.thread = threading.Thread(target=self._run,
+                                       name='pysimplebgc-writer')
+        self.thread.daemon = True
+        self.error = None
+        self.thread.start()
+
+    def write(self, data):
+        '''Queues data for the writer thread.'''
+        if self.error is not None:
+            raise self.error
+        self.queue.put(data)
+
+    def flush(self):
+        '''Waits until the queued data is written and flushed, raises the
+        last write error of the writer thread.'''
+        if self.thread is not None:
+            self.queue.put(FLUSH)
+            self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        '''Writes the queued data and stops the writer thread, raises the
+        last write error of the writer thread, e.g. a full disk.'''
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+            if self.error is not None:
+                raise self.error
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            chunks = []
+            count = 0
+            deadline = time.monotonic() + self.flushinterval
+            # coalesce the queued data until the flush interval is elapsed
+            while len(chunks) < self.queue.maxsize:
+                try:
+                    data = self.queue.get(
+                        timeout=max(deadline - time.monotonic(), 0))
+                except Empty:
+                    break
+                count += 1
+                if data is None:
+                    stopping = True
+                    break
+                if data is FLUSH:
+                    break
+                chunks.append(data)
+            if chunks:
+                self._write(chunks[0][:0].join(chunks))
+            for i in range(count):
+                self.queue.task_done()
+
+    def _write(self, data):
+        for output in self.outputs:
+            try:
+                output.write(data)
+                output.flush()
+            except Exception as e:
+                LOGGER.error("Write output: BAD (%s)", e)
+                self.error = e
+
+
+def close_all(writers):
+    '''Closes all the writers, then raises the first error.'''
+    error = None
+    for writer in writers:
+        try:
+            writer.close()
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        raise error
+
+
+def writer(outputs, flushinterval=1.0):
+    '''Returns a `ThreadedWriter` of the outputs, a `Writer` if
+    `flushinterval` is 0.'''
+    if flushinterval:
+        return ThreadedWriter(outputs, flushinterval=flushinterval)
+    return Writer(outputs)
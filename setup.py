@@ -61,6 +61,10 @@ setup(
     packages=find_packages(),
     zip_safe=False,
     install_requires=REQUIREMENTS,
+    extras_require={
+        'aio': ['pyserial-asyncio'],
+        'numpy': ['numpy'],
+    },
     entry_points={
         'console_scripts': [
             'pysimplebgc = pysimplebgc.__main__:main'
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+'''
+    Tests of pysimplebgc.aggregate
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import math
+
+import pytest
+
+from pysimplebgc.aggregate import (Accumulator, NumpyAccumulator, STATISTICS,
+                                   accumulator, period_capacity)
+from pysimplebgc.device import SimpleBGC32
+from pysimplebgc.emulator import LoopbackLink
+
+
+@pytest.fixture
+def records():
+    device = SimpleBGC32(LoopbackLink())
+    codec = device.codecs['CMD_REALTIME_DATA_4']
+    return codec, [device.cmd('CMD_REALTIME_DATA_4') for i in range(25)]
+
+
+def test_statistics(records):
+    codec, records = records
+    summary = Accumulator(codec, STATISTICS)
+    for record in records:
+        summary.add(record)
+    values = dict(zip([name for name, valuefmt in summary.columns],
+                      summary.values()))
+    rolls = [record.ANGLE_ROLL for record in records]
+    mean = sum(rolls) / len(rolls)
+    assert values['ANGLE_ROLL'] == pytest.approx(mean)
+    assert values['ANGLE_ROLL_MIN'] == min(rolls)
+    assert values['ANGLE_ROLL_MAX'] == max(rolls)
+    assert values['ANGLE_ROLL_RMS'] == pytest.approx(
+        math.sqrt(sum(roll * roll for roll in rolls) / len(rolls)))
+    assert values['SAMPLES'] == len(records)
+
+
+@pytest.mark.parametrize('statistics', [('mean',), STATISTICS,
+                                        ('min', 'max', 'count')])
+def test_numpy_agrees(records, statistics):
+    pytest.importorskip('numpy')
+    codec, records = records
+    # the capacity is exceeded, the array grows
+    summaries = [Accumulator(codec, statistics),
+                 NumpyAccumulator(codec, statistics, capacity=10)]
+    for start in (0, 10):
+        for summary in summaries:
+            summary.reset()
+            for record in records[start:]:
+                summary.add(record)
+        python, vectorized = [summary.values() for summary in summaries]
+        assert summaries[0].columns == summaries[1].columns
+        assert vectorized == pytest.approx(python, rel=1e-9, abs=1e-6)
+
+
+def test_empty_period(records):
+    codec, records = records
+    assert Accumulator(codec, ('count',)).values()[-1] == 0
+
+
+def test_unknown_statistic(records):
+    codec, records = records
+    with pytest.raises(ValueError):
+        Accumulator(codec, ('median',))
+
+
+def test_capacity(records):
+    codec, records = records
+    assert period_capacity(10, 0) is None
+    assert period_capacity(10, 3) == 4
+    assert period_capacity(1, 10) == 1
+    assert type(accumulator(codec, capacity=None)) is Accumulator
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+'''
+    Tests of pysimplebgc.benchmark
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+
+from pysimplebgc.benchmark import Result, compare
+
+
+def results(**values):
+    return dict((name.replace('_', '.', 1),
+                 Result(name.replace('_', '.', 1), value, 'ops/s', 'higher'))
+                for name, value in values.items())
+
+
+def test_compare_thresholds():
+    baseline = results(decode_x=100.0, roundtrip_x=100.0, write_x=100.0)
+    current = results(decode_x=80.0, roundtrip_x=80.0, write_x=60.0,
+                      parser_x=1.0)
+    status = dict((row[0], row[4]) for row in compare(current, baseline))
+    assert status == {'decode.x': 'slower', 'roundtrip.x': 'same',
+                      'write.x': 'slower', 'parser.x': 'new'}
+    # a wider global threshold applies to every benchmark
+    status = dict((row[0], row[4])
+                  for row in compare(current, baseline, threshold=0.5))
+    assert status['write.x'] == 'same'
+
+
+def test_lower_is_better():
+    baseline = {'collect.jitter_mean': Result('collect.jitter_mean', 1.0,
+                                              'ms', 'lower')}
+    current = {'collect.jitter_mean': Result('collect.jitter_mean', 2.5,
+                                             'ms', 'lower')}
+    [(name, base, value, change, status)] = compare(current, baseline)
+    assert change == -1.5
+    assert status == 'slower'
+
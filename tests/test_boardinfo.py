@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+'''
+    Tests of pysimplebgc.boardinfo
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+
+import pytest
+
+from pysimplebgc.device import SimpleBGC32
+from pysimplebgc.emulator import LoopbackLink
+from pysimplebgc.boardinfo import BoardInfoCache
+
+URL = 'tcp:gimbal:23'
+
+
+@pytest.fixture
+def filename(tmpdir):
+    return str(tmpdir.join('boards.json'))
+
+
+def connect(filename, index, firmware=2600):
+    '''Returns a device of the board `index` on URL, and its link.'''
+    link = LoopbackLink(index=index)
+    link.board.constants['FIRMWARE_VER'] = firmware
+    device = SimpleBGC32(link, BoardInfoCache(filename))
+    device.url = URL
+    return device
+
+
+def requests(device, cmdtype):
+    return device.statistics.command(cmdtype).requests
+
+
+def test_cache_hit(filename):
+    device = connect(filename, 1)
+    assert device.boardinfo3.deviceID == b'EMU000001'
+    device = connect(filename, 1)
+    assert device.boardinfo3.deviceID == b'EMU000001'
+    assert requests(device, 'CMD_BOARD_INFO') == 1
+    assert requests(device, 'CMD_BOARD_INFO_3') == 0
+
+
+def test_swap_other_firmware(filename):
+    assert connect(filename, 1).boardinfo3.deviceID == b'EMU000001'
+    device = connect(filename, 2, firmware=2610)
+    assert device.boardinfo3.deviceID == b'EMU000002'
+    assert requests(device, 'CMD_BOARD_INFO_3') == 1
+    # the swapped board replaces the cached one
+    assert connect(filename, 2, firmware=2610).boardinfo3.deviceID == (
+        b'EMU000002')
+
+
+def test_swap_same_firmware(filename):
+    assert connect(filename, 1).boardinfo3.deviceID == b'EMU000001'
+    # not detected : the documented limit of the cache
+    device = connect(filename, 2)
+    assert device.boardinfo3.deviceID == b'EMU000001'
+    # the --refresh option
+    device = connect(filename, 2)
+    device.invalidate_boardinfo()
+    assert device.boardinfo3.deviceID == b'EMU000002'
+    assert connect(filename, 2).boardinfo3.deviceID == b'EMU000002'
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+'''
+    Tests of pysimplebgc.bulk
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import time
+
+import pytest
+
+from pysimplebgc.codec import pack_frame
+from pysimplebgc.device import SimpleBGC32
+from pysimplebgc.emulator import LoopbackLink
+from pysimplebgc.parser import HEADER_SIZE
+
+numpy = pytest.importorskip('numpy')
+bulk = pytest.importorskip('pysimplebgc.bulk')
+
+
+@pytest.fixture
+def frames():
+    device = SimpleBGC32(LoopbackLink())
+    codec = device.codecs['CMD_REALTIME_DATA_4']
+    board = device.link.board
+    bodies = [board.body(codec, time.monotonic() + i) for i in range(20)]
+    return codec, bodies
+
+
+def check(records, codec, bodies):
+    assert len(records) == len(bodies)
+    for record, body in zip(records, bodies):
+        expected = codec.decode(body)
+        # the duplicate names of the command table are renamed as in records,
+        # NumPy strips the trailing nulls of the text fields
+        for name, value in zip(expected._fields, expected):
+            if records.dtype[name].kind == 'S':
+                value = value.rstrip(b'\x00')
+            assert record[name] == value
+
+
+def test_back_to_back(frames):
+    codec, bodies = frames
+    data = b''.join(pack_frame(codec.id, body) for body in bodies)
+    records = bulk.decode_frames(data, codec)
+    check(records, codec, bodies)
+    # the records are a view of the buffer
+    assert not records.flags.owndata
+
+
+def test_corrupted(frames):
+    codec, bodies = frames
+    data = bytearray(b'garbage')
+    expected = []
+    for i, body in enumerate(bodies):
+        frame = bytearray(pack_frame(codec.id, body))
+        if i % 4 == 1:
+            frame[-1] ^= 0xFF
+        else:
+            expected.append(body)
+        data += frame + bytearray(pack_frame(67, b'\x55'))
+    offsets = bulk.find_frames(bytes(data), codec)
+    assert offsets.dtype == numpy.intp
+    check(bulk.decode_frames(bytes(data), codec, offsets), codec, expected)
+
+
+def test_frame_dtype(frames):
+    codec, bodies = frames
+    data = pack_frame(codec.id, bodies[0])
+    frame = numpy.frombuffer(data, dtype=bulk.frame_dtype(codec))[0]
+    assert frame['CMDID'] == codec.id
+    assert frame['SIZE'] == codec.respbodysize
+    assert frame['DATACRC'] == bytearray(data)[-1]
+    assert len(data) == HEADER_SIZE + codec.respbodysize + 1
+
+
+def test_to_columns(frames):
+    codec, bodies = frames
+    data = b''.join(pack_frame(codec.id, body) for body in bodies)
+    columns = bulk.to_columns(bulk.decode_frames(data, codec))
+    assert columns['ANGLE_ROLL'].flags.c_contiguous
+    assert (list(columns['ANGLE_ROLL']) ==
+            [codec.decode(body).ANGLE_ROLL for body in bodies])
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+'''
+    Tests of pysimplebgc.checksum
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import random
+
+import pytest
+
+from pysimplebgc import checksum
+from pysimplebgc.checksum import checksum8, scan_frames
+from pysimplebgc.codec import pack_frame
+from pysimplebgc.device import SimpleBGC32
+from pysimplebgc.emulator import LoopbackLink
+from pysimplebgc.exceptions import BadCmdException, BadCRCException
+from pysimplebgc.parser import FrameParser, HEADER_SIZE
+
+
+BODYSIZES = {88: 12, 67: 1}
+
+
+def corrupted_buffer(count=200, seed=1):
+    '''Returns a buffer of frames mixed with garbage, truncated frames and
+    frames with a bad checksum or size, and the frames expected in it.'''
+    rand = random.Random(seed)
+    data = bytearray()
+    expected = []
+    for i in range(count):
+        cmdid = rand.choice([88, 67])
+        body = bytes(bytearray(rand.randrange(256)
+                               for j in range(BODYSIZES[cmdid])))
+        frame = bytearray(pack_frame(cmdid, body))
+        fault = rand.randrange(6)
+        if fault == 1:
+            frame[-1] ^= 0x01
+        elif fault == 2:
+            frame[3] ^= 0x10
+        elif fault == 3:
+            del frame[rand.randrange(1, len(frame))]
+        elif fault == 4:
+            data += b'>' + bytearray(rand.randrange(256) for j in range(3))
+        if fault in (0, 4, 5):
+            expected.append((len(data), cmdid, body))
+        data += frame
+    return bytes(data), expected
+
+
+def frames(result):
+    return list(zip(result.offsets, result.cmdids, result.sizes))
+
+
+def test_checksum8():
+    assert checksum8(b'\x19\x00') == 25
+    assert checksum8(b'\xff\x02') == 1
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_scans_agree(seed):
+    pytest.importorskip('numpy')
+    data, expected = corrupted_buffer(seed=seed)
+    python = checksum._scan(data, BODYSIZES)
+    vectorized = checksum._scan_numpy(data, BODYSIZES)
+    assert frames(python) == frames(vectorized)
+    for values in python + vectorized:
+        assert all(type(value) is int for value in values)
+    # the valid frames are all found, the accidental frames of the garbage
+    # being checked by the comparison with the parser and the device
+    found = set(python.offsets)
+    assert set(offset for offset, cmdid, body in expected) <= found
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_scan_agrees_with_parser(seed):
+    data, expected = corrupted_buffer(seed=seed)
+    result = scan_frames(data, BODYSIZES)
+    parser = FrameParser(BODYSIZES)
+    parser.feed(data)
+    assert ([(cmdid, bytes(body)) for cmdid, body in parser] ==
+            [(cmdid, data[offset + HEADER_SIZE:offset + HEADER_SIZE + size])
+             for offset, cmdid, size in frames(result)])
+
+
+def legacy_check(device, data, start):
+    '''Returns True if the legacy checks of the device accept the frame
+    at start.'''
+    cmdid, size = bytearray(data[start + 1:start + 3].ljust(2, b'\x00'))
+    if BODYSIZES.get(cmdid, size) != size:
+        return False
+    try:
+        device._unpack_response(cmdid,
+                                data[start:start + HEADER_SIZE + size + 1])
+    except (BadCmdException, BadCRCException):
+        return False
+    return True
+
+
+def test_scan_agrees_with_device():
+    device = SimpleBGC32(LoopbackLink())
+    data, expected = corrupted_buffer()
+    result = scan_frames(data, BODYSIZES)
+    for offset, cmdid, body in expected:
+        frame = data[offset:offset + HEADER_SIZE + len(body) + 1]
+        assert bytes(device._unpack_response(cmdid, frame)) == body
+        assert device._checksum8bytes(body) == frame[-1]
+    # every start byte outside the found frames is rejected by the device
+    found = set(result.offsets)
+    position = 0
+    start = data.find(b'>')
+    while start >= 0:
+        if start >= position:
+            assert legacy_check(device, data, start) == (start in found)
+            if start in found:
+                position = start + HEADER_SIZE + data[start + 2] + 1
+        start = data.find(b'>', start + 1)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+'''
+    Tests of pysimplebgc.collector
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import io
+
+from pysimplebgc.collector import MultiCollector
+from pysimplebgc.device import SimpleBGC32
+from pysimplebgc.emulator import LoopbackLink
+
+
+def test_merged():
+    devices = [SimpleBGC32(LoopbackLink(index=i)) for i in (1, 2)]
+    output = io.StringIO()
+    MultiCollector(devices, ['a', 'b']).collect('CMD_REALTIME_DATA_4',
+                                                output, measuresnb=5,
+                                                storingperiod=1,
+                                                samplingperiod=1)
+    lines = output.getvalue().splitlines()
+    assert lines[0].startswith('DATETIME;BOARD;')
+    assert sorted(line.split(';')[1] for line in lines[1:]) == (
+        ['a'] * 5 + ['b'] * 5)
+
+
+def test_outputs():
+    devices = [SimpleBGC32(LoopbackLink(index=i)) for i in (1, 2)]
+    outputs = [io.StringIO(), io.StringIO()]
+    MultiCollector(devices).collect('CMD_REALTIME_DATA_4', outputs,
+                                    measuresnb=3, storingperiod=1,
+                                    samplingperiod=1)
+    for output in outputs:
+        lines = output.getvalue().splitlines()
+        assert lines[0].startswith('DATETIME;')
+        assert len(lines) == 4
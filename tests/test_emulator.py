@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+'''
+    Tests of pysimplebgc.emulator
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import time
+
+from pysimplebgc.device import SimpleBGC32
+from pysimplebgc.emulator import LoopbackLink, Board
+
+
+def test_static_boardinfo():
+    device = SimpleBGC32(LoopbackLink())
+    boardinfo = device.cmd('CMD_BOARD_INFO')
+    boardinfo3 = device.cmd('CMD_BOARD_INFO_3')
+    time.sleep(0.05)
+    assert device.cmd('CMD_BOARD_INFO') == boardinfo
+    assert device.cmd('CMD_BOARD_INFO_3') == boardinfo3
+    assert boardinfo.FIRMWARE_VER == 2600
+    assert boardinfo3.deviceID == b'EMU000001'
+
+
+def test_realtime_values_change():
+    board = Board()
+    codec = SimpleBGC32.CODECS['CMD_REALTIME_DATA_4']
+    now = time.monotonic()
+    assert board.body(codec, now) != board.body(codec, now + 0.5)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+'''
+    Tests of pysimplebgc.parser
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+
+from pysimplebgc.parser import FrameParser
+
+
+def frame(cmdid, body):
+    body = bytes(bytearray(body))
+    size = len(body)
+    return (bytes(bytearray([ord('>'), cmdid, size, (cmdid + size) & 0xFF]))
+            + body + bytes(bytearray([sum(bytearray(body)) & 0xFF])))
+
+
+def frames(parser):
+    return [(cmdid, bytes(body)) for cmdid, body in parser]
+
+
+def test_frames():
+    parser = FrameParser()
+    parser.feed(frame(67, [85]) + frame(88, [1, 2, 3]))
+    assert frames(parser) == [(67, b'\x55'), (88, b'\x01\x02\x03')]
+    assert parser.pending == 0
+    assert parser.resyncs == 0
+    assert parser.skipped == 0
+
+
+def test_resync_after_garbage():
+    parser = FrameParser()
+    parser.feed(b'\x00\x01garbage' + frame(67, [85]))
+    assert frames(parser) == [(67, b'\x55')]
+    assert parser.skipped == 9
+    # garbage is skipped without resync, there is no '>' in it
+    assert parser.resyncs == 0
+
+
+def test_split_header():
+    data = frame(88, [1, 2, 3])
+    parser = FrameParser()
+    for i in range(len(data) - 1):
+        parser.feed(data[i:i + 1])
+        assert parser.next_frame() is None
+    parser.feed(data[-1:])
+    assert frames(parser) == [(88, b'\x01\x02\x03')]
+    parser = FrameParser()
+    parser.feed(data[:2])
+    assert parser.next_frame() is None
+    parser.feed(data[2:])
+    assert frames(parser) == [(88, b'\x01\x02\x03')]
+
+
+def test_bad_header_checksum():
+    bad = bytearray(frame(88, [1, 2, 3]))
+    bad[3] ^= 0xFF
+    parser = FrameParser()
+    parser.feed(bytes(bad) + frame(67, [85]))
+    assert frames(parser) == [(67, b'\x55')]
+    assert parser.resyncs == 1
+    assert parser.badframes == 0
+    assert parser.skipped == len(bad)
+
+
+def test_bad_body_checksum():
+    bad = bytearray(frame(88, [1, 2, 3]))
+    bad[-1] ^= 0xFF
+    parser = FrameParser()
+    parser.feed(bytes(bad) + frame(67, [85]))
+    assert frames(parser) == [(67, b'\x55')]
+    assert parser.resyncs == 1
+    assert parser.badframes == 1
+
+
+def test_unexpected_body_size():
+    parser = FrameParser({88: 2})
+    parser.feed(frame(88, [1, 2, 3]) + frame(88, [4, 5]))
+    assert frames(parser) == [(88, b'\x04\x05')]
+    assert parser.resyncs == 1
+    assert parser.badframes == 0
+
+
+def test_body_split_across_fill():
+    data = frame(88, list(range(40)))
+    chunks = [data[:10], data[10:25], data[25:]]
+
+    def readinto(view):
+        chunk = chunks.pop(0)
+        view[:len(chunk)] = chunk
+        return len(chunk)
+
+    parser = FrameParser(capacity=16)
+    for i in range(3):
+        assert parser.fill(readinto, 32) > 0
+        if i < 2:
+            assert parser.next_frame() is None
+    assert frames(parser) == [(88, bytes(bytearray(range(40))))]
+    assert parser.pending == 0
+
+
+def test_body_lifetime():
+    parser = FrameParser()
+    parser.feed(frame(88, [1, 2, 3]))
+    body = parser.next_frame().body
+    copy = bytes(body)
+    # the buffer is empty, the next frame overwrites the previous one
+    parser.feed(frame(88, [4, 5, 6]))
+    assert bytes(body) != copy
+    assert copy == b'\x01\x02\x03'
+    assert frames(parser) == [(88, b'\x04\x05\x06')]
+
+
+def test_text_data():
+    parser = FrameParser()
+    parser.feed(frame(67, [85]).decode('utf-8'))
+    assert frames(parser) == [(67, b'\x55')]
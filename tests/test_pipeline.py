@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+'''
+    Tests of pysimplebgc.pipeline
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+
+from pysimplebgc.device import SimpleBGC32
+from pysimplebgc.emulator import LoopbackLink, Faults
+from pysimplebgc.pipeline import Pipeline
+
+
+def test_poll():
+    device = SimpleBGC32(LoopbackLink())
+    pipeline = Pipeline(device, 4)
+    records = list(pipeline.poll('CMD_REALTIME_DATA_4', count=100))
+    assert len(records) == 100
+    assert pipeline.dropped == 0
+    assert not pipeline.requests
+
+
+def test_corrupted_responses_are_dropped():
+    faults = Faults(badcrc=0.05, seed=1)
+    device = SimpleBGC32(LoopbackLink(faults))
+    device.link.settimeout(0.1)
+    pipeline = Pipeline(device, 4)
+    records = list(pipeline.poll('CMD_REALTIME_DATA_4', count=500))
+    assert faults.counts['badcrc'] > 0
+    assert pipeline.dropped == faults.counts['badcrc']
+    assert len(records) + pipeline.dropped == 500
+    stats = device.stats()['commands']['CMD_REALTIME_DATA_4']
+    assert stats['errors'] == {'BadCRCException': pipeline.dropped}
+    assert stats['latency']['count'] == len(records)
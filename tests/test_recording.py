@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+'''
+    Tests of pysimplebgc.recording
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import io
+
+import pytest
+
+from pysimplebgc.device import SimpleBGC32
+from pysimplebgc.emulator import LoopbackLink
+from pysimplebgc.recording import BinaryWriter, BinaryReader
+
+
+@pytest.fixture
+def recording(tmpdir):
+    device = SimpleBGC32(LoopbackLink())
+    codec = device.codecs['CMD_REALTIME_DATA_4']
+    records = [device.cmd('CMD_REALTIME_DATA_4') for i in range(10)]
+    filename = str(tmpdir.join('save.bin'))
+    with io.open(filename, 'wb') as fd:
+        writer = BinaryWriter(fd, codec)
+        for i, record in enumerate(records):
+            writer.write(float(i), record)
+        writer.flush()
+    return filename, records
+
+
+def test_read(recording):
+    filename, records = recording
+    with BinaryReader(filename) as reader:
+        assert len(reader) == len(records)
+        assert [record.ANGLE_ROLL for record in reader] == [
+            record.ANGLE_ROLL for record in records]
+        assert reader[-1].TIMESTAMP == len(records) - 1
+
+
+def test_column_outlives_reader(recording):
+    pytest.importorskip('numpy')
+    filename, records = recording
+    with BinaryReader(filename) as reader:
+        column = reader.column('ANGLE_ROLL')
+        timestamps = reader.array()['TIMESTAMP']
+    assert list(column) == [record.ANGLE_ROLL for record in records]
+    assert list(timestamps) == [float(i) for i in range(len(records))]
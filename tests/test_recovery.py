@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+'''
+    Tests of pysimplebgc.recovery
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import io
+
+import pytest
+
+from pysimplebgc.device import SimpleBGC32
+from pysimplebgc.emulator import LoopbackLink, Faults
+
+
+def faulty_device():
+    device = SimpleBGC32(LoopbackLink(Faults(badcrc=0.03, drop=0.02,
+                                             seed=1)))
+    device.link.settimeout(0.05)
+    return device
+
+
+def collect(device, pipelinedepth, fields=None):
+    output = io.StringIO()
+    device.setcollectcmd('CMD_REALTIME_DATA_4', output, ';', False, 300, 0,
+                         0, pipelinedepth, fields=fields, flushinterval=0)
+    return output.getvalue().splitlines()
+
+
+def test_cmd_retries():
+    device = faulty_device()
+    for i in range(300):
+        device.cmd('CMD_REALTIME_DATA_4')
+    stats = device.recovery.stats()
+    assert stats['recovered'] > 0
+    assert stats['retries'] >= stats['recovered']
+    assert stats['failures'] == 0
+
+
+@pytest.mark.parametrize('fields', [None, ['ANGLE_ROLL', 'ANGLE_PITCH']])
+def test_pipelined_collect_survives_faults(fields):
+    device = faulty_device()
+    rows = collect(device, 4, fields)
+    # the header and one row per stored record
+    assert len(rows) == 301
+    stats = device.recovery.stats()
+    assert stats['dropped'] > 0
+    assert stats['failures'] == 0
+    assert sum(stats['errors'].values()) == stats['dropped']
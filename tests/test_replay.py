@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+'''
+    Tests of pysimplebgc.replay
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import io
+
+import pytest
+
+from pysimplebgc.device import SimpleBGC32
+from pysimplebgc.emulator import LoopbackLink
+from pysimplebgc.recording import BinaryReader
+from pysimplebgc.replay import Replay
+
+
+FIELDS = ['ANGLE_ROLL', 'ANGLE_PITCH']
+
+
+@pytest.fixture
+def capture(tmpdir):
+    filename = str(tmpdir.join('field.cap'))
+    device = SimpleBGC32(LoopbackLink())
+    device.start_capture(filename)
+    records = [device.cmd('CMD_REALTIME_DATA_4') for i in range(20)]
+    customs = [device.customcmd(fields=FIELDS) for i in range(5)]
+    device.stop_capture()
+    return filename, records, customs
+
+
+def test_records(capture):
+    filename, records, customs = capture
+    with Replay(filename) as replay:
+        replayed = [(codec.cmdtype, record)
+                    for timestamp, codec, record in replay.records()]
+    assert ([record for cmdtype, record in replayed
+             if cmdtype == 'CMD_REALTIME_DATA_4'] == records)
+    # the replay decodes all the fields of the data groups sent
+    assert ([[getattr(record, name) for name in FIELDS]
+             for cmdtype, record in replayed
+             if cmdtype == 'CMD_REALTIME_DATA_CUSTOM'] ==
+            [list(record) for record in customs])
+
+
+def test_record_roundtrip(capture, tmpdir):
+    filename, records, customs = capture
+    recorded = str(tmpdir.join('save.bin'))
+    with Replay(filename) as replay, io.open(recorded, 'wb') as fd:
+        assert replay.record('CMD_REALTIME_DATA_4', fd) == len(records)
+    with BinaryReader(recorded) as reader:
+        assert ([record.ANGLE_ROLL for record in reader] ==
+                [record.ANGLE_ROLL for record in records])
+
+
+def test_collect(capture):
+    filename, records, customs = capture
+    output = io.StringIO()
+    with Replay(filename) as replay:
+        assert replay.collect('CMD_REALTIME_DATA_4', output) == len(records)
+        # all the records are captured within one 10s period
+        assert replay.collect('CMD_REALTIME_DATA_4', io.StringIO(),
+                              storingperiod=1000) in (1, 2)
+    lines = output.getvalue().splitlines()
+    assert lines[0].split(';')[1] == 'ACC_ROLL'
+    assert len(lines) == len(records) + 1
+
+
+def test_array(capture):
+    pytest.importorskip('numpy')
+    filename, records, customs = capture
+    with Replay(filename) as replay:
+        array = replay.array('CMD_REALTIME_DATA_4')
+    assert list(array['ANGLE_ROLL']) == [record.ANGLE_ROLL
+                                         for record in records]
+    assert (array['TIMESTAMP'][1:] >= array['TIMESTAMP'][:-1]).all()
+
+
+def test_not_a_capture(tmpdir):
+    filename = str(tmpdir.join('empty.cap'))
+    io.open(filename, 'wb').close()
+    with pytest.raises(ValueError):
+        Replay(filename)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+'''
+    Tests of pysimplebgc.scheduler
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+
+from pysimplebgc.scheduler import Scheduler
+
+
+class FakeClock(object):
+    '''Clock advanced by the sleeps and the work between two ticks.'''
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+def test_deadlines():
+    clock = FakeClock()
+    scheduler = Scheduler(0.01, clock=clock, sleep=clock.sleep)
+    scheduler.start()
+    assert [scheduler.wait() for i in range(3)] == [0, 1, 2]
+    assert len(clock.sleeps) == 2
+    assert abs(scheduler.elapsed - 0.02) < 1e-9
+
+
+def test_overruns():
+    clock = FakeClock()
+    scheduler = Scheduler(0.01, clock=clock, sleep=clock.sleep)
+    scheduler.start()
+    assert scheduler.wait() == 0
+    clock.now += 0.035
+    assert scheduler.wait() == 1
+    # the deadlines of ticks 2 and 3 are missed
+    assert scheduler.wait() == 4
+    assert scheduler.stats()['overruns'] == 2
+
+
+def test_period_zero():
+    clock = FakeClock()
+    scheduler = Scheduler(0, clock=clock, sleep=clock.sleep)
+    scheduler.start()
+    ticks = []
+    for i in range(5):
+        ticks.append(scheduler.wait())
+        clock.now += 0.5
+    assert ticks == [0, 1, 2, 3, 4]
+    assert clock.sleeps == []
+    stats = scheduler.stats()
+    assert stats['ticks'] == 5
+    assert stats['overruns'] == 0
+    assert stats['jitter_max'] == 0.0
+    assert scheduler.elapsed == 2.0
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+'''
+    Tests of pysimplebgc.stages
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+import io
+
+import pytest
+
+from pysimplebgc.device import SimpleBGC32
+from pysimplebgc.emulator import LoopbackLink
+from pysimplebgc.stages import Stage
+
+
+@pytest.fixture
+def device():
+    return SimpleBGC32(LoopbackLink())
+
+
+def rows(output):
+    return output.getvalue().splitlines()[1:]
+
+
+def test_decimation(device):
+    codec = device.codecs['CMD_REALTIME_DATA_4']
+    record = device.cmd('CMD_REALTIME_DATA_4')
+    output = io.StringIO()
+    stage = Stage(output, storingperiod=5, statistics='raw')
+    stage.start(codec, 1, flushinterval=0)
+    stored = []
+    for elapsed in list(range(12)) + [17, 18, 20]:
+        stage.add(elapsed, record)
+        stored.append(stage.storingnext)
+    stage.close()
+    # stored at 5, 10, then 17 after the missed period, then 20
+    assert len(rows(output)) == 4
+    assert stored[-3:] == [20, 20, 25]
+
+
+def test_aggregation(device):
+    codec = device.codecs['CMD_REALTIME_DATA_4']
+    records = [device.cmd('CMD_REALTIME_DATA_4') for i in range(10)]
+    output = io.StringIO()
+    stage = Stage(output, storingperiod=5, statistics=('mean', 'count'))
+    stage.start(codec, 1, flushinterval=0)
+    for elapsed, record in enumerate(records):
+        stage.add(elapsed, record)
+    stage.close()
+    header = output.getvalue().splitlines()[0].split(';')
+    assert header[0] == 'DATETIME'
+    assert header[-1] == 'SAMPLES'
+    # the first period holds the records 0 to 5, the second 6 to 9
+    assert [row.split(';')[-1] for row in rows(output)] == ['6']
+
+
+def test_multirate(device):
+    raw, summary = io.StringIO(), io.StringIO()
+    stages = [Stage(raw, 1, 'raw'), Stage(summary, 5, ('mean', 'count'))]
+    device.setmultiratecmd('CMD_REALTIME_DATA_4', stages, 20, 1,
+                           flushinterval=0)
+    # the raw stage stores every record, the summary every 5 periods
+    assert len(rows(raw)) == 20
+    samples = [int(row.split(';')[-1]) for row in rows(summary)]
+    assert 3 <= len(samples) <= 4
+    assert sum(samples) <= 20
+
+
+def test_invalid_stages():
+    with pytest.raises(ValueError):
+        Stage(io.StringIO(), 1, ('raw', 'mean'))
+    with pytest.raises(ValueError):
+        Stage(io.StringIO(), 1, ('mean',), fileformat='binary')
+    with pytest.raises(ValueError):
+        Stage(io.StringIO(), 0)
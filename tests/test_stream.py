@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+'''
+    Tests of pysimplebgc.stream
+
+    :copyright: Copyright 2015 Lionel Darras and contributors, see AUTHORS.
+    :license: GNU GPL v3.
+
+'''
+from __future__ import unicode_literals
+
+import pytest
+
+from pysimplebgc.device import SimpleBGC32
+from pysimplebgc.emulator import LoopbackLink
+from pysimplebgc.stream import DataStream
+
+
+@pytest.fixture
+def device():
+    device = SimpleBGC32(LoopbackLink())
+    device.link.settimeout(0.5)
+    return device
+
+
+def failing(readinto, count):
+    '''Returns a `readinto` function raising an error after count reads.'''
+    reads = [0]
+
+    def read(view):
+        reads[0] += 1
+        if reads[0] > count:
+            raise IOError("link lost")
+        return readinto(view)
+    return read
+
+
+def test_records(device):
+    with DataStream(device, interval=1) as stream:
+        records = [stream.get(timeout=1) for i in range(5)]
+    assert [type(record).__name__ for timestamp, record in records] == [
+        'CMD_REALTIME_DATA_4'] * 5
+    assert stream.error is None
+
+
+def test_read_error(device):
+    stream = DataStream(device, interval=1)
+    stream.start()
+    device.readinto = failing(device.readinto, 5)
+    try:
+        with pytest.raises(IOError):
+            # the queued records are returned first
+            for i in range(10):
+                stream.get(timeout=1)
+        with pytest.raises(IOError):
+            stream.get(timeout=1)
+        assert not stream.running
+    finally:
+        stream.stop()
+
+
+def test_iterator_read_error(device):
+    stream = DataStream(device, interval=1)
+    stream.start()
+    device.readinto = failing(device.readinto, 5)
+    try:
+        with pytest.raises(IOError):
+            for item in stream:
+                pass
+    finally:
+        stream.stop()